@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket消息解析性能测试脚本
+
+用法:
+    python bench_decoder.py                          # 使用内置的示例消息（单流和组合流两种格式）
+    python bench_decoder.py --frames frames.jsonl    # 使用录制的消息（每行一条原始消息，自动识别格式）
+    python bench_decoder.py --record frames.jsonl --count 200   # 从币安组合流录制强平订单消息
+
+监控程序通过组合流地址（/stream?streams=）接收消息，消息带有 {"stream": ..., "data": ...} 外层，
+解析后端按 combined=True 创建；单流格式用于对比外层带来的开销。
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+sys.path.append(os.path.join(os.path.dirname(__file__), 'forceOrder'))
+
+from decoder import DECODERS, available_decoders
+from config import ALL_MARKET_STREAM
+
+SAMPLE_FRAMES = [
+    '{"e":"forceOrder","E":1568014460893,"o":{"s":"BTCUSDT","S":"SELL","o":"LIMIT","f":"IOC","q":"0.014","p":"9910","ap":"9910","X":"FILLED","l":"0.014","z":"0.014","T":1568014460893}}',
+    '{"e":"forceOrder","E":1568014461012,"o":{"s":"SOLUSDT","S":"BUY","o":"LIMIT","f":"IOC","q":"152","p":"134.215","ap":"134.301","X":"FILLED","l":"152","z":"152","T":1568014461010}}',
+    '{"e":"forceOrder","E":1568014461150,"o":{"s":"DOGEUSDT","S":"SELL","o":"LIMIT","f":"IOC","q":"48211","p":"0.10122","ap":"0.10098","X":"FILLED","l":"48211","z":"48211","T":1568014461148}}',
+    '[{"e":"forceOrder","E":1568014461290,"o":{"s":"ADAUSDT","S":"BUY","o":"LIMIT","f":"IOC","q":"5210","p":"0.3512","ap":"0.3515","X":"FILLED","l":"5210","z":"5210","T":1568014461288}},'
+    '{"e":"forceOrder","E":1568014461291,"o":{"s":"XLMUSDT","S":"BUY","o":"LIMIT","f":"IOC","q":"9100","p":"0.0921","ap":"0.0922","X":"FILLED","l":"9100","z":"9100","T":1568014461289}}]',
+    '{"e":"forceOrder","E":1568014461377,"o":{"s":"XRPUSDT","S":"SELL","o":"LIMIT","f":"IOC","q":"3120.5","p":"0.5012","ap":"0.5009","X":"PARTIALLY_FILLED","l":"1200","z":"1200","T":1568014461375}}',
+]
+
+def load_frames(path):
+    """读取录制的消息文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+def wrap_combined(frame, stream=ALL_MARKET_STREAM):
+    """把单流消息包装为组合流消息"""
+    return f'{{"stream":"{stream}","data":{frame}}}'
+
+def is_combined(frames):
+    """录制的消息是否为组合流格式"""
+    first = json.loads(frames[0])
+    return isinstance(first, dict) and "stream" in first and "data" in first
+
+def bench(name, frames, rounds, combined=False):
+    """测试单个解析后端，返回 (纯解析耗时, 解析为ForceOrder耗时)，单位纳秒/条"""
+    cls, _ = DECODERS[name]
+    decoder = cls(combined=combined)
+    encoded = [frame.encode('utf-8') for frame in frames]
+    total = len(encoded) * rounds
+
+    start = time.perf_counter_ns()
+    for _ in range(rounds):
+        for message in encoded:
+            decoder.decode(message)
+    generic = (time.perf_counter_ns() - start) / total
+
+    start = time.perf_counter_ns()
+    for _ in range(rounds):
+        for message in encoded:
+            decoder.decode_force_orders(message)
+    typed = (time.perf_counter_ns() - start) / total
+    return generic, typed
+
+async def record(path, count):
+    """从币安全市场强平订单组合流录制消息（与监控程序接收的格式相同）"""
+    import websockets
+    from connection_manager import build_stream_url
+    url = build_stream_url([ALL_MARKET_STREAM])
+    print(f"📡 正在录制 {count} 条消息: {url}")
+    with open(path, 'a', encoding='utf-8') as f:
+        async with websockets.connect(url) as websocket:
+            for i in range(count):
+                message = await websocket.recv()
+                f.write(message + '\n')
+                print(f"  已录制 {i + 1}/{count}")
+    print(f"💾 已保存到 {path}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="WebSocket消息解析性能测试")
+    parser.add_argument('--frames', help="录制的消息文件（每行一条原始消息）")
+    parser.add_argument('--rounds', type=int, default=0, help="重复次数（默认按约20万条消息计算）")
+    parser.add_argument('--record', help="录制消息并保存到指定文件")
+    parser.add_argument('--count', type=int, default=100, help="录制的消息数量")
+    args = parser.parse_args()
+
+    if args.record:
+        import asyncio
+        asyncio.run(record(args.record, args.count))
+        return
+
+    if args.frames:
+        frames = load_frames(args.frames)
+        combined = is_combined(frames)
+        modes = [("组合流" if combined else "单流", frames, combined)]
+    else:
+        frames = SAMPLE_FRAMES
+        modes = [("组合流", [wrap_combined(frame) for frame in frames], True), ("单流", frames, False)]
+    rounds = args.rounds or max(1, 200000 // len(frames))
+
+    print("=" * 60)
+    print("⚡ WebSocket消息解析性能测试")
+    print("=" * 60)
+    print(f"消息来源: {args.frames or '内置示例'}，共 {len(frames)} 条，重复 {rounds} 次")
+    print(f"可用后端: {', '.join(available_decoders())}")
+    print("-" * 60)
+    print(f"{'后端':<10}{'格式':<8}{'纯解析(ns/条)':>18}{'解析为ForceOrder(ns/条)':>28}")
+    for name in available_decoders():
+        for mode, mode_frames, combined in modes:
+            generic, typed = bench(name, mode_frames, rounds, combined)
+            print(f"{name:<10}{mode:<8}{generic:>18.0f}{typed:>28.0f}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
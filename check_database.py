@@ -85,13 +85,15 @@ def check_influxdb_connection():
             "E": 1234567890000
         }
         
-        handler.save_force_order(test_data)
+        from force_order import ForceOrder
+        handler.save_force_order(ForceOrder.from_event(test_data))
+        handler.flush()
         logger.info("✅ 测试数据写入成功！")
         
         # 测试查询权限
         logger.info("🔍 测试数据查询权限...")
         result = handler.query_recent_force_orders("TESTUSDT", 1)
-        if result:
+        if next(iter(result), None) is not None:
             logger.info("✅ 测试数据查询成功！")
         else:
             logger.warning("⚠️ 测试数据查询失败，可能需要等待数据同步")
@@ -0,0 +1,197 @@
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+from force_order import ForceOrder
+from symbol_registry import SymbolRegistry
+
+# SELL 方向的强平单来自多头被强平，BUY 方向来自空头被强平
+SIDES = ("BUY", "SELL")
+
+class RollingWindow:
+    """单个滑动窗口：按固定宽度分桶的环形数组，写入O(1)，时间前进时清除滑出窗口的桶"""
+
+    __slots__ = ("window", "buckets", "bucket_ms", "_epoch", "_count", "_qty", "_notional", "_max",
+                 "_head", "count", "quantity", "notional")
+
+    def __init__(self, window: float, buckets: int = 60):
+        self.window = window
+        self.buckets = buckets
+        self.bucket_ms = max(1, int(window * 1000) // buckets)
+        # 每个桶对应的时间序号(时间戳 // 桶宽度)
+        self._epoch = array("q", [-1]) * buckets
+        self._count = array("q", [0]) * buckets
+        self._qty = array("d", [0.0]) * buckets
+        self._notional = array("d", [0.0]) * buckets
+        self._max = array("d", [0.0]) * buckets
+        self._head = -1
+        # 窗口内合计，随写入和过期增量维护
+        self.count = 0
+        self.quantity = 0.0
+        self.notional = 0.0
+
+    def _clear(self, i: int, epoch: int):
+        """把桶i从合计中扣除并分配给新的时间序号"""
+        if self._count[i]:
+            self.count -= self._count[i]
+            self.quantity -= self._qty[i]
+            self.notional -= self._notional[i]
+            self._count[i] = 0
+            self._qty[i] = 0.0
+            self._notional[i] = 0.0
+            self._max[i] = 0.0
+            if not self.count:
+                # 窗口清空时归零，避免浮点误差累积
+                self.quantity = 0.0
+                self.notional = 0.0
+        self._epoch[i] = epoch
+
+    def advance(self, now_ms: int):
+        """前进到当前时间，清除滑出窗口的桶"""
+        epoch = now_ms // self.bucket_ms
+        head = self._head
+        if epoch <= head:
+            return
+        n = self.buckets
+        start = max(head + 1, epoch - n + 1)
+        for e in range(start, epoch + 1):
+            self._clear(e % n, e)
+        self._head = epoch
+
+    def add(self, event_time: int, quantity: float, notional: float) -> bool:
+        """写入一条强平记录，早于窗口的记录丢弃并返回False"""
+        epoch = event_time // self.bucket_ms
+        if epoch > self._head:
+            self.advance(event_time)
+        elif epoch <= self._head - self.buckets:
+            return False
+        i = epoch % self.buckets
+        if self._epoch[i] != epoch:
+            self._clear(i, epoch)
+        self._count[i] += 1
+        self._qty[i] += quantity
+        self._notional[i] += notional
+        if notional > self._max[i]:
+            self._max[i] = notional
+        self.count += 1
+        self.quantity += quantity
+        self.notional += notional
+        return True
+
+    def snapshot(self, now_ms: int) -> Dict[str, float]:
+        """当前窗口内的条数、数量、名义价值和最大单笔名义价值"""
+        self.advance(now_ms)
+        return {
+            "count": self.count,
+            "quantity": self.quantity,
+            "notional": self.notional,
+            "max_notional": max(self._max) if self.count else 0.0,
+        }
+
+class LiquidationAggregator:
+    """强平订单滑动窗口聚合：按币对和方向维护多个时间窗口的实时统计"""
+
+    def __init__(self,
+                 windows: Iterable[float] = (10, 60, 300, 3600),
+                 buckets: int = 60,
+                 pinned: Iterable[str] = (),
+                 max_symbols: int = 500,
+                 idle_ttl: float = 86400):
+        self.windows = tuple(sorted(windows))
+        self.buckets = buckets
+        self.registry = SymbolRegistry(self._new_symbol, pinned, max_symbols, idle_ttl)
+        self.updates = 0
+        self.dropped = 0
+
+    def _new_symbol(self) -> Dict[str, List[RollingWindow]]:
+        return {side: [RollingWindow(window, self.buckets) for window in self.windows] for side in SIDES}
+
+    def update(self, order: ForceOrder):
+        """写入一条强平订单"""
+        sides = self.registry.get_or_create(order.symbol, order.received_at)
+        windows = sides.get(order.side)
+        if windows is None:
+            self.dropped += 1
+            return
+        for window in windows:
+            window.add(order.event_time, order.quantity, order.notional)
+        self.updates += 1
+
+    def update_many(self, orders: Iterable[ForceOrder]):
+        """写入一批强平订单"""
+        for order in orders:
+            self.update(order)
+
+    def _index(self, window: float) -> int:
+        try:
+            return self.windows.index(window)
+        except ValueError:
+            raise ValueError(f"未配置的时间窗口: {window}，可用窗口: {self.windows}")
+
+    def _summarize(self, symbol: str, sides: Dict[str, List[RollingWindow]], index: int, now_ms: int) -> Dict[str, Any]:
+        longs = sides["SELL"][index].snapshot(now_ms)
+        shorts = sides["BUY"][index].snapshot(now_ms)
+        notional = longs["notional"] + shorts["notional"]
+        return {
+            "symbol": symbol,
+            "window": self.windows[index],
+            "count": longs["count"] + shorts["count"],
+            "notional": notional,
+            "max_notional": max(longs["max_notional"], shorts["max_notional"]),
+            "long_liquidations": longs,
+            "short_liquidations": shorts,
+            # 多空失衡: 1 表示全部为多头被强平，-1 表示全部为空头被强平
+            "imbalance": (longs["notional"] - shorts["notional"]) / notional if notional else 0.0,
+        }
+
+    def get(self, symbol: str, window: float = 60, now_ms: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """获取单个币对在指定窗口内的统计，未登记的币对返回None"""
+        sides = self.registry.get(symbol)
+        if sides is None:
+            return None
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        return self._summarize(symbol, sides, self._index(window), now_ms)
+
+    def snapshot(self, window: float = 60, now_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """全部在窗口内有强平的币对统计"""
+        index = self._index(window)
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        result = []
+        for symbol, sides in self.registry.items():
+            summary = self._summarize(symbol, sides, index, now_ms)
+            if summary["count"]:
+                result.append(summary)
+        return result
+
+    def top(self, window: float = 60, n: int = 10, key: str = "notional", now_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """窗口内按指定字段排序的前N个币对"""
+        return sorted(self.snapshot(window, now_ms), key=lambda item: item[key], reverse=True)[:n]
+
+    def market(self, window: float = 60, now_ms: Optional[int] = None) -> Dict[str, Any]:
+        """全市场在窗口内的合计"""
+        long_notional = short_notional = 0.0
+        count = 0
+        max_notional = 0.0
+        for summary in self.snapshot(window, now_ms):
+            count += summary["count"]
+            long_notional += summary["long_liquidations"]["notional"]
+            short_notional += summary["short_liquidations"]["notional"]
+            max_notional = max(max_notional, summary["max_notional"])
+        notional = long_notional + short_notional
+        return {
+            "window": window,
+            "count": count,
+            "notional": notional,
+            "long_notional": long_notional,
+            "short_notional": short_notional,
+            "max_notional": max_notional,
+            "imbalance": (long_notional - short_notional) / notional if notional else 0.0,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取聚合器统计"""
+        return {
+            "windows": self.windows,
+            "updates": self.updates,
+            "dropped": self.dropped,
+            "symbols": self.registry.get_stats(),
+        }
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+强平数据分析：把一段时间的强平订单加载为列式NumPy数组，统计全部向量化计算
+
+用法:
+    python analytics.py --start 7d
+    python analytics.py --start 2024-01-01 --end 2024-02-01 --freq 5m --top 10
+"""
+
+import argparse
+import logging
+import re
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from config import STORAGE_MODE
+from force_order import ForceOrder
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 方向编码：SELL 为多头被强平，BUY 为空头被强平
+SIDE_CODES = {"BUY": 0, "SELL": 1}
+
+class LiquidationFrame:
+    """列式强平数据：每个字段一个NumPy数组，币对按字典编码"""
+
+    def __init__(self, event_time, symbol_codes, symbols: List[str], side, quantity, price, notional):
+        if np is None:
+            raise RuntimeError("数据分析需要安装numpy: pip install numpy")
+        self.event_time = event_time        # int64 毫秒
+        self.symbol_codes = symbol_codes    # int32，对应 symbols 的下标
+        self.symbols = symbols
+        self.side = side                    # int8，0=BUY 1=SELL
+        self.quantity = quantity            # float64
+        self.price = price                  # float64
+        self.notional = notional            # float64
+
+    def __len__(self) -> int:
+        return len(self.event_time)
+
+    @classmethod
+    def from_columns(cls, rows: Iterable[Tuple[int, str, str, float, float, float]]) -> "LiquidationFrame":
+        """从 (事件时间, 币对, 方向, 数量, 价格, 名义价值) 行流构建，中间只使用紧凑的array缓冲区"""
+        if np is None:
+            raise RuntimeError("数据分析需要安装numpy: pip install numpy")
+        times, codes, sides = array("q"), array("i"), array("b")
+        quantities, prices, notionals = array("d"), array("d"), array("d")
+        dictionary: Dict[str, int] = {}
+        for event_time, symbol, side, quantity, price, notional in rows:
+            code = dictionary.get(symbol)
+            if code is None:
+                code = dictionary[symbol] = len(dictionary)
+            times.append(event_time)
+            codes.append(code)
+            sides.append(SIDE_CODES.get(side, 0))
+            quantities.append(quantity)
+            prices.append(price)
+            notionals.append(notional)
+        frame = cls(
+            np.frombuffer(times, dtype=np.int64),
+            np.frombuffer(codes, dtype=np.int32),
+            list(dictionary),
+            np.frombuffer(sides, dtype=np.int8),
+            np.frombuffer(quantities, dtype=np.float64),
+            np.frombuffer(prices, dtype=np.float64),
+            np.frombuffer(notionals, dtype=np.float64),
+        )
+        return frame.sorted()
+
+    @classmethod
+    def from_orders(cls, orders: Iterable[ForceOrder]) -> "LiquidationFrame":
+        return cls.from_columns(
+            (order.event_time, order.symbol, order.side, order.quantity, order.price, order.notional)
+            for order in orders
+        )
+
+    @classmethod
+    def from_records(cls, records: Iterable[Any]) -> "LiquidationFrame":
+        """从按字段展开的InfluxDB记录流构建（见 InfluxDBHandler.stream_force_orders）"""
+        def rows():
+            for record in records:
+                values = record.values
+                quantity = values.get("quantity") or 0.0
+                price = values.get("price") or 0.0
+                notional = values.get("notional")
+                yield (int(record.get_time().timestamp() * 1000), values.get("symbol"), values.get("side"),
+                       quantity, price, notional if notional is not None else quantity * price)
+        return cls.from_columns(rows())
+
+    @classmethod
+    def from_store(cls, store, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                   symbols: Optional[List[str]] = None) -> "LiquidationFrame":
+        """从列式存储按分区读取整列（见 ColumnarStore.column_batches），不逐条还原订单"""
+        if np is None:
+            raise RuntimeError("数据分析需要安装numpy: pip install numpy")
+        columns = ("event_time", "symbol", "side", "quantity", "price", "notional")
+        parts = {name: [] for name in columns}
+        dictionary: Dict[str, int] = {}
+        for batch in store.column_batches(start_ms, end_ms, symbols, columns):
+            # 分区字典编码 -> 全局编码
+            symbol_map = np.array([dictionary.setdefault(symbol, len(dictionary))
+                                   for symbol in batch["dictionary"]["symbol"]], dtype=np.int32)
+            side_map = np.array([SIDE_CODES.get(side, 0) for side in batch["dictionary"]["side"]], dtype=np.int8)
+            parts["symbol"].append(symbol_map[batch["symbol"]])
+            parts["side"].append(side_map[batch["side"]])
+            for name in ("event_time", "quantity", "price", "notional"):
+                parts[name].append(batch[name])
+        if not parts["event_time"]:
+            return cls.from_columns([])
+        return cls(
+            np.concatenate(parts["event_time"]).astype(np.int64, copy=False),
+            np.concatenate(parts["symbol"]),
+            list(dictionary),
+            np.concatenate(parts["side"]),
+            np.concatenate(parts["quantity"]).astype(np.float64, copy=False),
+            np.concatenate(parts["price"]).astype(np.float64, copy=False),
+            np.concatenate(parts["notional"]).astype(np.float64, copy=False),
+        ).sorted()
+
+    def sorted(self) -> "LiquidationFrame":
+        """按事件时间排序（已有序时直接返回）"""
+        if len(self) < 2 or bool(np.all(self.event_time[1:] >= self.event_time[:-1])):
+            return self
+        order = np.argsort(self.event_time, kind="stable")
+        return LiquidationFrame(self.event_time[order], self.symbol_codes[order], self.symbols,
+                                self.side[order], self.quantity[order], self.price[order], self.notional[order])
+
+    def mask(self, symbol: Optional[str] = None, side: Optional[str] = None):
+        """按币对/方向过滤的布尔掩码"""
+        mask = np.ones(len(self), dtype=bool)
+        if symbol is not None:
+            code = self.symbols.index(symbol) if symbol in self.symbols else -1
+            mask &= self.symbol_codes == code
+        if side is not None:
+            mask &= self.side == SIDE_CODES[side]
+        return mask
+
+    def _bins(self, freq_ms: int):
+        """按时间粒度划分的桶下标和每个桶的起始时间"""
+        start = self.event_time[0] - self.event_time[0] % freq_ms
+        index = (self.event_time - start) // freq_ms
+        count = int(index[-1]) + 1
+        return index, start + np.arange(count, dtype=np.int64) * freq_ms
+
+    def size_percentiles(self, percentiles: Sequence[float] = (50, 90, 99, 99.9),
+                         field: str = "notional", by_symbol: bool = False) -> Dict[str, Dict[str, float]]:
+        """单笔规模分位数（默认按名义价值），by_symbol 时按币对分别计算"""
+        values = getattr(self, field)
+        result = {}
+        if len(values):
+            result["ALL"] = dict(zip(map(str, percentiles), np.percentile(values, percentiles).tolist()))
+        if by_symbol:
+            for code, symbol in enumerate(self.symbols):
+                selected = values[self.symbol_codes == code]
+                if len(selected):
+                    result[symbol] = dict(zip(map(str, percentiles), np.percentile(selected, percentiles).tolist()))
+        return result
+
+    def notional_series(self, freq_ms: int = 60000, symbol: Optional[str] = None, side: Optional[str] = None):
+        """每个时间桶的强平名义价值合计，返回 (桶起始时间, 名义价值)"""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        index, times = self._bins(freq_ms)
+        mask = self.mask(symbol, side)
+        values = np.bincount(index[mask], weights=self.notional[mask], minlength=len(times))
+        return times, values
+
+    def imbalance_series(self, freq_ms: int = 60000, symbol: Optional[str] = None):
+        """多空失衡序列：(多头被强平 - 空头被强平) / 合计，没有强平的桶为NaN"""
+        times, longs = self.notional_series(freq_ms, symbol, "SELL")
+        _, shorts = self.notional_series(freq_ms, symbol, "BUY")
+        total = longs + shorts
+        with np.errstate(invalid="ignore", divide="ignore"):
+            imbalance = np.where(total > 0, (longs - shorts) / total, np.nan)
+        return times, imbalance
+
+    def symbol_matrix(self, freq_ms: int = 60000, top: int = 20):
+        """名义价值最高的前N个币对的 (币对 × 时间桶) 名义价值矩阵"""
+        if not len(self):
+            return [], np.empty((0, 0))
+        totals = np.bincount(self.symbol_codes, weights=self.notional, minlength=len(self.symbols))
+        chosen = np.argsort(totals)[::-1][:top]
+        chosen = chosen[totals[chosen] > 0]
+        index, times = self._bins(freq_ms)
+        # 原币对编码 -> 矩阵行号，未选中的为-1
+        row_of = np.full(len(self.symbols), -1, dtype=np.int64)
+        row_of[chosen] = np.arange(len(chosen))
+        rows = row_of[self.symbol_codes]
+        keep = rows >= 0
+        flat = rows[keep] * len(times) + index[keep]
+        matrix = np.bincount(flat, weights=self.notional[keep], minlength=len(chosen) * len(times))
+        return [self.symbols[code] for code in chosen], matrix.reshape(len(chosen), len(times))
+
+    def burst_correlation(self, freq_ms: int = 60000, top: int = 20, z: float = 3.0):
+        """币对间强平爆发的相关性
+
+        每个币对的每个时间桶，名义价值超过该币对均值 + z 倍标准差记为一次爆发，
+        返回 (币对列表, 爆发指示序列的相关系数矩阵, 各币对爆发次数)。
+        """
+        symbols, matrix = self.symbol_matrix(freq_ms, top)
+        if not symbols:
+            return symbols, np.empty((0, 0)), np.empty(0, dtype=np.int64)
+        mean = matrix.mean(axis=1, keepdims=True)
+        std = matrix.std(axis=1, keepdims=True)
+        bursts = (matrix > mean + z * std) & (matrix > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = np.corrcoef(bursts.astype(np.float64)) if len(symbols) > 1 else np.ones((1, 1))
+        return symbols, np.atleast_2d(corr), bursts.sum(axis=1)
+
+def load_frame(start_ms: int, end_ms: int, symbols: Optional[List[str]] = None, source: str = "auto") -> LiquidationFrame:
+    """从InfluxDB（流式）、SQLite或离线数据加载强平订单，auto 按 STORAGE_MODE 选择"""
+    if source == "sqlite" or (source == "auto" and STORAGE_MODE == "sqlite"):
+        from sqlite_handler import SQLiteHandler
+        handler = SQLiteHandler(read_only=True)
+        try:
+            return LiquidationFrame.from_orders(
+                order for order in handler.stream_force_orders(start_ms, end_ms)
+                if not symbols or order.symbol in symbols
+            )
+        finally:
+            handler.close()
+
+    if source != "offline":
+        try:
+            from influxdb_handler import InfluxDBHandler
+            handler = InfluxDBHandler(read_only=True)
+        except Exception as e:
+            if source == "influxdb":
+                raise
+            logger.warning(f"InfluxDB连接失败，改为分析离线数据: {e}")
+        else:
+            try:
+                return LiquidationFrame.from_records(handler.stream_force_orders(start_ms, end_ms, symbols))
+            finally:
+                handler.close()
+
+    from data_processor import iter_stored_orders, open_columnar_store
+    store = open_columnar_store()
+    if store is not None and not store.is_empty():
+        return LiquidationFrame.from_store(store, start_ms, end_ms, symbols)
+    orders = iter_stored_orders(start_ms, end_ms)
+    if symbols:
+        orders = (order for order in orders if order.symbol in symbols)
+    return LiquidationFrame.from_orders(orders)
+
+def parse_duration(value: str) -> int:
+    """解析时间粒度为毫秒：30s、1m、5m、1h、1d"""
+    match = re.fullmatch(r"(\d+)([smhd])", value.strip())
+    if not match:
+        raise ValueError(f"无效的时间粒度: {value}")
+    return int(match.group(1)) * {"s": 1000, "m": 60000, "h": 3600000, "d": 86400000}[match.group(2)]
+
+def print_report(frame: LiquidationFrame, freq_ms: int = 60000, top: int = 10, z: float = 3.0):
+    """输出分析报告"""
+    print("=" * 60)
+    print(f"📊 强平数据分析: {len(frame)} 笔，{len(frame.symbols)} 个币对")
+    print("=" * 60)
+    if not len(frame):
+        return
+
+    long_total = float(frame.notional[frame.side == SIDE_CODES["SELL"]].sum())
+    short_total = float(frame.notional[frame.side == SIDE_CODES["BUY"]].sum())
+    print(f"名义价值合计: {long_total + short_total:.2f}（多头被强平 {long_total:.2f} / 空头被强平 {short_total:.2f}）")
+
+    print("\n单笔名义价值分位数:")
+    for percentile, value in frame.size_percentiles()["ALL"].items():
+        print(f"  P{percentile}: {value:.2f}")
+
+    times, series = frame.notional_series(freq_ms)
+    peak = int(np.argmax(series))
+    print(f"\n每 {freq_ms // 1000} 秒名义价值: 平均 {series.mean():.2f}，最大 {series[peak]:.2f} "
+          f"（{np.datetime64(int(times[peak]), 'ms')}）")
+
+    _, imbalance = frame.imbalance_series(freq_ms)
+    valid = imbalance[~np.isnan(imbalance)]
+    if len(valid):
+        print(f"多空失衡: 平均 {valid.mean():+.3f}，偏多头强平的时段占比 {(valid > 0).mean():.1%}")
+
+    symbols, corr, bursts = frame.burst_correlation(freq_ms, top, z)
+    if len(symbols) > 1:
+        print(f"\n强平爆发相关性（前 {len(symbols)} 个币对，阈值 均值+{z}σ）:")
+        print("  " + " ".join(f"{symbol[:8]:>9}" for symbol in symbols))
+        for symbol, row, count in zip(symbols, corr, bursts):
+            cells = " ".join(f"{value:>9.2f}" if not np.isnan(value) else f"{'-':>9}" for value in row)
+            print(f"  {cells}  {symbol} ({int(count)} 次爆发)")
+
+def main():
+    """主函数"""
+    from export_tool import parse_time
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description="强平数据分析")
+    parser.add_argument("--symbol", action="append", help="币对，可重复指定，默认全部")
+    parser.add_argument("--start", default="24h", help="开始时间: 相对时间(如 24h、7d)或ISO时间，默认24h")
+    parser.add_argument("--end", help="结束时间，默认当前时间")
+    parser.add_argument("--freq", default="1m", help="时间序列粒度，如 1m、5m、1h，默认1m")
+    parser.add_argument("--top", type=int, default=10, help="爆发相关性分析的币对数量")
+    parser.add_argument("--z", type=float, default=3.0, help="爆发阈值：均值 + z 倍标准差")
+    parser.add_argument("--source", choices=["auto", "influxdb", "sqlite", "offline"], default="auto",
+                        help="数据源，auto 按 STORAGE_MODE 选择（InfluxDB不可用时使用离线数据）")
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("数据分析需要安装numpy: pip install numpy")
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+
+    now = datetime.now()
+    start_ms = parse_time(args.start, now)
+    end_ms = parse_time(args.end, now) if args.end else int(now.timestamp() * 1000)
+    try:
+        freq_ms = parse_duration(args.freq)
+    except ValueError as e:
+        parser.error(str(e))
+    symbols = [symbol.upper() for symbol in args.symbol] if args.symbol else None
+
+    frame = load_frame(start_ms, end_ms, symbols, args.source)
+    print_report(frame, freq_ms, args.top, args.z)
+
+if __name__ == "__main__":
+    main()
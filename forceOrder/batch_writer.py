@@ -0,0 +1,178 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class BatchWriter:
+    """后台批量写入器，在独立线程中聚合数据并批量提交，不占用事件循环"""
+
+    def __init__(self,
+                 write_fn: Callable[[List[Any]], None],
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 max_in_flight: int = 2,
+                 buffer_size: int = 50000,
+                 max_retries: int = 3,
+                 retry_interval: float = 1.0,
+                 name: str = "batch-writer",
+                 on_success: Optional[Callable[[List[Any]], None]] = None,
+                 on_failure: Optional[Callable[[List[Any], Exception], None]] = None,
+                 retryable: Optional[Callable[[Exception], bool]] = None):
+        self.write_fn = write_fn
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.name = name
+        self.on_success = on_success
+        self.on_failure = on_failure
+        # 判断异常是否值得重试，返回False时直接按失败处理（如熔断打开）
+        self.retryable = retryable
+
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                            thread_name_prefix=name)
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._pending_lock = threading.Condition()
+        self._pending = 0
+        self._closed = False
+
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "dropped": 0,
+            "batches": 0,
+            "retries": 0,
+        }
+
+        self._collector = threading.Thread(target=self._collect_loop, name=f"{name}-collector", daemon=True)
+        self._collector.start()
+
+    def enqueue(self, item: Any) -> bool:
+        """将单条数据放入缓冲区，缓冲区已满时丢弃并返回False"""
+        if self._closed:
+            logger.warning(f"[{self.name}] 写入器已关闭，丢弃数据")
+            self.stats["dropped"] += 1
+            return False
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(item)
+            self.stats["enqueued"] += 1
+            return True
+        except queue.Full:
+            with self._pending_lock:
+                self._pending -= 1
+                self._pending_lock.notify_all()
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] % 1000 == 1:
+                logger.warning(f"⚠️ [{self.name}] 写入缓冲区已满，累计丢弃 {self.stats['dropped']} 条数据")
+            return False
+
+    def enqueue_many(self, items: List[Any]) -> int:
+        """批量放入缓冲区，返回成功放入的条数"""
+        return sum(1 for item in items if self.enqueue(item))
+
+    def _collect_loop(self):
+        """聚合线程：按批大小或刷新间隔切分批次"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=min(timeout, 0.1)))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            flush_requested = self._flush_event.is_set()
+            if len(batch) >= self.batch_size or (batch and (now >= deadline or flush_requested)):
+                self._submit(batch)
+                batch = []
+                deadline = now + self.flush_interval
+            elif not batch and now >= deadline:
+                deadline = now + self.flush_interval
+
+            if flush_requested and self._queue.empty() and not batch:
+                self._flush_event.clear()
+            if self._stop_event.is_set() and self._queue.empty() and not batch:
+                break
+
+    def _submit(self, batch: List[Any]):
+        """提交一个批次，超过最大并发批次数时阻塞聚合线程"""
+        self._in_flight.acquire()
+        self._executor.submit(self._write_batch, batch)
+
+    def _write_batch(self, batch: List[Any]):
+        """写入一个批次，失败时按固定间隔重试"""
+        try:
+            attempt = 0
+            while True:
+                try:
+                    self.write_fn(batch)
+                    with self._pending_lock:
+                        self.stats["written"] += len(batch)
+                        self.stats["batches"] += 1
+                    if self.on_success:
+                        self.on_success(batch)
+                    return
+                except Exception as e:
+                    attempt += 1
+                    if attempt > self.max_retries or (self.retryable and not self.retryable(e)):
+                        with self._pending_lock:
+                            self.stats["failed"] += len(batch)
+                        if self.on_failure:
+                            logger.error(f"❌ [{self.name}] 批量写入失败，{len(batch)} 条数据交给失败回调处理: {e}")
+                        else:
+                            logger.error(f"❌ [{self.name}] 批量写入失败，丢弃 {len(batch)} 条数据: {e}")
+                        if self.on_failure:
+                            self.on_failure(batch, e)
+                        return
+                    self.stats["retries"] += 1
+                    logger.warning(f"⚠️ [{self.name}] 批量写入失败，{self.retry_interval} 秒后第 {attempt} 次重试: {e}")
+                    time.sleep(self.retry_interval)
+        except Exception as e:
+            logger.error(f"❌ [{self.name}] 批次回调处理失败: {e}")
+        finally:
+            self._in_flight.release()
+            with self._pending_lock:
+                self._pending -= len(batch)
+                self._pending_lock.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """立即提交缓冲区中的数据并等待全部写完"""
+        self._flush_event.set()
+        with self._pending_lock:
+            done = self._pending_lock.wait_for(lambda: self._pending <= 0, timeout=timeout)
+        if not done:
+            logger.warning(f"⚠️ [{self.name}] 刷新超时，仍有 {self._pending} 条数据未写入")
+        return done
+
+    def close(self, timeout: Optional[float] = 30.0):
+        """刷新剩余数据并停止后台线程"""
+        if self._closed:
+            return
+        self._closed = True
+        logger.info(f"[{self.name}] 正在刷新剩余 {self._pending} 条数据...")
+        self.flush(timeout)
+        self._stop_event.set()
+        self._collector.join(timeout=timeout)
+        self._executor.shutdown(wait=True)
+        logger.info(f"[{self.name}] 写入器已关闭: {self.get_stats()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入统计"""
+        stats = dict(self.stats)
+        stats["buffer_depth"] = self._queue.qsize()
+        stats["pending"] = self._pending
+        return stats
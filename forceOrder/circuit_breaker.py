@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """熔断打开期间拒绝的写入"""
+
+class CircuitBreaker:
+    """存储写入熔断器
+
+    按最近 window 次写入统计失败率和慢调用率（耗时超过 slow_call_latency 秒），任一超过阈值时打开熔断；
+    打开 open_duration 秒后进入半开状态，放行 half_open_calls 次试探写入，全部成功则关闭，任一失败则重新打开。
+    可在多个线程中调用。
+    """
+
+    def __init__(self,
+                 name: str = "storage",
+                 window: int = 20,
+                 min_calls: int = 5,
+                 failure_rate: float = 0.5,
+                 slow_call_latency: float = 5.0,
+                 slow_call_rate: float = 0.8,
+                 open_duration: float = 30.0,
+                 half_open_calls: int = 1,
+                 on_state_change: Optional[Callable[[str, str], None]] = None):
+        self.name = name
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.slow_call_latency = slow_call_latency
+        self.slow_call_rate = slow_call_rate
+        self.open_duration = open_duration
+        self.half_open_calls = max(1, half_open_calls)
+        self.on_state_change = on_state_change
+
+        self.state = CLOSED
+        # 最近的调用结果: (是否失败, 是否慢调用)
+        self._calls = deque(maxlen=max(window, self.min_calls))
+        self._lock = threading.Lock()
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self.stats = {
+            "successes": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "rejected": 0,
+            "opened": 0,
+        }
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def allow_request(self) -> bool:
+        """是否放行一次写入（打开期间到期后转为半开并放行有限次数的试探）"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_duration:
+                    self.stats["rejected"] += 1
+                    return False
+                self._transition(HALF_OPEN)
+            if self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self, latency: float):
+        """记录一次成功的写入及其耗时(秒)"""
+        slow = latency >= self.slow_call_latency
+        with self._lock:
+            self.stats["successes"] += 1
+            if slow:
+                self.stats["slow_calls"] += 1
+            if self.state == HALF_OPEN:
+                if slow:
+                    self._open()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._transition(CLOSED)
+                return
+            self._calls.append((False, slow))
+            self._evaluate()
+
+    def record_failure(self):
+        """记录一次失败的写入"""
+        with self._lock:
+            self.stats["failures"] += 1
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+            self._calls.append((True, False))
+            self._evaluate()
+
+    def _evaluate(self):
+        if self.state != CLOSED or len(self._calls) < self.min_calls:
+            return
+        total = len(self._calls)
+        failures = sum(1 for failed, _ in self._calls if failed)
+        slow = sum(1 for _, is_slow in self._calls if is_slow)
+        if failures / total >= self.failure_rate or slow / total >= self.slow_call_rate:
+            self._open()
+
+    def _open(self):
+        self.stats["opened"] += 1
+        self._opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        previous, self.state = self.state, state
+        self._probes = 0
+        self._probe_successes = 0
+        if state == CLOSED:
+            self._calls.clear()
+        if previous == state:
+            return
+        logger.warning(f"⚡ [{self.name}] 熔断状态: {previous} -> {state}")
+        if self.on_state_change:
+            try:
+                self.on_state_change(previous, state)
+            except Exception as e:
+                logger.error(f"❌ [{self.name}] 熔断状态回调失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = len(self._calls)
+            stats = dict(self.stats)
+            stats["state"] = self.state
+            stats["window_calls"] = total
+            stats["failure_rate"] = sum(1 for failed, _ in self._calls if failed) / total if total else 0.0
+            stats["slow_call_rate"] = sum(1 for _, slow in self._calls if slow) / total if total else 0.0
+        return stats
@@ -0,0 +1,387 @@
+import json
+import logging
+import mmap
+import os
+import shutil
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from force_order import ForceOrder
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 定长列：(字段名, array类型码)
+NUMERIC_COLUMNS = (
+    ("event_time", "q"),
+    ("trade_time", "q"),
+    ("received_at", "d"),
+    ("quantity", "d"),
+    ("price", "d"),
+    ("avg_price", "d"),
+    ("last_qty", "d"),
+    ("cum_qty", "d"),
+    ("notional", "d"),
+)
+
+# 字典编码列：每个分区保存 取值列表，列文件中保存取值下标
+DICT_COLUMNS = ("symbol", "side", "status", "order_type", "time_in_force")
+DICT_TYPECODE = "H"
+
+COLUMN_TYPES = dict(NUMERIC_COLUMNS, **{name: DICT_TYPECODE for name in DICT_COLUMNS})
+DICTIONARY_FILE = "dictionary.json"
+
+NUMPY_DTYPES = {"q": "<i8", "d": "<f8", "H": "<u2"}
+
+DAY_MS = 86400 * 1000
+
+def partition_key(timestamp_ms: int) -> str:
+    """事件时间所属的分区（UTC日期）"""
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).strftime("%Y%m%d")
+
+def partition_start(key: str) -> int:
+    """分区起始时间(毫秒)"""
+    return int(datetime.strptime(key, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def _load_dictionary(path: str) -> Dict[str, List[str]]:
+    try:
+        with open(os.path.join(path, DICTIONARY_FILE), "r", encoding="utf-8") as f:
+            dictionary = json.load(f)
+    except FileNotFoundError:
+        dictionary = {}
+    return {name: dictionary.get(name, []) for name in DICT_COLUMNS}
+
+def _row_count(path: str) -> int:
+    """各列文件中完整的行数（崩溃时各列可能写入了不同长度，以最短的为准）"""
+    rows = None
+    for name, typecode in COLUMN_TYPES.items():
+        try:
+            size = os.path.getsize(os.path.join(path, name + ".col"))
+        except FileNotFoundError:
+            size = 0
+        count = size // array(typecode).itemsize
+        rows = count if rows is None else min(rows, count)
+    return rows or 0
+
+class _PartitionWriter:
+    """单个日期分区的追加写入：每列一个文件，字典变化时先原子替换字典文件再写列数据"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.rows = _row_count(path)
+        self.dictionary = _load_dictionary(path)
+        self._codes = {name: {value: code for code, value in enumerate(values)}
+                       for name, values in self.dictionary.items()}
+        self._files = {}
+        for name, typecode in COLUMN_TYPES.items():
+            f = open(os.path.join(path, name + ".col"), "ab")
+            expected = self.rows * array(typecode).itemsize
+            if f.tell() != expected:
+                logger.warning(f"⚠️ 列文件 {f.name} 尾部有 {f.tell() - expected} 字节不完整数据，已截断")
+                f.truncate(expected)
+                f.seek(expected)
+            self._files[name] = f
+
+    def append(self, orders: List[ForceOrder]):
+        columns = {name: array(typecode) for name, typecode in COLUMN_TYPES.items()}
+        dictionary_changed = False
+        for order in orders:
+            for name, _ in NUMERIC_COLUMNS:
+                columns[name].append(getattr(order, name))
+            for name in DICT_COLUMNS:
+                value = getattr(order, name)
+                code = self._codes[name].get(value)
+                if code is None:
+                    code = self._codes[name][value] = len(self.dictionary[name])
+                    self.dictionary[name].append(value)
+                    dictionary_changed = True
+                columns[name].append(code)
+        if dictionary_changed:
+            self._save_dictionary()
+        for name, values in columns.items():
+            values.tofile(self._files[name])
+        self.rows += len(orders)
+
+    def _save_dictionary(self):
+        target = os.path.join(self.path, DICTIONARY_FILE)
+        temp = target + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(self.dictionary, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, target)
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def sync(self):
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        for f in self._files.values():
+            if not f.closed:
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+
+class PartitionView:
+    """单个分区的只读视图：列文件通过mmap映射，按列提供零拷贝的memoryview（或NumPy数组）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # 先确定行数再读取字典，保证字典覆盖已计入的全部编码
+        self.rows = _row_count(path)
+        self.dictionary = _load_dictionary(path)
+        self._maps = {}
+        self._views = {}
+        for name, typecode in COLUMN_TYPES.items():
+            length = self.rows * array(typecode).itemsize
+            if not length:
+                self._views[name] = memoryview(array(typecode))
+                continue
+            with open(os.path.join(path, name + ".col"), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[name] = mapped
+            self._views[name] = memoryview(mapped)[:length].cast(typecode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def column(self, name: str) -> memoryview:
+        """列的memoryview（零拷贝）"""
+        return self._views[name]
+
+    def array(self, name: str):
+        """列的NumPy数组（零拷贝，需要安装numpy）"""
+        return np.frombuffer(self._views[name], dtype=NUMPY_DTYPES[COLUMN_TYPES[name]])
+
+    def codes(self, name: str, values: Iterable[str]) -> List[int]:
+        """取值对应的字典编码（分区中不存在的取值被忽略）"""
+        lookup = {value: code for code, value in enumerate(self.dictionary[name])}
+        return [lookup[value] for value in values if value in lookup]
+
+    def select(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+               symbols: Optional[Iterable[str]] = None):
+        """事件时间在 [start_ms, end_ms) 内且币对匹配的行号，按事件时间排序"""
+        symbol_codes = None if symbols is None else self.codes("symbol", symbols)
+        if symbol_codes is not None and not symbol_codes:
+            return []
+        if np is not None:
+            times = self.array("event_time")
+            mask = np.ones(self.rows, dtype=bool)
+            if start_ms is not None:
+                mask &= times >= start_ms
+            if end_ms is not None:
+                mask &= times < end_ms
+            if symbol_codes is not None:
+                mask &= np.isin(self.array("symbol"), symbol_codes)
+            index = np.flatnonzero(mask)
+            return index[np.argsort(times[index], kind="stable")]
+        times = self._views["event_time"]
+        symbol_column = self._views["symbol"]
+        wanted = None if symbol_codes is None else set(symbol_codes)
+        index = [i for i in range(self.rows)
+                 if (start_ms is None or times[i] >= start_ms)
+                 and (end_ms is None or times[i] < end_ms)
+                 and (wanted is None or symbol_column[i] in wanted)]
+        index.sort(key=times.__getitem__)
+        return index
+
+    def order_at(self, i: int) -> ForceOrder:
+        """还原第i行为ForceOrder"""
+        views = self._views
+        decoded = {name: self.dictionary[name][views[name][i]] for name in DICT_COLUMNS}
+        return ForceOrder(
+            event_time=views["event_time"][i],
+            trade_time=views["trade_time"][i],
+            quantity=views["quantity"][i],
+            price=views["price"][i],
+            avg_price=views["avg_price"][i],
+            last_qty=views["last_qty"][i],
+            cum_qty=views["cum_qty"][i],
+            received_at=views["received_at"][i],
+            **decoded
+        )
+
+    def close(self):
+        """释放各列的视图并关闭映射；仍被外部NumPy数组引用的列跳过，随数组回收后释放"""
+        for name, view in self._views.items():
+            try:
+                view.release()
+                mapped = self._maps.get(name)
+                if mapped is not None:
+                    mapped.close()
+            except BufferError:
+                continue
+
+class ColumnarStore:
+    """按天分区的列式强平订单存储
+
+    每个分区是一个目录 YYYYMMDD/，定长字段各占一个列文件（array原生字节序），
+    币对/方向/状态等字符串按分区字典编码。读取通过mmap映射，按时间和币对的扫描是零拷贝的，
+    安装numpy时整列向量化过滤。
+    """
+
+    def __init__(self, directory: str, retention_days: int = 30, read_only: bool = False):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.read_only = read_only
+        self._writers: Dict[str, _PartitionWriter] = {}
+        self._last_prune_day = None
+        os.makedirs(directory, exist_ok=True)
+
+    def list_partitions(self) -> List[str]:
+        """按日期顺序列出现有分区"""
+        return sorted(name for name in os.listdir(self.directory)
+                      if len(name) == 8 and name.isdigit() and os.path.isdir(os.path.join(self.directory, name)))
+
+    def partitions(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> List[str]:
+        """与 [start_ms, end_ms) 有交集的分区"""
+        return [key for key in self.list_partitions()
+                if (start_ms is None or partition_start(key) + DAY_MS > start_ms)
+                and (end_ms is None or partition_start(key) < end_ms)]
+
+    def is_empty(self) -> bool:
+        return not any(_row_count(os.path.join(self.directory, key)) for key in self.list_partitions())
+
+    def append_many(self, orders: List[ForceOrder]):
+        """按事件时间所在日期追加到对应分区"""
+        if self.read_only:
+            raise RuntimeError("列式存储以只读模式打开，不能写入")
+        grouped: Dict[str, List[ForceOrder]] = {}
+        for order in orders:
+            grouped.setdefault(partition_key(order.event_time), []).append(order)
+        for key, batch in grouped.items():
+            writer = self._writers.get(key)
+            if writer is None:
+                writer = self._writers[key] = _PartitionWriter(os.path.join(self.directory, key))
+            writer.append(batch)
+            writer.flush()
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        """每天清理一次超出保留天数的分区，并关闭前一天以前的写入文件"""
+        today = partition_key(int(time.time() * 1000))
+        if today == self._last_prune_day:
+            return
+        self._last_prune_day = today
+        cutoff = partition_key(int(time.time() * 1000) - self.retention_days * DAY_MS) if self.retention_days else None
+        yesterday = partition_key(int(time.time() * 1000) - DAY_MS)
+        for key in list(self._writers):
+            if key < yesterday:
+                self._writers.pop(key).close()
+        if cutoff is None:
+            return
+        for key in self.list_partitions():
+            if key < cutoff:
+                writer = self._writers.pop(key, None)
+                if writer:
+                    writer.close()
+                shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+                logger.info(f"已删除超出保留期的列式分区 {key}")
+
+    def open_partition(self, key: str) -> PartitionView:
+        """以只读视图打开分区"""
+        writer = self._writers.get(key)
+        if writer:
+            writer.flush()
+        return PartitionView(os.path.join(self.directory, key))
+
+    def scan(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+             symbols: Optional[Iterable[str]] = None) -> Iterator[ForceOrder]:
+        """按事件时间顺序流式读取 [start_ms, end_ms) 内的强平订单"""
+        symbols = None if symbols is None else list(symbols)
+        for key in self.partitions(start_ms, end_ms):
+            with self.open_partition(key) as view:
+                for i in view.select(start_ms, end_ms, symbols):
+                    yield view.order_at(int(i))
+
+    def latest(self, start_ms: Optional[int] = None, symbols: Optional[Iterable[str]] = None,
+               limit: int = 100) -> List[ForceOrder]:
+        """最新的limit条强平订单（按时间正序），从最新的分区往前读取"""
+        symbols = None if symbols is None else list(symbols)
+        result: List[ForceOrder] = []
+        for key in reversed(self.partitions(start_ms)):
+            with self.open_partition(key) as view:
+                index = view.select(start_ms, None, symbols)
+                take = index[max(0, len(index) - (limit - len(result))):]
+                result[:0] = [view.order_at(int(i)) for i in take]
+            if len(result) >= limit:
+                break
+        return result
+
+    def column_batches(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                       symbols: Optional[Iterable[str]] = None,
+                       columns: Iterable[str] = ("event_time", "symbol", "side", "quantity", "price", "notional")
+                       ) -> Iterator[Dict[str, Any]]:
+        """按分区产生已过滤、按时间排序的NumPy列（需要安装numpy），字典列同时给出该分区的取值列表"""
+        if np is None:
+            raise RuntimeError("按列读取需要安装numpy: pip install numpy")
+        symbols = None if symbols is None else list(symbols)
+        columns = list(columns)
+        for key in self.partitions(start_ms, end_ms):
+            with self.open_partition(key) as view:
+                index = view.select(start_ms, end_ms, symbols)
+                if not len(index):
+                    continue
+                batch = {name: view.array(name)[index] for name in columns}
+                batch["dictionary"] = {name: list(view.dictionary[name]) for name in columns if name in DICT_COLUMNS}
+                # 选取后的数组已是副本，不再引用映射
+            yield batch
+
+    def count_by_symbol(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[str, int]:
+        """按币对统计 [start_ms, end_ms) 内的强平订单数"""
+        counts: Dict[str, int] = {}
+        for key in self.partitions(start_ms, end_ms):
+            with self.open_partition(key) as view:
+                index = view.select(start_ms, end_ms)
+                if np is not None:
+                    per_code = np.bincount(view.array("symbol")[index], minlength=len(view.dictionary["symbol"]))
+                    pairs = zip(view.dictionary["symbol"], per_code.tolist())
+                else:
+                    per_code = [0] * len(view.dictionary["symbol"])
+                    symbol_column = view.column("symbol")
+                    for i in index:
+                        per_code[symbol_column[i]] += 1
+                    pairs = zip(view.dictionary["symbol"], per_code)
+                for symbol, count in pairs:
+                    if count:
+                        counts[symbol] = counts.get(symbol, 0) + count
+        return counts
+
+    def sync(self):
+        for writer in self._writers.values():
+            writer.sync()
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        partitions = self.list_partitions()
+        rows = 0
+        size = 0
+        for key in partitions:
+            path = os.path.join(self.directory, key)
+            rows += _row_count(path)
+            size += sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        return {
+            "partitions": len(partitions),
+            "oldest": partitions[0] if partitions else None,
+            "newest": partitions[-1] if partitions else None,
+            "rows": rows,
+            "bytes": size,
+        }
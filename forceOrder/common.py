@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
 
-
-
+def to_rfc3339(timestamp_ms: int) -> str:
+    """毫秒时间戳转换为Flux时间字面量"""
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
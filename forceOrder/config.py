@@ -2,6 +2,8 @@
 
 # 币安WebSocket配置
 BINANCE_WS_BASE_URL = "wss://fstream.binance.com/ws"
+# 组合流地址：/stream?streams=a/b/c，消息带有 {"stream": ..., "data": ...} 外层
+BINANCE_WS_STREAM_URL = "wss://fstream.binance.com/stream"
 
 # 监控模式选择
 MONITOR_MODE = "all_market"  # "all_market" 或 "specific_symbols"
@@ -18,6 +20,35 @@ SYMBOLS = [
 # 全市场强平订单流名称
 ALL_MARKET_STREAM = "!forceOrder@arr"
 
+# WebSocket连接配置
+CONNECTION_CONFIG = {
+    "streams_per_connection": 50,   # 每个连接订阅的最大数据流数量（币安单连接上限为200）
+    "reconnect_delay": 1,           # 重连退避基数（秒），实际等待在 [0, 基数×2^失败次数] 内随机
+    "max_reconnect_delay": 60,      # 重连退避上限（秒），收到正常数据后退避清零
+    "rotate_interval": 82800,       # 连接存活多久后预热轮换（秒），币安单个连接最长24小时，0表示关闭
+    "max_gap_history": 100,         # 保留的数据中断记录条数
+    "redundancy": 1,                # 每个分片的冗余连接数，大于1时同一事件取最先到达的一份
+    "dedup_window": 10,             # 去重时间窗口（秒）
+    "dedup_max_entries": 100000,    # 去重索引最大条数
+    "ping_interval": 20,            # 看门狗发送ping的间隔（秒），0表示关闭看门狗
+    "ping_timeout": 10,             # ping超过该时间未响应视为连接失效（秒）
+    "stale_timeout": 900,           # 超过该时间未收到任何消息时主动重连（秒），0表示不检查
+    "max_feed_lag": 5000,           # 推送延迟(接收时间-事件时间E)平滑值超过该值时主动重连（毫秒），0表示不检查
+}
+
+# JSON解析后端: "auto" 自动选择(msgspec > orjson > json), 也可指定 "msgspec" / "orjson" / "json"
+# msgspec 和 orjson 为可选依赖，未安装时自动回退到标准库json
+JSON_DECODER = "auto"
+
+# 接入队列配置（WebSocket接收与数据存储之间的缓冲）
+INGEST_CONFIG = {
+    "queue_size": 10000,                # 队列容量(按消息计，数组消息整体算一条)
+    "workers": 2,                       # 消费者数量
+    "overflow_policy": "block",         # 队列满时: "block" 阻塞接收, "drop_oldest" 丢弃最旧, "spill" 溢出到磁盘
+    "spill_file": "ingest_spill.jsonl", # 溢出文件路径
+    "metrics_interval": 60              # 队列指标输出间隔(秒)，0表示关闭
+}
+
 # InfluxDB配置
 INFLUXDB_CONFIG = {
     "url": "http://localhost:8086",
@@ -27,6 +58,142 @@ INFLUXDB_CONFIG = {
     "measurement": "force_orders"
 }
 
+# 存储模式: "influxdb" 写入InfluxDB（不可用时切换到离线模式）、"sqlite" 写入本地SQLite数据库、"offline" 只使用离线存储
+STORAGE_MODE = "influxdb"
+
+# SQLite存储配置（STORAGE_MODE = "sqlite" 时使用）
+SQLITE_CONFIG = {
+    "path": "force_orders.db",   # 数据库文件
+    "synchronous": "NORMAL",     # WAL模式下NORMAL只在检查点时fsync，崩溃不会损坏数据库
+    "busy_timeout": 5.0,         # 等待数据库锁的最长时间(秒)
+    "cached_statements": 128,    # 每个连接缓存的预编译语句数
+    "batch_size": 1000,          # 每个事务最多插入的条数
+    "flush_interval": 1.0,       # 批次最长等待时间(秒)
+    "buffer_size": 50000,        # 写入缓冲区容量，满时丢弃新数据
+    "max_retries": 3             # 单批写入失败后的重试次数
+}
+
+# InfluxDB写入配置
+INFLUXDB_WRITE_CONFIG = {
+    "mode": "batching",         # "batching" 后台批量写入 或 "synchronous" 逐条同步写入
+    "batch_size": 500,          # 每批最多写入的数据点数
+    "flush_interval": 1.0,      # 批次最长等待时间(秒)
+    "max_in_flight": 2,         # 同时进行中的最大批次数
+    "buffer_size": 50000,       # 写入缓冲区容量，满时丢弃新数据
+    "max_retries": 3            # 单批写入失败后的重试次数
+}
+
+# 预写日志配置：启用后每条强平订单先写入本地分段日志，再由后台线程回放到InfluxDB
+# InfluxDB不可用时数据保留在磁盘上，恢复后自动补写，重启后从已提交位置继续
+SPOOL_CONFIG = {
+    "enabled": True,
+    "directory": "force_orders_spool",        # 预写日志目录（含回放进度文件 committed.json）
+    "batch_size": 5000,                       # 每次回放写入的最大条数
+    "replay_interval": 1.0,                   # 没有新数据时的回放检查间隔(秒)
+    "retry_delay": 1.0,                       # 连接/写入失败后的初始重试间隔(秒)，按指数退避
+    "max_retry_delay": 60.0,                  # 最长重试间隔(秒)
+    "max_segment_bytes": 16 * 1024 * 1024,    # 单个分段最大字节数
+    "fsync_batch": 100,                       # 每写入N条记录执行一次fsync
+    "fsync_interval": 1.0                     # 距上次fsync超过N秒时执行fsync
+}
+
+# InfluxDB写入熔断配置：失败率或慢调用率超过阈值时打开熔断，新数据转存到离线存储（启用预写日志时暂停回放）
+# 打开 open_duration 秒后放行试探写入，成功后自动切换回InfluxDB
+BREAKER_CONFIG = {
+    "enabled": True,
+    "window": 20,                # 统计最近N次写入
+    "min_calls": 5,              # 至少N次写入后才计算比率
+    "failure_rate": 0.5,         # 失败率阈值
+    "slow_call_latency": 5.0,    # 单次写入超过N秒记为慢调用
+    "slow_call_rate": 0.8,       # 慢调用率阈值
+    "open_duration": 30.0,       # 熔断打开后多少秒开始试探(秒)
+    "half_open_calls": 1         # 半开状态放行的试探写入次数
+}
+
+# 写入校验配置（后台执行，不阻塞写入）
+VERIFY_CONFIG = {
+    "enabled": True,
+    "sample_rate": 100,          # 每N条确认写入的数据抽样回查1条，0表示关闭抽样
+    "verify_delay": 10.0,        # 写入确认后等待多少秒再回查(秒)
+    "reconcile_interval": 60.0,  # 按币对/分钟对账的周期(秒)，0表示关闭对账
+    "max_pending_samples": 1000  # 待回查抽样的最大数量
+}
+
+# 写入端汇总配置：按分辨率累计每个币对/方向的条数、数量、名义价值、最大单笔和VWAP，
+# 写入 {measurement}_{名称} 测量（如 force_orders_1m），查询汇总时优先读取最粗的分辨率
+ROLLUP_CONFIG = {
+    "enabled": True,
+    "resolutions": {"1m": 60, "1h": 3600},  # 名称: 桶宽度(秒)
+    "retain_buckets": 2                     # 已结束的桶在内存中保留的数量，用于接收迟到的数据
+}
+
+# 离线存储配置（InfluxDB不可用时使用）
+OFFLINE_STORE_CONFIG = {
+    "directory": "force_orders_segments",     # 分段日志目录
+    "max_segment_bytes": 16 * 1024 * 1024,    # 单个分段最大字节数，超过后滚动到新分段
+    "max_segments": 20,                       # 最多保留的分段数量
+    "fsync_batch": 100,                       # 每写入N条记录执行一次fsync
+    "fsync_interval": 1.0,                    # 距上次fsync超过N秒时执行fsync
+    "max_orders": 1000,                       # 内存中保留的最近订单数
+    "per_symbol_capacity": 1000,              # 每个币对内存中保留的订单数
+    "batch_size": 1000,                       # 后台线程每批写入的最大条数
+    "flush_interval": 1.0,                    # 批次最长等待时间(秒)
+    "buffer_size": 50000,                     # 写入缓冲区容量，满时丢弃新数据
+    "max_retries": 3                          # 单批写入失败后的重试次数
+}
+
+# 列式历史存储配置（离线模式下保留数周全市场数据，按天分区、mmap读取）
+COLUMNAR_STORE_CONFIG = {
+    "enabled": True,                          # 是否同时写入列式存储
+    "directory": "force_orders_columns",      # 列式存储目录，每天一个分区子目录
+    "retention_days": 30                      # 保留天数，0 表示不清理
+}
+
+# 币对注册表配置（全市场模式下按数据流动态登记币对）
+SYMBOL_REGISTRY_CONFIG = {
+    "max_symbols": 500,   # 内存中最多索引的币对数量，超出时淘汰最久未活跃的币对
+    "idle_ttl": 86400     # 超过N秒没有新数据的币对会被淘汰(秒)，0表示不按空闲时间淘汰
+}
+
+# 实时聚合配置（按币对和方向维护滑动窗口统计）
+AGGREGATOR_CONFIG = {
+    "windows": [10, 60, 300, 3600],  # 滑动窗口长度(秒)
+    "buckets": 60,                   # 每个窗口的分桶数量，越多越精确
+    "report_window": 60,             # 定期输出的窗口(秒)，需在 windows 中
+    "report_interval": 60,           # 输出市场强平压力的间隔(秒)，0表示关闭
+    "report_top": 5                  # 输出强平名义价值最高的前N个币对
+}
+
 # 日志配置
 LOG_LEVEL = "INFO"
-LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s" 
\ No newline at end of file
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# 日志输出配置
+LOGGING_CONFIG = {
+    "mode": "production",        # "production" 后台线程输出、每笔强平一行；"verbose" 同步输出逐笔详细信息
+    "file": "force_order_monitor.log",
+    "max_bytes": 50 * 1024 * 1024,   # 单个日志文件最大字节数，超过后滚动
+    "backup_count": 5,           # 保留的历史日志文件数
+    "console": True,             # 是否同时输出到控制台
+    "event_sample_rate": 1,      # production模式下每N笔强平输出1行，强平潮时可调大
+    "queue_size": 10000          # 日志队列容量，满时丢弃新日志
+}
+
+# 运行指标配置（Prometheus文本格式）
+METRICS_CONFIG = {
+    "enabled": True,
+    "host": "127.0.0.1",         # 指标服务监听地址，Prometheus抓取 http://host:port/metrics
+    "port": 9108,                # 0表示不启动指标服务
+    "file": None,                # 定期写入的指标文件路径（如 node_exporter textfile 目录下的 .prom 文件），None表示不写文件
+    "interval": 15,              # 写入指标文件、输出吞吐日志的间隔(秒)
+    "log_rates": True            # 是否在日志中定期输出接收/解析/写入速率
+}
+
+# 端到端延迟追踪配置（每笔强平在接收、解析、入队、开始写入、写入确认时打时间戳）
+LATENCY_CONFIG = {
+    "enabled": True,
+    "per_symbol": True,              # 是否按币对分别统计（否则只统计全部币对合计）
+    "sub_bucket_bits": 8,            # 直方图精度，8位时相对误差约0.8%
+    "file": "latency_histograms.json",   # 直方图导出文件，用 latency_report.py 查看
+    "interval": 60,                  # 导出间隔(秒)，同时在日志中输出各阶段p50/p99，0表示只在退出时导出
+}
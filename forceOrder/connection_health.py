@@ -0,0 +1,83 @@
+import time
+from typing import Any, Dict, Optional
+
+class ConnectionHealth:
+    """单个连接的健康指标：ping往返时间、距上一条消息的时间、推送延迟（本地接收时间 - 事件时间E）"""
+
+    def __init__(self,
+                 ping_timeout: float = 10,
+                 stale_timeout: float = 900,
+                 max_feed_lag: float = 5000,
+                 lag_alpha: float = 0.1):
+        self.ping_timeout = ping_timeout
+        self.stale_timeout = stale_timeout
+        self.max_feed_lag = max_feed_lag
+        self.lag_alpha = lag_alpha
+
+        self.rtt_last = None
+        self.rtt_max = 0.0
+        self._rtt_sum = 0.0
+        self._rtt_count = 0
+        self.ping_timeouts = 0
+        self.lag_last = None
+        self.lag_ewma = None
+        self.lag_max = 0.0
+        self.last_frame_at = time.monotonic()
+        self._missed_pong = False
+
+    def reset(self, now: Optional[float] = None):
+        """新连接启用时重置与连接相关的状态（累计统计保留）"""
+        self.last_frame_at = time.monotonic() if now is None else now
+        self.lag_ewma = None
+        self._missed_pong = False
+
+    def on_frame(self, now: float):
+        self.last_frame_at = now
+
+    def on_pong(self, rtt: float):
+        """记录ping往返时间(秒)"""
+        self._missed_pong = False
+        self.rtt_last = rtt
+        self._rtt_sum += rtt
+        self._rtt_count += 1
+        if rtt > self.rtt_max:
+            self.rtt_max = rtt
+
+    def on_ping_timeout(self):
+        self.ping_timeouts += 1
+        self._missed_pong = True
+
+    def record_lag(self, lag_ms: float):
+        """记录推送延迟(毫秒)，本地时钟偏差会直接计入该值"""
+        self.lag_last = lag_ms
+        if self.lag_ewma is None:
+            self.lag_ewma = lag_ms
+        else:
+            self.lag_ewma += self.lag_alpha * (lag_ms - self.lag_ewma)
+        if lag_ms > self.lag_max:
+            self.lag_max = lag_ms
+
+    def check(self, now: Optional[float] = None) -> Optional[str]:
+        """超过阈值时返回原因，健康时返回None"""
+        now = time.monotonic() if now is None else now
+        if self._missed_pong:
+            return f"ping超过 {self.ping_timeout} 秒未响应"
+        idle = now - self.last_frame_at
+        if self.stale_timeout and idle > self.stale_timeout:
+            return f"{idle:.0f} 秒未收到数据"
+        if self.max_feed_lag and self.lag_ewma is not None and self.lag_ewma > self.max_feed_lag:
+            return f"推送延迟 {self.lag_ewma:.0f} 毫秒"
+        return None
+
+    def get_stats(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.monotonic() if now is None else now
+        return {
+            "rtt_ms": round(self.rtt_last * 1000, 3) if self.rtt_last is not None else None,
+            "rtt_avg_ms": round(self._rtt_sum / self._rtt_count * 1000, 3) if self._rtt_count else None,
+            "rtt_max_ms": round(self.rtt_max * 1000, 3),
+            "ping_timeouts": self.ping_timeouts,
+            "idle_seconds": round(now - self.last_frame_at, 3),
+            "feed_lag_ms": round(self.lag_last, 1) if self.lag_last is not None else None,
+            "feed_lag_ewma_ms": round(self.lag_ewma, 1) if self.lag_ewma is not None else None,
+            "feed_lag_max_ms": round(self.lag_max, 1),
+        }
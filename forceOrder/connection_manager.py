@@ -0,0 +1,327 @@
+import asyncio
+import logging
+import random
+import time
+import websockets
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from config import BINANCE_WS_STREAM_URL
+from connection_health import ConnectionHealth
+
+logger = logging.getLogger(__name__)
+
+class ShardConnection:
+    """单个WebSocket分片连接：由监督循环负责接收、重连和定期轮换"""
+
+    def __init__(self,
+                 shard_id: int,
+                 streams: List[str],
+                 on_message: Callable[[Any, str, float], Awaitable[None]],
+                 reconnect_delay: float = 1,
+                 max_reconnect_delay: float = 60,
+                 rotate_interval: float = 0,
+                 max_gap_history: int = 100,
+                 replica: Optional[int] = None,
+                 ping_interval: float = 20,
+                 ping_timeout: float = 10,
+                 stale_timeout: float = 900,
+                 max_feed_lag: float = 5000):
+        self.shard_id = shard_id
+        self.replica = replica
+        # 冗余连接的名称为 "分片序号.副本序号"
+        self.name = str(shard_id) if replica is None else f"{shard_id}.{replica}"
+        self.streams = streams
+        self.url = build_stream_url(streams)
+        self.on_message = on_message
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.rotate_interval = rotate_interval
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.health = ConnectionHealth(ping_timeout, stale_timeout, max_feed_lag)
+        self.proactive_reconnects = 0
+        self.websocket = None
+        self.is_connected = False
+        self.running = False
+        self.messages = 0
+        self.reconnects = 0
+        self.rotations = 0
+        self.connected_at = None
+        # 连续失败次数，收到正常数据后清零
+        self._attempt = 0
+        self._healthy = False
+        # 数据中断记录 (开始, 结束, 持续秒数)
+        self._gap_start = None
+        self.gaps = deque(maxlen=max_gap_history)
+        self.total_gap_seconds = 0.0
+        self._rotate_lock = asyncio.Lock()
+
+    async def run(self):
+        """监督循环：建立连接并接收消息，断开后按全抖动指数退避重连，直到被停止"""
+        self.running = True
+        rotate_task = asyncio.create_task(self._rotate_loop()) if self.rotate_interval else None
+        watchdog_task = asyncio.create_task(self._watchdog_loop()) if self.ping_interval else None
+        try:
+            while self.running:
+                if self.websocket is None:
+                    try:
+                        websocket = await self._open()
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.error(f"❌ [分片{self.name}] 连接失败: {e}")
+                        self._mark_down()
+                        await self._backoff()
+                        continue
+                    self._activate(websocket)
+
+                websocket = self.websocket
+                await self._receive(websocket)
+
+                # 轮换时 self.websocket 已切换到新连接，直接继续读取新连接
+                if self.websocket is websocket:
+                    self.websocket = None
+                    self.is_connected = False
+                    if self.running:
+                        logger.warning(f"⚠️ [分片{self.name}] WebSocket连接已关闭")
+                        self._mark_down()
+                        await self._backoff()
+        finally:
+            if rotate_task:
+                rotate_task.cancel()
+            if watchdog_task:
+                watchdog_task.cancel()
+            self.is_connected = False
+
+    async def _open(self):
+        """建立新连接"""
+        logger.info(f"[分片{self.name}] 正在连接 {len(self.streams)} 个数据流")
+        logger.debug(f"[分片{self.name}] 连接地址: {self.url}")
+        # 关闭websockets自带的心跳，由看门狗自行发送ping并测量往返时间
+        return await websockets.connect(self.url, ping_interval=None)
+
+    def _activate(self, websocket):
+        """启用新连接，并结束正在进行的中断记录"""
+        self.websocket = websocket
+        self.is_connected = True
+        self.connected_at = time.time()
+        self._healthy = False
+        self.health.reset()
+        logger.info(f"✅ [分片{self.name}] 成功连接到币安WebSocket")
+        if self._gap_start is not None:
+            end = time.time()
+            duration = end - self._gap_start
+            self.gaps.append((self._gap_start, end, duration))
+            self.total_gap_seconds += duration
+            self._gap_start = None
+            logger.warning(f"⚠️ [分片{self.name}] 数据中断 {duration:.1f} 秒 "
+                           f"({datetime.fromtimestamp(end - duration).strftime('%H:%M:%S')} - "
+                           f"{datetime.fromtimestamp(end).strftime('%H:%M:%S')})")
+
+    def _mark_down(self):
+        """记录中断开始时间（连续失败只记一次）"""
+        if self._gap_start is None:
+            self._gap_start = time.time()
+
+    async def _backoff(self):
+        """全抖动指数退避：在 [0, min(上限, 基数×2^失败次数)] 内随机等待"""
+        if not self.running:
+            return
+        self.reconnects += 1
+        delay = random.uniform(0, min(self.max_reconnect_delay, self.reconnect_delay * 2 ** self._attempt))
+        self._attempt += 1
+        logger.info(f"⏳ [分片{self.name}] 等待 {delay:.1f} 秒后重连...")
+        await asyncio.sleep(delay)
+
+    async def _receive(self, websocket):
+        """读取单个连接直到关闭"""
+        try:
+            async for message in websocket:
+                received_at = time.monotonic()
+                self.health.on_frame(received_at)
+                self.messages += 1
+                if not self._healthy:
+                    # 收到正常数据后清零退避
+                    self._healthy = True
+                    self._attempt = 0
+                try:
+                    await self.on_message(message, self.name, received_at)
+                except Exception as e:
+                    logger.error(f"❌ [分片{self.name}] 处理消息失败: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ [分片{self.name}] 接收消息时发生错误: {e}")
+
+    async def rotate(self) -> bool:
+        """预热轮换：先建立新连接，切换后再关闭旧连接，不产生数据中断
+
+        新旧连接重叠期间的事件可能同时出现在两个连接上。
+        """
+        async with self._rotate_lock:
+            old = self.websocket
+            if not self.running or old is None:
+                return False
+            try:
+                websocket = await self._open()
+            except Exception as e:
+                logger.warning(f"⚠️ [分片{self.name}] 轮换时建立新连接失败，继续使用旧连接: {e}")
+                return False
+            self.rotations += 1
+            self._activate(websocket)
+            await old.close()
+            logger.info(f"🔄 [分片{self.name}] 已切换到新连接")
+            return True
+
+    async def _rotate_loop(self):
+        """连接存活超过轮换间隔后主动轮换（币安单个连接最长保持24小时）"""
+        while self.running:
+            await asyncio.sleep(min(60, self.rotate_interval))
+            if self.connected_at and time.time() - self.connected_at >= self.rotate_interval:
+                await self.rotate()
+
+    async def _watchdog_loop(self):
+        """看门狗：定期发送ping测量往返时间，检查消息间隔和推送延迟，超过阈值时主动重连"""
+        while self.running:
+            await asyncio.sleep(self.ping_interval)
+            websocket = self.websocket
+            if websocket is None:
+                continue
+            try:
+                started = time.monotonic()
+                pong_waiter = await websocket.ping()
+                await asyncio.wait_for(pong_waiter, self.ping_timeout)
+                self.health.on_pong(time.monotonic() - started)
+            except asyncio.TimeoutError:
+                self.health.on_ping_timeout()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 连接已关闭，由监督循环负责重连
+                logger.debug(f"[分片{self.name}] 发送ping失败: {e}")
+                continue
+            if websocket is not self.websocket:
+                continue
+            reason = self.health.check()
+            if reason:
+                await self._recover(reason)
+
+    async def _recover(self, reason: str):
+        """主动重连：优先预热轮换，新连接建立失败时关闭当前连接交给监督循环重连"""
+        self.proactive_reconnects += 1
+        logger.warning(f"⚠️ [分片{self.name}] 连接不健康（{reason}），主动重连")
+        if await self.rotate():
+            return
+        websocket = self.websocket
+        if websocket is not None:
+            await websocket.close()
+
+    async def close(self):
+        """停止重连并关闭连接"""
+        self.running = False
+        if self.websocket:
+            await self.websocket.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "shard": self.shard_id,
+            "connection": self.name,
+            "streams": len(self.streams),
+            "connected": self.is_connected,
+            "messages": self.messages,
+            "reconnects": self.reconnects,
+            "rotations": self.rotations,
+            "proactive_reconnects": self.proactive_reconnects,
+            "gaps": len(self.gaps),
+            "gap_seconds": round(self.total_gap_seconds, 3),
+            **self.health.get_stats(),
+        }
+
+class ShardedConnectionManager:
+    """分片连接管理器：使用组合流地址 /stream?streams=，把数据流分配到多个连接上
+
+    redundancy > 1 时每个分片建立多个相同订阅的连接，同一事件会从多个连接到达，
+    由消息处理方按到达先后去重。
+    """
+
+    def __init__(self,
+                 streams: List[str],
+                 on_message: Callable[[Any, str, float], Awaitable[None]],
+                 streams_per_connection: int = 50,
+                 reconnect_delay: float = 1,
+                 max_reconnect_delay: float = 60,
+                 rotate_interval: float = 0,
+                 max_gap_history: int = 100,
+                 redundancy: int = 1,
+                 ping_interval: float = 20,
+                 ping_timeout: float = 10,
+                 stale_timeout: float = 900,
+                 max_feed_lag: float = 5000):
+        self.streams = streams
+        self.streams_per_connection = max(1, streams_per_connection)
+        self.redundancy = max(1, redundancy)
+        self.shards = [
+            ShardConnection(i, shard_streams, on_message, reconnect_delay, max_reconnect_delay,
+                            rotate_interval, max_gap_history,
+                            replica=replica if self.redundancy > 1 else None,
+                            ping_interval=ping_interval,
+                            ping_timeout=ping_timeout,
+                            stale_timeout=stale_timeout,
+                            max_feed_lag=max_feed_lag)
+            for i, shard_streams in enumerate(split_streams(streams, self.streams_per_connection))
+            for replica in range(self.redundancy)
+        ]
+        self._by_name = {shard.name: shard for shard in self.shards}
+        self._tasks: List[asyncio.Task] = []
+
+    async def run(self):
+        """每个分片作为独立任务运行，直到全部停止"""
+        logger.info(f"共 {len(self.streams)} 个数据流，分为 {len(self.shards) // self.redundancy} 个分片，"
+                    f"每个分片 {self.redundancy} 个连接")
+        self._tasks = [asyncio.create_task(shard.run()) for shard in self.shards]
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def stop(self):
+        """关闭全部分片"""
+        for shard in self.shards:
+            await shard.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def is_connected(self) -> bool:
+        """是否有分片处于连接状态"""
+        return any(shard.is_connected for shard in self.shards)
+
+    async def rotate(self):
+        """依次预热轮换全部分片"""
+        for shard in self.shards:
+            await shard.rotate()
+
+    def record_feed_lag(self, name: str, lag_ms: float):
+        """记录某个连接的推送延迟（由消息处理方解析出事件时间后调用）"""
+        shard = self._by_name.get(name)
+        if shard is not None:
+            shard.health.record_lag(lag_ms)
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        return [shard.get_status() for shard in self.shards]
+
+    def get_gaps(self) -> List[Dict[str, Any]]:
+        """全部分片的数据中断记录，按开始时间排序"""
+        gaps = [
+            {"shard": shard.shard_id, "connection": shard.name, "start": start, "end": end, "duration": duration}
+            for shard in self.shards
+            for start, end, duration in shard.gaps
+        ]
+        return sorted(gaps, key=lambda gap: gap["start"])
+
+def split_streams(streams: List[str], streams_per_connection: int) -> List[List[str]]:
+    """按每个连接的最大数据流数量切分"""
+    return [streams[i:i + streams_per_connection] for i in range(0, len(streams), streams_per_connection)]
+
+def build_stream_url(streams: List[str]) -> str:
+    """组合流地址"""
+    return f"{BINANCE_WS_STREAM_URL}?streams={'/'.join(streams)}"
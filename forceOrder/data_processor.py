@@ -1,100 +1,198 @@
 import logging
 import json
+import os
+import time
 from datetime import datetime
-from typing import Dict, Any, List
-from config import SYMBOLS
+from typing import Dict, Any, Iterator, List, Optional
+from config import SYMBOLS, OFFLINE_STORE_CONFIG, COLUMNAR_STORE_CONFIG, SYMBOL_REGISTRY_CONFIG
+from segment_store import SegmentLog
+from batch_writer import BatchWriter
+from columnar_store import ColumnarStore
+from ring_buffer import TimeIndexedRingBuffer
+from symbol_registry import SymbolRegistry
+from force_order import ForceOrder
+from metrics import EVENTS_PERSISTED, WRITE_FAILURES, WRITE_SECONDS, WRITE_BATCH_SIZE
+from latency import tracker as latency_tracker
 
 logger = logging.getLogger(__name__)
 
 class OfflineDataProcessor:
     """离线数据处理器，用于在没有InfluxDB的情况下处理数据"""
     
-    def __init__(self):
-        self.force_orders = []
-        self.symbol_stats = {symbol: [] for symbol in SYMBOLS}
+    def __init__(self, read_only: bool = False):
+        self.max_orders = OFFLINE_STORE_CONFIG.get("max_orders", 1000)
+        self.per_symbol_capacity = OFFLINE_STORE_CONFIG.get("per_symbol_capacity", 1000)
+        # 按事件时间E排序的环形缓冲区（force_orders与symbol_stats共享同一批记录对象）
+        self.force_orders = TimeIndexedRingBuffer(self.max_orders)
+        # 币对索引随数据流动态增长，配置中的币对常驻，其余按LRU淘汰
+        self.symbol_stats = SymbolRegistry(
+            factory=lambda: TimeIndexedRingBuffer(self.per_symbol_capacity),
+            pinned=SYMBOLS,
+            max_symbols=SYMBOL_REGISTRY_CONFIG.get("max_symbols", 500),
+            idle_ttl=SYMBOL_REGISTRY_CONFIG.get("idle_ttl", 86400)
+        )
         self.data_file = "force_orders_data.json"
+        self.store = SegmentLog(
+            OFFLINE_STORE_CONFIG.get("directory", "force_orders_segments"),
+            max_segment_bytes=OFFLINE_STORE_CONFIG.get("max_segment_bytes", 16 * 1024 * 1024),
+            max_segments=OFFLINE_STORE_CONFIG.get("max_segments", 20),
+            fsync_batch=OFFLINE_STORE_CONFIG.get("fsync_batch", 100),
+            fsync_interval=OFFLINE_STORE_CONFIG.get("fsync_interval", 1.0),
+            read_only=read_only
+        )
+        # 按天分区的列式存储，保留数周的历史数据用于查询（内存索引只保留最近的数据）
+        self.columns = open_columnar_store(read_only)
         self._load_data()
+        # 写入确认/最终失败时的回调（由监控器设置，在写入线程中调用）: on_written(orders)、on_write_failure(orders, error)
+        self.on_written = None
+        self.on_write_failure = None
+        self.batch_writer = None
+        if not read_only:
+            # 分段日志和列文件的写入由后台线程批量完成，不占用事件循环
+            self.batch_writer = BatchWriter(
+                self._write_orders,
+                batch_size=OFFLINE_STORE_CONFIG.get("batch_size", 1000),
+                flush_interval=OFFLINE_STORE_CONFIG.get("flush_interval", 1.0),
+                max_in_flight=1,
+                buffer_size=OFFLINE_STORE_CONFIG.get("buffer_size", 50000),
+                max_retries=OFFLINE_STORE_CONFIG.get("max_retries", 3),
+                name="offline-writer",
+                on_success=self._on_orders_written,
+                on_failure=self._on_write_failed
+            )
     
     def _load_data(self):
-        """从文件加载数据"""
+        """流式读取分段日志，重建内存索引"""
         try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.force_orders = data.get('force_orders', [])
-                self.symbol_stats = data.get('symbol_stats', {symbol: [] for symbol in SYMBOLS})
-            logger.info(f"从文件加载了 {len(self.force_orders)} 条强平订单数据")
-        except FileNotFoundError:
-            logger.info("数据文件不存在，将创建新的数据文件")
+            count = 0
+            skipped = 0
+            # 首次启用列式存储时，把分段日志中已有的数据导入
+            backfill = [] if self.columns is not None and not self.columns.read_only and self.columns.is_empty() else None
+            for order_info, _ in self.store.replay():
+                try:
+                    order = self._decode_record(order_info)
+                except (KeyError, TypeError, ValueError):
+                    skipped += 1
+                    continue
+                self._index_order(order)
+                count += 1
+                if backfill is not None:
+                    backfill.append(order)
+                    if len(backfill) >= 10000:
+                        self.columns.append_many(backfill)
+                        backfill.clear()
+            if backfill:
+                self.columns.append_many(backfill)
+            if skipped:
+                logger.warning(f"跳过 {skipped} 条格式不正确的记录")
+            
+            if count == 0 and not self.store.read_only and os.path.exists(self.data_file):
+                count = self._migrate_legacy_file()
+            
+            logger.info(f"从分段日志加载了 {count} 条强平订单数据，内存中保留 {len(self.force_orders)} 条")
         except Exception as e:
-            logger.error(f"加载数据文件失败: {e}")
+            logger.error(f"加载数据失败: {e}")
+    
+    def _migrate_legacy_file(self) -> int:
+        """将旧版JSON数据文件导入分段日志"""
+        with open(self.data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        orders = data.get('force_orders', [])
+        for order_info in orders:
+            self.store.append(order_info)
+            self._index_order(self._decode_record(order_info))
+        self.store.sync()
+        if self.columns is not None:
+            self.columns.append_many([self._decode_record(order_info) for order_info in orders])
+        os.replace(self.data_file, self.data_file + ".migrated")
+        logger.info(f"已将旧数据文件 {self.data_file} 中的 {len(orders)} 条数据导入分段日志")
+        return len(orders)
     
     def _save_data(self):
-        """保存数据到文件"""
+        """将已追加的数据同步到磁盘"""
         try:
-            data = {
-                'force_orders': self.force_orders,
-                'symbol_stats': self.symbol_stats,
-                'last_updated': datetime.now().isoformat()
-            }
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logger.info("数据已保存到文件")
+            self.store.sync()
+            logger.info("数据已同步到分段日志")
         except Exception as e:
-            logger.error(f"保存数据文件失败: {e}")
+            logger.error(f"同步数据失败: {e}")
+    
+    @staticmethod
+    def _decode_record(order_info: Dict[str, Any]) -> ForceOrder:
+        """将分段日志中的记录还原为ForceOrder"""
+        received_at = datetime.fromisoformat(order_info['timestamp']).timestamp()
+        return ForceOrder.from_event(order_info['data'], received_at=received_at)
+    
+    @staticmethod
+    def _encode_record(order: ForceOrder) -> Dict[str, Any]:
+        """分段日志中的记录格式：接收时间 + 原始事件"""
+        return {
+            'timestamp': datetime.fromtimestamp(order.received_at).isoformat(),
+            'data': order.to_event()
+        }
+    
+    def _index_order(self, order: ForceOrder):
+        """更新内存索引（force_orders与symbol_stats共享同一个ForceOrder对象）"""
+        self.force_orders.append(order.event_time, order)
+        
+        # 按币对分类
+        self.symbol_stats.get_or_create(order.symbol, order.event_time / 1000).append(order.event_time, order)
     
-    def save_force_order(self, force_order_data: Dict[str, Any]):
-        """保存强平订单数据"""
+    def save_force_order(self, order: ForceOrder):
+        """保存单条强平订单数据"""
+        self.save_force_orders([order])
+    
+    def save_force_orders(self, orders: List[ForceOrder]):
+        """批量保存强平订单数据：更新内存索引后放入写入缓冲区立即返回，落盘结果通过 on_written/on_write_failure 回调"""
+        if self.batch_writer is None:
+            raise RuntimeError("离线存储以只读模式打开，不能写入")
+        for order in orders:
+            self._index_order(order)
+        accepted = self.batch_writer.enqueue_many(orders)
+        logger.debug("已加入离线写入缓冲区: %d/%d 条", accepted, len(orders))
+    
+    def _write_orders(self, orders: List[ForceOrder]):
+        """在写入线程中追加到分段日志和列式存储"""
+        started = time.monotonic()
+        persist_start = time.time()
         try:
-            # 添加时间戳
-            order_info = {
-                'timestamp': datetime.now().isoformat(),
-                'data': force_order_data
-            }
-            
-            # 保存到内存
-            self.force_orders.append(order_info)
-            
-            # 按币对分类
-            symbol = force_order_data['o']['s']
-            if symbol in self.symbol_stats:
-                self.symbol_stats[symbol].append(order_info)
-            
-            # 限制内存中的数据量（保留最近1000条）
-            if len(self.force_orders) > 1000:
-                self.force_orders = self.force_orders[-1000:]
-                for sym in self.symbol_stats:
-                    if len(self.symbol_stats[sym]) > 100:
-                        self.symbol_stats[sym] = self.symbol_stats[sym][-100:]
-            
-            # 保存到文件
-            self._save_data()
-            
-            logger.info(f"成功保存强平订单数据: {symbol}")
-            
-        except Exception as e:
-            logger.error(f"保存强平订单数据失败: {e}")
+            # 追加到分段日志，单次写入开销与历史数据量无关
+            self.store.append_many([self._encode_record(order) for order in orders])
+            if self.columns is not None:
+                self.columns.append_many(orders)
+        except Exception:
+            WRITE_FAILURES.labels("offline").inc()
+            raise
+        WRITE_SECONDS.labels("offline").observe(time.monotonic() - started)
+        WRITE_BATCH_SIZE.labels("offline").observe(len(orders))
+        EVENTS_PERSISTED.labels("offline").inc(len(orders))
+        latency_tracker.record_persisted(orders, persist_start, time.time())
+    
+    def _on_orders_written(self, orders: List[ForceOrder]):
+        if self.on_written:
+            self.on_written(orders)
+    
+    def _on_write_failed(self, orders: List[ForceOrder], error: Exception):
+        if self.on_write_failure:
+            self.on_write_failure(orders, error)
+    
+    def flush(self, timeout: float = 30.0) -> bool:
+        """将写入缓冲区中的数据全部写入"""
+        if self.batch_writer:
+            return self.batch_writer.flush(timeout)
+        return True
     
     def query_force_orders_by_symbol(self, symbol: str, hours: int = 24, limit: int = 100):
         """查询指定币对的强平订单"""
         try:
-            if symbol not in self.symbol_stats:
+            if self.columns is not None:
+                # 列式存储保留完整历史，按分区从新到旧读取
+                recent_orders = self.columns.latest(self._cutoff_ms(hours), [symbol], limit)
+            elif symbol not in self.symbol_stats:
                 logger.warning(f"未找到币对 {symbol} 的数据")
                 return []
-            
-            # 过滤最近N小时的数据
-            cutoff_time = datetime.now().timestamp() - (hours * 3600)
-            recent_orders = []
-            
-            for order in self.symbol_stats[symbol]:
-                try:
-                    order_time = datetime.fromisoformat(order['timestamp']).timestamp()
-                    if order_time >= cutoff_time:
-                        recent_orders.append(order)
-                except:
-                    continue
-            
-            # 限制返回数量
-            recent_orders = recent_orders[-limit:]
+            else:
+                # 过滤最近N小时的数据（按事件时间二分查找）
+                recent_orders = self.symbol_stats[symbol].range(self._cutoff_ms(hours), limit=limit)
             
             logger.info(f"找到 {symbol} 最近 {hours} 小时的 {len(recent_orders)} 条强平订单")
             return recent_orders
@@ -103,25 +201,33 @@ class OfflineDataProcessor:
             logger.error(f"查询失败: {e}")
             return []
     
+    @staticmethod
+    def _cutoff_ms(hours: int) -> int:
+        """最近N小时的起始事件时间(毫秒)"""
+        return int(time.time() * 1000) - hours * 3600 * 1000
+    
     def query_all_force_orders(self, hours: int = 24):
         """查询所有币对的强平订单统计"""
         try:
             logger.info(f"查询最近 {hours} 小时所有币对的强平订单统计...")
             
-            for symbol in SYMBOLS:
+            counts = self._count_by_symbol(hours)
+            for symbol in self._symbols_with(counts):
+                # 动态登记的币对只显示有数据的
+                if not self.symbol_stats.is_pinned(symbol) and not counts.get(symbol):
+                    continue
                 print(f"\n=== {symbol} 强平订单统计 ===")
                 orders = self.query_force_orders_by_symbol(symbol, hours, 10)
                 
                 if orders:
                     for order in orders:
-                        data = order['data']['o']
                         print(f"""
-时间: {order['timestamp']}
-交易对: {data.get('s', 'N/A')}
-方向: {data.get('S', 'N/A')}
-数量: {data.get('q', 'N/A')}
-价格: {data.get('p', 'N/A')}
-状态: {data.get('X', 'N/A')}
+时间: {datetime.fromtimestamp(order.event_time / 1000).isoformat()}
+交易对: {order.symbol}
+方向: {order.side}
+数量: {order.quantity}
+价格: {order.price}
+状态: {order.status}
                         """)
                 else:
                     print("无强平订单数据")
@@ -137,10 +243,11 @@ class OfflineDataProcessor:
             total_count = 0
             symbol_counts = {}
             
-            for symbol in SYMBOLS:
-                orders = self.query_force_orders_by_symbol(symbol, hours)
-                count = len(orders)
-                symbol_counts[symbol] = count
+            counts = self._count_by_symbol(hours)
+            for symbol in self._symbols_with(counts):
+                count = counts.get(symbol, 0)
+                if count or self.symbol_stats.is_pinned(symbol):
+                    symbol_counts[symbol] = count
                 total_count += count
             
             print(f"总强平订单数: {total_count}")
@@ -151,10 +258,72 @@ class OfflineDataProcessor:
         except Exception as e:
             logger.error(f"查询汇总失败: {e}")
     
+    def _count_by_symbol(self, hours: int) -> Dict[str, int]:
+        """最近N小时各币对的强平订单数"""
+        cutoff = self._cutoff_ms(hours)
+        if self.columns is not None:
+            return self.columns.count_by_symbol(cutoff)
+        return {symbol: orders.count_since(cutoff) for symbol, orders in self.symbol_stats.items()}
+    
+    def _symbols_with(self, counts: Dict[str, int]) -> List[str]:
+        """已索引的币对加上只出现在历史数据中的币对"""
+        symbols = self.get_symbols()
+        return symbols + sorted(symbol for symbol in counts if symbol not in self.symbol_stats)
+    
+    def get_symbols(self) -> List[str]:
+        """获取当前已索引的全部币对"""
+        return self.symbol_stats.symbols()
+    
+    def close(self):
+        """刷新写入缓冲区，同步并关闭分段日志和列式存储"""
+        if self.batch_writer:
+            logger.info("正在刷新离线写入缓冲区...")
+            self.batch_writer.close()
+            self.batch_writer = None
+        self.store.close()
+        if self.columns is not None:
+            self.columns.close()
+    
     def get_data_summary(self):
         """获取数据摘要"""
         return {
             'total_orders': len(self.force_orders),
             'symbol_counts': {symbol: len(orders) for symbol, orders in self.symbol_stats.items()},
+            'symbol_registry': self.symbol_stats.get_stats(),
+            'columnar_store': self.columns.get_stats() if self.columns is not None else None,
             'last_updated': datetime.now().isoformat()
-        } 
\ No newline at end of file
+        } 
+
+def open_columnar_store(read_only: bool = True) -> Optional[ColumnarStore]:
+    """按配置打开列式存储，未启用时返回None"""
+    if not COLUMNAR_STORE_CONFIG.get("enabled", True):
+        return None
+    return ColumnarStore(
+        COLUMNAR_STORE_CONFIG.get("directory", "force_orders_columns"),
+        retention_days=COLUMNAR_STORE_CONFIG.get("retention_days", 30),
+        read_only=read_only
+    )
+
+def iter_stored_orders(start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Iterator[ForceOrder]:
+    """流式读取本地存储的强平订单（只读，不建立内存索引），可按事件时间 [start_ms, end_ms) 过滤
+
+    启用列式存储时按分区读取（按事件时间排序），否则回放分段日志。
+    """
+    columns = open_columnar_store()
+    if columns is not None and not columns.is_empty():
+        yield from columns.scan(start_ms, end_ms)
+        return
+    store = SegmentLog(OFFLINE_STORE_CONFIG.get("directory", "force_orders_segments"), read_only=True)
+    try:
+        for order_info, _ in store.replay():
+            try:
+                order = OfflineDataProcessor._decode_record(order_info)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if start_ms is not None and order.event_time < start_ms:
+                continue
+            if end_ms is not None and order.event_time >= end_ms:
+                continue
+            yield order
+    finally:
+        store.close()
@@ -0,0 +1,164 @@
+import json
+import logging
+from typing import Any, List, Union
+from force_order import ForceOrder
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+class FrameDecodeError(ValueError):
+    """WebSocket消息解析失败"""
+
+class StdlibDecoder:
+    """标准库json解析"""
+
+    name = "json"
+
+    def __init__(self, combined: bool = False):
+        self._combined = combined
+
+    def decode(self, message: Any) -> Any:
+        """解析为普通的dict/list"""
+        try:
+            return json.loads(message)
+        except ValueError as e:
+            raise FrameDecodeError(str(e)) from e
+
+    def decode_force_orders(self, message: Any) -> List[ForceOrder]:
+        """解析强平订单消息，单条事件和数组批量事件都返回列表，不是强平订单时返回空列表"""
+        return events_to_orders(self.decode(message))
+
+class OrjsonDecoder(StdlibDecoder):
+    """orjson解析"""
+
+    name = "orjson"
+
+    def decode(self, message: Any) -> Any:
+        try:
+            return orjson.loads(message)
+        except orjson.JSONDecodeError as e:
+            raise FrameDecodeError(str(e)) from e
+
+if msgspec is not None:
+    class _OrderStruct(msgspec.Struct):
+        """forceOrder 事件中的订单字段（只声明用到的字段）"""
+        s: str
+        S: str
+        q: float
+        p: float
+        ap: float = 0.0
+        l: float = 0.0
+        z: float = 0.0
+        T: int = 0
+        X: str = "UNKNOWN"
+        o: str = "UNKNOWN"
+        f: str = "UNKNOWN"
+
+    class _EventStruct(msgspec.Struct):
+        """forceOrder 事件"""
+        e: str
+        E: int
+        o: _OrderStruct
+
+    class _CombinedStruct(msgspec.Struct):
+        """组合流消息外层 {"stream": ..., "data": ...}"""
+        stream: str
+        data: Union[_EventStruct, List[_EventStruct]]
+
+class MsgspecDecoder(StdlibDecoder):
+    """msgspec解析：按schema直接解析为结构体，跳过中间dict"""
+
+    name = "msgspec"
+
+    def __init__(self, combined: bool = False):
+        self._generic = msgspec.json.Decoder()
+        self._combined = combined
+        # strict=False 允许把币安以字符串表示的数字直接转换为float
+        schema = _CombinedStruct if combined else Union[_EventStruct, List[_EventStruct]]
+        self._event = msgspec.json.Decoder(schema, strict=False)
+
+    def decode(self, message: Any) -> Any:
+        try:
+            return self._generic.decode(message)
+        except msgspec.DecodeError as e:
+            raise FrameDecodeError(str(e)) from e
+
+    def decode_force_orders(self, message: Any) -> List[ForceOrder]:
+        try:
+            decoded = self._event.decode(message)
+        except msgspec.ValidationError:
+            # 不完全符合强平订单格式的消息，按普通JSON逐条处理
+            return events_to_orders(self.decode(message))
+        except msgspec.DecodeError as e:
+            raise FrameDecodeError(str(e)) from e
+        if self._combined:
+            decoded = decoded.data
+        events = decoded if isinstance(decoded, list) else (decoded,)
+        return [_struct_to_order(event) for event in events if event.e == "forceOrder"]
+
+def _struct_to_order(event) -> ForceOrder:
+    """msgspec结构体转换为ForceOrder"""
+    order = event.o
+    return ForceOrder(
+        event_time=event.E,
+        trade_time=order.T,
+        symbol=order.s,
+        side=order.S,
+        order_type=order.o,
+        time_in_force=order.f,
+        status=order.X,
+        quantity=order.q,
+        price=order.p,
+        avg_price=order.ap,
+        last_qty=order.l,
+        cum_qty=order.z,
+    )
+
+def events_to_orders(data: Any) -> List[ForceOrder]:
+    """把已解析的消息（单个事件、事件数组或组合流外层）转换为ForceOrder列表"""
+    if isinstance(data, dict) and "stream" in data and "data" in data:
+        data = data["data"]
+    if isinstance(data, dict):
+        return [ForceOrder.from_event(data)] if data.get("e") == "forceOrder" else []
+    if isinstance(data, list):
+        return [ForceOrder.from_event(event) for event in data
+                if isinstance(event, dict) and event.get("e") == "forceOrder"]
+    return []
+
+DECODERS = {
+    "json": (StdlibDecoder, True),
+    "orjson": (OrjsonDecoder, orjson is not None),
+    "msgspec": (MsgspecDecoder, msgspec is not None),
+}
+
+def available_decoders():
+    """当前环境中可用的解析后端"""
+    return [name for name, (_, available) in DECODERS.items() if available]
+
+def get_decoder(backend: str = "auto", combined: bool = False) -> StdlibDecoder:
+    """按名称创建解析器，auto 按 msgspec > orjson > json 的顺序选择，未安装时回退到标准库
+
+    combined=True 表示消息来自组合流地址（/stream?streams=），带有 stream/data 外层
+    """
+    if backend == "auto":
+        for name in ("msgspec", "orjson", "json"):
+            cls, available = DECODERS[name]
+            if available:
+                return cls(combined)
+    if backend not in DECODERS:
+        logger.warning(f"未知的JSON解析后端 {backend}，使用标准库json")
+        return StdlibDecoder(combined)
+    cls, available = DECODERS[backend]
+    if not available:
+        logger.warning(f"未安装 {backend}，使用标准库json")
+        return StdlibDecoder(combined)
+    return cls(combined)
@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+class DedupIndex:
+    """按时间窗口去重：同一事件从多个连接到达时只保留最先到达的一份，并统计各连接的竞速结果"""
+
+    def __init__(self, window: float = 10.0, max_entries: int = 100000):
+        self.window = window
+        self.max_entries = max_entries
+        # key -> (首次到达时间, 来源连接)，按到达顺序排列，最旧的在最前面
+        self._seen: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._sources: Dict[str, Dict[str, float]] = {}
+        self.unique = 0
+        self.duplicates = 0
+        self.evicted = 0
+
+    def _source(self, source: str) -> Dict[str, float]:
+        stats = self._sources.get(source)
+        if stats is None:
+            stats = {"wins": 0, "losses": 0, "lag_sum": 0.0, "lag_max": 0.0}
+            self._sources[source] = stats
+        return stats
+
+    def _expire(self, now: float):
+        """移除超出时间窗口或超出容量的记录"""
+        seen = self._seen
+        cutoff = now - self.window
+        while seen:
+            first_seen = next(iter(seen.values()))[0]
+            if first_seen >= cutoff and len(seen) <= self.max_entries:
+                break
+            seen.popitem(last=False)
+            self.evicted += 1
+
+    def check(self, key: Hashable, source: str, received_at: Optional[float] = None) -> bool:
+        """首次出现返回True（应当转发），重复返回False"""
+        now = time.monotonic() if received_at is None else received_at
+        self._expire(now)
+        first = self._seen.get(key)
+        if first is None:
+            self._seen[key] = (now, source)
+            self._source(source)["wins"] += 1
+            self.unique += 1
+            return True
+        # 落后于最先到达连接的时间
+        lag = now - first[0]
+        stats = self._source(source)
+        stats["losses"] += 1
+        stats["lag_sum"] += lag
+        if lag > stats["lag_max"]:
+            stats["lag_max"] = lag
+        self.duplicates += 1
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """去重统计：各连接领先次数、落后次数及平均/最大落后时间(毫秒)"""
+        sources = {}
+        for source, stats in sorted(self._sources.items()):
+            losses = stats["losses"]
+            total = stats["wins"] + losses
+            sources[source] = {
+                "wins": int(stats["wins"]),
+                "losses": int(losses),
+                "win_rate": round(stats["wins"] / total, 4) if total else 0.0,
+                "avg_lag_ms": round(stats["lag_sum"] / losses * 1000, 3) if losses else 0.0,
+                "max_lag_ms": round(stats["lag_max"] * 1000, 3),
+            }
+        return {
+            "unique": self.unique,
+            "duplicates": self.duplicates,
+            "tracked": len(self._seen),
+            "evicted": self.evicted,
+            "sources": sources,
+        }
+
+    def __len__(self) -> int:
+        return len(self._seen)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+强平订单导出工具（非交互，流式写出，内存占用与结果大小无关）
+
+用法:
+    python export_tool.py --start 7d -o orders.csv
+    python export_tool.py --symbol BTCUSDT --symbol ETHUSDT --start 2024-01-01 --end 2024-02-01 --format jsonl -o orders.jsonl
+    python export_tool.py --start 30d --side SELL --min-notional 100000 --format parquet -o big_longs.parquet
+"""
+
+import argparse
+import csv
+import json
+import logging
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional
+from force_order import ForceOrder
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["time", "event_time", "symbol", "side", "order_type", "time_in_force", "status",
+           "quantity", "price", "avg_price", "last_qty", "cum_qty", "notional"]
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+def parse_time(value: str, now: Optional[datetime] = None) -> int:
+    """解析时间参数为毫秒时间戳：支持相对时间(30m/24h/7d/2w)和ISO格式(2024-01-01、2024-01-01T08:00)"""
+    now = now or datetime.now()
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdw])", value.strip())
+    if match:
+        amount = float(match.group(1))
+        unit = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}[match.group(2)]
+        return int((now - timedelta(**{unit: amount})).timestamp() * 1000)
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+def row_from_record(record) -> Dict[str, Any]:
+    """InfluxDB记录转换为导出行"""
+    values = record.values
+    row = {column: values.get(column) for column in COLUMNS}
+    row["time"] = record.get_time().isoformat()
+    row["event_time"] = int(record.get_time().timestamp() * 1000)
+    return row
+
+def row_from_order(order: ForceOrder) -> Dict[str, Any]:
+    """离线数据转换为导出行"""
+    row = {"time": datetime.fromtimestamp(order.event_time / 1000).isoformat()}
+    for column in COLUMNS[1:]:
+        row[column] = getattr(order, column)
+    return row
+
+class CsvExporter:
+    """逐行写出CSV"""
+
+    def __init__(self, stream):
+        self.writer = csv.DictWriter(stream, fieldnames=COLUMNS)
+        self.writer.writeheader()
+
+    def write(self, row: Dict[str, Any]):
+        self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+class JsonLinesExporter:
+    """逐行写出JSON Lines"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, row: Dict[str, Any]):
+        self.stream.write(json.dumps(row, ensure_ascii=False))
+        self.stream.write("\n")
+
+    def close(self):
+        pass
+
+class ParquetExporter:
+    """按批写出Parquet（需要安装pyarrow），每批写成一个行组"""
+
+    def __init__(self, path: str, batch_size: int = 50000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("导出Parquet需要安装pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.schema = pa.schema([
+            ("time", pa.string()),
+            ("event_time", pa.int64()),
+            ("symbol", pa.string()),
+            ("side", pa.string()),
+            ("order_type", pa.string()),
+            ("time_in_force", pa.string()),
+            ("status", pa.string()),
+            ("quantity", pa.float64()),
+            ("price", pa.float64()),
+            ("avg_price", pa.float64()),
+            ("last_qty", pa.float64()),
+            ("cum_qty", pa.float64()),
+            ("notional", pa.float64()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.batch_size = batch_size
+        self.columns = {column: [] for column in COLUMNS}
+        self.pending = 0
+
+    def write(self, row: Dict[str, Any]):
+        for column in COLUMNS:
+            self.columns[column].append(row.get(column))
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        table = self.pa.Table.from_pydict(self.columns, schema=self.schema)
+        self.writer.write_table(table)
+        self.columns = {column: [] for column in COLUMNS}
+        self.pending = 0
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+def iter_rows(args, start_ms: int, end_ms: int) -> Iterator[Dict[str, Any]]:
+    """按数据源流式产生导出行"""
+    symbols = [symbol.upper() for symbol in args.symbol] if args.symbol else None
+    side = args.side.upper() if args.side else None
+
+    if args.source != "offline":
+        try:
+            from influxdb_handler import InfluxDBHandler
+            handler = InfluxDBHandler(read_only=True)
+        except Exception as e:
+            if args.source == "influxdb":
+                raise
+            logger.warning(f"InfluxDB连接失败，改为导出离线数据: {e}")
+        else:
+            try:
+                for record in handler.stream_force_orders(start_ms, end_ms, symbols, side,
+                                                          args.min_notional, args.chunk_hours):
+                    yield row_from_record(record)
+            finally:
+                handler.close()
+            return
+
+    from data_processor import iter_stored_orders
+    for order in iter_stored_orders(start_ms, end_ms):
+        if symbols and order.symbol not in symbols:
+            continue
+        if side and order.side != side:
+            continue
+        if args.min_notional and order.notional < args.min_notional:
+            continue
+        yield row_from_order(order)
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="强平订单导出工具")
+    parser.add_argument("--symbol", action="append", help="币对，可重复指定，默认全部")
+    parser.add_argument("--start", default="24h", help="开始时间: 相对时间(如 24h、7d)或ISO时间，默认24h")
+    parser.add_argument("--end", help="结束时间: 相对时间或ISO时间，默认当前时间")
+    parser.add_argument("--side", choices=["BUY", "SELL", "buy", "sell"], help="方向，SELL为多头被强平")
+    parser.add_argument("--min-notional", type=float, help="最小名义价值")
+    parser.add_argument("--format", choices=FORMATS, help="输出格式，默认按输出文件扩展名判断，否则为csv")
+    parser.add_argument("-o", "--output", default="-", help="输出文件，默认输出到标准输出")
+    parser.add_argument("--source", choices=["auto", "influxdb", "offline"], default="auto",
+                        help="数据源，auto 优先使用InfluxDB，不可用时使用离线数据")
+    parser.add_argument("--chunk-hours", type=float, default=24, help="InfluxDB分段查询的时间跨度(小时)")
+    args = parser.parse_args()
+
+    # 日志输出到标准错误，避免混入导出数据
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+
+    now = datetime.now()
+    start_ms = parse_time(args.start, now)
+    end_ms = parse_time(args.end, now) if args.end else int(now.timestamp() * 1000)
+    if start_ms >= end_ms:
+        parser.error("开始时间必须早于结束时间")
+
+    fmt = args.format
+    if not fmt:
+        suffix = args.output.rsplit(".", 1)[-1].lower() if "." in args.output else ""
+        fmt = suffix if suffix in FORMATS else "csv"
+    if fmt == "parquet" and args.output == "-":
+        parser.error("Parquet格式需要指定输出文件 (-o)")
+
+    stream = None
+    if fmt == "parquet":
+        try:
+            exporter = ParquetExporter(args.output)
+        except RuntimeError as e:
+            parser.error(str(e))
+    else:
+        stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+        exporter = CsvExporter(stream) if fmt == "csv" else JsonLinesExporter(stream)
+
+    started = time.time()
+    count = 0
+    try:
+        for row in iter_rows(args, start_ms, end_ms):
+            exporter.write(row)
+            count += 1
+    finally:
+        exporter.close()
+        if stream is not None and stream is not sys.stdout:
+            stream.close()
+    print(f"已导出 {count} 条强平订单，用时 {time.time() - started:.1f} 秒", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import sys
+import time
+from typing import Any, Dict, Optional
+
+_intern = sys.intern
+
+class ForceOrder:
+    """强平订单记录：由WebSocket客户端解析一次，下游直接使用已转换的字段"""
+
+    __slots__ = (
+        "event_time",     # 事件时间 E (毫秒)
+        "trade_time",     # 成交时间 o.T (毫秒)
+        "symbol",         # 交易对 o.s
+        "side",           # 方向 o.S
+        "order_type",     # 订单类型 o.o
+        "time_in_force",  # 有效方式 o.f
+        "status",         # 订单状态 o.X
+        "quantity",       # 订单数量 o.q
+        "price",          # 订单价格 o.p
+        "avg_price",      # 平均价格 o.ap
+        "last_qty",       # 最近成交量 o.l
+        "cum_qty",        # 累计成交量 o.z
+        "notional",       # 强平名义价值
+        "received_at",    # 本地接收时间 (秒)
+        "trace",          # 链路时间戳 [接收, 解析, 入队, 开始写入, 写入确认] (秒)，未追踪时为None
+    )
+
+    def __init__(self, event_time: int, trade_time: int, symbol: str, side: str,
+                 order_type: str, time_in_force: str, status: str,
+                 quantity: float, price: float, avg_price: float,
+                 last_qty: float, cum_qty: float, received_at: Optional[float] = None):
+        self.event_time = event_time
+        self.trade_time = trade_time
+        self.symbol = _intern(symbol)
+        self.side = _intern(side)
+        self.order_type = _intern(order_type)
+        self.time_in_force = _intern(time_in_force)
+        self.status = _intern(status)
+        self.quantity = quantity
+        self.price = price
+        self.avg_price = avg_price
+        self.last_qty = last_qty
+        self.cum_qty = cum_qty
+        # 已成交部分按平均价格计算，未成交时退回订单价格×数量
+        if avg_price and cum_qty:
+            self.notional = avg_price * cum_qty
+        else:
+            self.notional = price * quantity
+        self.received_at = time.time() if received_at is None else received_at
+        self.trace = None
+
+    @classmethod
+    def from_event(cls, data: Dict[str, Any], received_at: Optional[float] = None) -> "ForceOrder":
+        """从币安 forceOrder 事件解析"""
+        order = data["o"]
+        return cls(
+            event_time=int(data.get("E", 0)),
+            trade_time=int(order.get("T", 0)),
+            symbol=order.get("s", "UNKNOWN"),
+            side=order.get("S", "UNKNOWN"),
+            order_type=order.get("o", "UNKNOWN"),
+            time_in_force=order.get("f", "UNKNOWN"),
+            status=order.get("X", "UNKNOWN"),
+            quantity=float(order.get("q", 0)),
+            price=float(order.get("p", 0)),
+            avg_price=float(order.get("ap", 0)),
+            last_qty=float(order.get("l", 0)),
+            cum_qty=float(order.get("z", 0)),
+            received_at=received_at,
+        )
+
+    def to_event(self) -> Dict[str, Any]:
+        """转换回币安 forceOrder 事件格式（用于落盘）"""
+        return {
+            "e": "forceOrder",
+            "E": self.event_time,
+            "o": {
+                "s": self.symbol,
+                "S": self.side,
+                "o": self.order_type,
+                "f": self.time_in_force,
+                "q": str(self.quantity),
+                "p": str(self.price),
+                "ap": str(self.avg_price),
+                "X": self.status,
+                "l": str(self.last_qty),
+                "z": str(self.cum_qty),
+                "T": self.trade_time,
+            },
+        }
+
+    def __repr__(self) -> str:
+        return (f"ForceOrder({self.symbol} {self.side} {self.quantity} @ {self.price}, "
+                f"status={self.status}, E={self.event_time})")
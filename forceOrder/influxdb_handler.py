@@ -1,22 +1,65 @@
 import logging
-from datetime import datetime, timezone
-from typing import Dict, Any
-from influxdb_client import InfluxDBClient, Point
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from influxdb_client import InfluxDBClient, Point, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
-from config import INFLUXDB_CONFIG
+from config import INFLUXDB_CONFIG, INFLUXDB_WRITE_CONFIG, VERIFY_CONFIG, ROLLUP_CONFIG
+from batch_writer import BatchWriter
+from write_verifier import WriteVerifier
+from force_order import ForceOrder
+from rollup import ROLLUP_FIELDS, RollupAccumulator, RollupBucket, plan_segments
+from common import to_rfc3339
+from circuit_breaker import CircuitOpenError
+from metrics import EVENTS_PERSISTED, WRITE_FAILURES, WRITE_SECONDS, WRITE_BATCH_SIZE
+from latency import tracker as latency_tracker
 
 logger = logging.getLogger(__name__)
 
+# 汇总查询：按币对/方向在服务端累计条数、数量、名义价值、最大单笔和价格×数量
+SUMMARY_REDUCE = '''
+    |> group(columns: ["symbol", "side"])
+    |> reduce(
+        identity: {count: 0, sum_qty: 0.0, sum_notional: 0.0, max_notional: 0.0, sum_price_qty: 0.0},
+        fn: (r, accumulator) => ({
+            count: accumulator.count + r.count,
+            sum_qty: accumulator.sum_qty + r.sum_qty,
+            sum_notional: accumulator.sum_notional + r.sum_notional,
+            max_notional: if r.max_notional > accumulator.max_notional then r.max_notional else accumulator.max_notional,
+            sum_price_qty: accumulator.sum_price_qty + r.sum_price_qty
+        })
+    )
+'''
+
+# 汇总数据完整起始时间未知时使用的占位值（表示该分辨率不可用）
+NO_COVERAGE = 2 ** 62
+
 class InfluxDBHandler:
     """InfluxDB数据处理器"""
     
-    def __init__(self):
+    def __init__(self, write_mode: Optional[str] = None, read_only: bool = False):
+        # 只读模式用于查询、导出和分析工具：只创建查询API，不启动写入和校验线程，不加载汇总桶，不创建存储桶
+        self.read_only = read_only
         self.client = None
         self.write_api = None
         self.query_api = None
+        self.batch_writer = None
+        self.verifier = None
+        self.write_mode = write_mode or INFLUXDB_WRITE_CONFIG.get("mode", "batching")
         self.bucket = INFLUXDB_CONFIG["bucket"]
         self.measurement = INFLUXDB_CONFIG["measurement"]
         self.org = INFLUXDB_CONFIG["org"]
+        self.rollups = None
+        self.rollup_resolutions = sorted(ROLLUP_CONFIG.get("resolutions", {}).items(), key=lambda item: item[1]) \
+            if ROLLUP_CONFIG.get("enabled", True) else []
+        self._rollup_coverage: Dict[str, int] = {}
+        # 汇总桶写入的是累计值：取出有变化的桶和写入必须串行，否则较旧的快照可能后写入而覆盖新值
+        self._rollup_lock = threading.Lock()
+        # 启动时是否已读取未结束的汇总桶（InfluxDB不可用时在之后的写入中重试）
+        self._rollups_seeded = False
+        # 由监控器设置：写入熔断器，以及批量写入最终失败时的回调 on_write_failure(orders, error)
+        self.breaker = None
+        self.on_write_failure = None
         self._connect()
     
     def _connect(self):
@@ -54,6 +97,11 @@ class InfluxDBHandler:
             health = self.client.health()
             logger.info(f"InfluxDB健康状态: {health}")
             
+            if self.read_only:
+                self.query_api = self.client.query_api()
+                logger.info("✅ InfluxDB连接成功（只读）")
+                return
+            
             # 检查存储桶是否存在
             buckets_api = self.client.buckets_api()
             try:
@@ -77,6 +125,45 @@ class InfluxDBHandler:
             self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
             self.query_api = self.client.query_api()
             
+            # 后台写入校验：抽样回查 + 按分钟对账，不阻塞写入路径
+            if VERIFY_CONFIG.get("enabled", True):
+                self.verifier = WriteVerifier(
+                    self.query_api,
+                    self.bucket,
+                    self.org,
+                    self.measurement,
+                    sample_rate=VERIFY_CONFIG.get("sample_rate", 100),
+                    verify_delay=VERIFY_CONFIG.get("verify_delay", 10.0),
+                    reconcile_interval=VERIFY_CONFIG.get("reconcile_interval", 60.0),
+                    max_pending_samples=VERIFY_CONFIG.get("max_pending_samples", 1000)
+                )
+            
+            # 写入端汇总：原始数据写入确认后累计，写入 {measurement}_1m / {measurement}_1h 等测量
+            if self.rollup_resolutions:
+                self.rollups = RollupAccumulator(
+                    dict(self.rollup_resolutions),
+                    retain_buckets=ROLLUP_CONFIG.get("retain_buckets", 2)
+                )
+                self._rollups_seeded = self._seed_rollups()
+            
+            # 批量写入模式：由后台线程聚合后批量提交，不阻塞事件循环
+            if self.write_mode == "batching":
+                self.batch_writer = BatchWriter(
+                    self._write_orders,
+                    batch_size=INFLUXDB_WRITE_CONFIG.get("batch_size", 500),
+                    flush_interval=INFLUXDB_WRITE_CONFIG.get("flush_interval", 1.0),
+                    max_in_flight=INFLUXDB_WRITE_CONFIG.get("max_in_flight", 2),
+                    buffer_size=INFLUXDB_WRITE_CONFIG.get("buffer_size", 50000),
+                    max_retries=INFLUXDB_WRITE_CONFIG.get("max_retries", 3),
+                    name="influxdb-writer",
+                    on_success=self._on_orders_written,
+                    on_failure=self._on_write_failed,
+                    retryable=lambda e: not isinstance(e, CircuitOpenError)
+                )
+                logger.info(f"写入模式: 批量写入 ({INFLUXDB_WRITE_CONFIG})")
+            else:
+                logger.info("写入模式: 同步写入")
+            
             logger.info("✅ InfluxDB连接成功！")
             logger.info(f"写入API: {self.write_api}")
             logger.info(f"查询API: {self.query_api}")
@@ -95,60 +182,32 @@ class InfluxDBHandler:
             logger.error(f"  - 存储桶: {self.bucket}")
             raise
     
-    def save_force_order(self, force_order_data: Dict[str, Any]):
-        """保存强平订单数据到InfluxDB"""
+    def save_force_order(self, order: ForceOrder):
+        """保存单条强平订单数据到InfluxDB"""
+        self.save_force_orders([order])
+    
+    def save_force_orders(self, orders: List[ForceOrder]):
+        """批量保存强平订单数据到InfluxDB，一批订单只提交一次写入"""
         try:
-            logger.info("=" * 50)
-            logger.info("开始处理强平订单数据...")
-            
-            # 解析数据
-            order = force_order_data.get("o", {})
-            symbol = order.get("s", "UNKNOWN")
-            side = order.get("S", "UNKNOWN")
-            quantity = order.get("q", "0")
-            price = order.get("p", "0")
-            
-            logger.info(f"订单详情:")
-            logger.info(f"  交易对: {symbol}")
-            logger.info(f"  方向: {side}")
-            logger.info(f"  数量: {quantity}")
-            logger.info(f"  价格: {price}")
-            logger.info(f"  时间: {force_order_data.get('E', 'N/A')}")
+            logger.debug("开始处理 %d 条强平订单数据...", len(orders))
+            if logger.isEnabledFor(logging.DEBUG):
+                for order in orders:
+                    logger.debug("订单详情: %s - %s - %s @ %s, 时间: %d",
+                                 order.symbol, order.side, order.quantity, order.price, order.event_time)
             
-            # 创建数据点
-            logger.info("正在创建数据点...")
-            point = Point(self.measurement) \
-                .tag("symbol", symbol) \
-                .tag("side", side) \
-                .tag("order_type", order.get("o", "UNKNOWN")) \
-                .tag("time_in_force", order.get("f", "UNKNOWN")) \
-                .tag("status", order.get("X", "UNKNOWN")) \
-                .field("quantity", float(quantity)) \
-                .field("price", float(price)) \
-                .field("avg_price", float(order.get("ap", "0"))) \
-                .field("last_qty", float(order.get("l", "0"))) \
-                .field("cum_qty", float(order.get("z", "0"))) \
-                .time(datetime.fromtimestamp(force_order_data["E"] / 1000, tz=timezone.utc))
-            
-            logger.info(f"数据点创建完成: {point}")
+            if self.batch_writer:
+                # 批量模式：放入缓冲区后立即返回，数据点在后台线程中创建
+                accepted = self.batch_writer.enqueue_many(orders)
+                logger.debug("已加入写入缓冲区: %d/%d 条", accepted, len(orders))
+                return
             
             # 写入数据
-            logger.info(f"正在写入数据到InfluxDB...")
-            logger.info(f"  存储桶: {self.bucket}")
-            logger.info(f"  组织: {self.org}")
-            logger.info(f"  测量: {self.measurement}")
-            
-            self.write_api.write(
-                bucket=self.bucket,
-                org=self.org,
-                record=point
-            )
+            logger.debug("正在写入数据到InfluxDB (存储桶: %s, 组织: %s, 测量: %s)", self.bucket, self.org, self.measurement)
             
-            logger.info("✅ 数据写入成功！")
-            logger.info(f"已保存强平订单: {symbol} - {side} - {quantity} @ {price}")
+            self._write_orders(orders)
+            self._on_orders_written(orders)
             
-            # 验证写入
-            self._verify_write(symbol, side, quantity, price)
+            logger.debug("✅ 数据写入成功！已保存 %d 条强平订单", len(orders))
             
         except Exception as e:
             logger.error(f"❌ 保存强平订单数据失败: {e}")
@@ -156,59 +215,325 @@ class InfluxDBHandler:
             logger.error(f"错误详情: {str(e)}")
             raise
     
-    def _verify_write(self, symbol: str, side: str, quantity: str, price: str):
-        """验证数据是否成功写入"""
+    def _build_point(self, order: ForceOrder) -> Point:
+        """将强平订单转换为InfluxDB数据点"""
+        return Point(self.measurement) \
+            .tag("symbol", order.symbol) \
+            .tag("side", order.side) \
+            .tag("order_type", order.order_type) \
+            .tag("time_in_force", order.time_in_force) \
+            .tag("status", order.status) \
+            .field("quantity", order.quantity) \
+            .field("price", order.price) \
+            .field("avg_price", order.avg_price) \
+            .field("last_qty", order.last_qty) \
+            .field("cum_qty", order.cum_qty) \
+            .field("notional", order.notional) \
+            .time(order.event_time, write_precision=WritePrecision.MS)
+    
+    def rollup_measurement(self, name: str) -> str:
+        """汇总数据的测量名称，如 force_orders_1m"""
+        return f"{self.measurement}_{name}"
+    
+    def _build_rollup_point(self, key: Tuple[str, int, str, str], bucket: RollupBucket) -> Point:
+        """将汇总桶转换为InfluxDB数据点（时间为桶起始时间，重复写入时覆盖）"""
+        name, start, symbol, side = key
+        return Point(self.rollup_measurement(name)) \
+            .tag("symbol", symbol) \
+            .tag("side", side) \
+            .field("count", int(bucket.count)) \
+            .field("sum_qty", float(bucket.sum_qty)) \
+            .field("sum_notional", float(bucket.sum_notional)) \
+            .field("max_notional", float(bucket.max_notional)) \
+            .field("sum_price_qty", float(bucket.sum_price_qty)) \
+            .field("vwap", float(bucket.vwap)) \
+            .time(start, write_precision=WritePrecision.MS)
+    
+    def _write_orders(self, orders):
+        """同步写入一批强平订单（汇总桶在写入确认后由 _flush_rollups 单独提交）"""
+        if not orders:
+            return
+        records = [self._build_point(order) for order in orders]
         try:
-            logger.info("正在验证数据写入...")
-            
-            # 查询最近写入的数据
+            # 熔断打开时直接失败，不再等待已经出问题的数据库
+            if self.breaker and self.breaker.is_open:
+                raise CircuitOpenError("InfluxDB写入熔断中")
+            started = time.monotonic()
+            persist_start = time.time()
+            try:
+                self.write_api.write(bucket=self.bucket, org=self.org, record=records)
+            except Exception:
+                if self.breaker:
+                    self.breaker.record_failure()
+                raise
+            latency = time.monotonic() - started
+            if self.breaker:
+                self.breaker.record_success(latency)
+            WRITE_SECONDS.labels("influxdb").observe(latency)
+            WRITE_BATCH_SIZE.labels("influxdb").observe(len(orders))
+            EVENTS_PERSISTED.labels("influxdb").inc(len(orders))
+            latency_tracker.record_persisted(orders, persist_start, time.time())
+        except Exception:
+            WRITE_FAILURES.labels("influxdb").inc()
+            raise
+    
+    def write_batch(self, orders: List[ForceOrder]):
+        """同步写入一批强平订单（供预写日志回放使用），写入成功后才计入汇总，重试同一批不会重复累计"""
+        self._write_orders(orders)
+        self._on_orders_written(orders)
+    
+    def _flush_rollups(self):
+        """提交有变化的汇总桶：取出累计值快照和写入在同一把锁内完成，保证同一个桶按累计顺序覆盖"""
+        if not self.rollups or not self.write_api:
+            return
+        with self._rollup_lock:
+            if self.breaker and self.breaker.is_open:
+                # 熔断期间保留在内存中，恢复后随下一批一起提交
+                return
+            if not self._rollups_seeded:
+                self._rollups_seeded = self._seed_rollups()
+            self._seed_pending_rollups()
+            dirty = self.rollups.collect_dirty()
+            if not dirty:
+                return
+            try:
+                self.write_api.write(bucket=self.bucket, org=self.org,
+                                     record=[self._build_rollup_point(key, bucket) for key, bucket in dirty])
+            except Exception as e:
+                self.rollups.mark_dirty(key for key, _ in dirty)
+                logger.error(f"❌ 写入汇总数据失败: {e}")
+    
+    def _load_rollups(self, name: str, start_ms: int, end_ms: Optional[int] = None) -> int:
+        """读取 [start_ms, end_ms) 内已写入的汇总桶并合并到内存中，返回读取的桶数"""
+        stop = f", stop: {to_rfc3339(end_ms)}" if end_ms is not None else ""
+        query = f'''
+            from(bucket: "{self.bucket}")
+                |> range(start: {to_rfc3339(start_ms)}{stop})
+                |> filter(fn: (r) => r["_measurement"] == "{self.rollup_measurement(name)}")
+                |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+            '''
+        loaded = 0
+        for record in self.query_api.query_stream(query, org=self.org):
+            values = record.values
+            self.rollups.seed(name, int(record.get_time().timestamp() * 1000),
+                              values.get("symbol"), values.get("side"),
+                              **{field: values.get(field) for field in ROLLUP_FIELDS})
+            loaded += 1
+        self.rollups.finish_seed(name, start_ms, end_ms)
+        return loaded
+    
+    def _seed_rollups(self) -> bool:
+        """重启后读取尚未结束的汇总桶，继续累计而不是用部分数据覆盖；全部读取成功时返回True"""
+        seeded = True
+        for name, _ in self.rollup_resolutions:
+            try:
+                loaded = self._load_rollups(name, self.rollups.floor(name))
+                logger.info(f"已加载 {loaded} 个未结束的 {name} 汇总桶")
+            except Exception as e:
+                logger.warning(f"加载 {name} 汇总桶失败（将在之后的写入中重试）: {e}")
+                seeded = False
+        return seeded
+    
+    def _seed_pending_rollups(self):
+        """迟到数据（如预写日志回放）落在已清出内存的桶中：读取已写入的累计值后再合并，读取失败时下次重试"""
+        for name, (start, end) in self.rollups.pending_ranges().items():
+            try:
+                loaded = self._load_rollups(name, start, end)
+                logger.info(f"已为迟到数据加载 {loaded} 个 {name} 汇总桶")
+            except Exception as e:
+                logger.warning(f"加载 {name} 汇总桶失败（迟到数据暂不写入汇总）: {e}")
+    
+    def get_rollup_coverage(self) -> Dict[str, int]:
+        """各分辨率汇总数据完整的起始时间（第一个汇总桶可能只包含部分数据，从第二个桶开始算）"""
+        for name, seconds in self.rollup_resolutions:
+            if name in self._rollup_coverage:
+                continue
             query = f'''
             from(bucket: "{self.bucket}")
-                |> range(start: -1m)
-                |> filter(fn: (r) => r["_measurement"] == "{self.measurement}")
-                |> filter(fn: (r) => r["symbol"] == "{symbol}")
-                |> filter(fn: (r) => r["side"] == "{side}")
-                |> filter(fn: (r) => r["quantity"] == {quantity})
-                |> filter(fn: (r) => r["price"] == {price})
+                |> range(start: 0)
+                |> filter(fn: (r) => r["_measurement"] == "{self.rollup_measurement(name)}")
+                |> filter(fn: (r) => r["_field"] == "count")
+                |> first()
+                |> group()
+                |> sort(columns: ["_time"])
                 |> limit(n: 1)
             '''
-            
-            result = self.query_api.query(query)
-            records = list(result)
-            
-            if records:
-                logger.info(f"✅ 数据验证成功！找到 {len(records)} 条匹配记录")
-                for record in records:
-                    logger.info(f"  验证记录: {record}")
+            try:
+                for record in self.query_api.query_stream(query, org=self.org):
+                    self._rollup_coverage[name] = int(record.get_time().timestamp() * 1000) + seconds * 1000
+            except Exception as e:
+                logger.warning(f"查询 {name} 汇总范围失败: {e}")
+        return {name: self._rollup_coverage.get(name, NO_COVERAGE) for name, _ in self.rollup_resolutions}
+    
+    def _raw_summary_source(self, start_ms: int, end_ms: int) -> str:
+        """原始数据按汇总字段整理的Flux数据源"""
+        return f'''
+            from(bucket: "{self.bucket}")
+                |> range(start: {to_rfc3339(start_ms)}, stop: {to_rfc3339(end_ms)})
+                |> filter(fn: (r) => r["_measurement"] == "{self.measurement}")
+                |> filter(fn: (r) => r["_field"] == "quantity" or r["_field"] == "price" or r["_field"] == "notional")
+                |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+                |> map(fn: (r) => {{
+                    notional = if exists r.notional then r.notional else r.price * r.quantity
+                    return {{symbol: r.symbol, side: r.side, count: 1, sum_qty: r.quantity,
+                            sum_notional: notional, max_notional: notional, sum_price_qty: r.price * r.quantity}}
+                }})'''
+    
+    def _rollup_summary_source(self, name: str, start_ms: int, end_ms: int) -> str:
+        """汇总测量按汇总字段整理的Flux数据源"""
+        return f'''
+            from(bucket: "{self.bucket}")
+                |> range(start: {to_rfc3339(start_ms)}, stop: {to_rfc3339(end_ms)})
+                |> filter(fn: (r) => r["_measurement"] == "{self.rollup_measurement(name)}")
+                |> filter(fn: (r) => r["_field"] != "vwap")
+                |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+                |> map(fn: (r) => ({{symbol: r.symbol, side: r.side, count: r.count, sum_qty: r.sum_qty,
+                        sum_notional: r.sum_notional, max_notional: r.max_notional, sum_price_qty: r.sum_price_qty}}))'''
+    
+    def plan_summary(self, start_ms: int, end_ms: int) -> List[Tuple[str, int, int]]:
+        """把查询区间拆分为尽量粗的汇总分辨率加上两端的原始数据"""
+        resolutions = [(name, seconds * 1000) for name, seconds in self.rollup_resolutions]
+        return plan_segments(start_ms, end_ms, resolutions, self.get_rollup_coverage() if resolutions else None)
+    
+    def build_summary_query(self, start_ms: int, end_ms: int) -> str:
+        """生成汇总查询：各区间的数据源合并后按币对/方向在服务端一次累计"""
+        sources = []
+        for name, start, end in self.plan_summary(start_ms, end_ms):
+            logger.info(f"汇总查询: {name} {to_rfc3339(start)} ~ {to_rfc3339(end)}")
+            if name == "raw":
+                sources.append(self._raw_summary_source(start, end))
             else:
-                logger.warning(f"⚠️ 数据验证: 未找到匹配的记录，可能需要等待数据同步")
-                
-        except Exception as e:
-            logger.warning(f"数据验证失败: {e}")
+                sources.append(self._rollup_summary_source(name, start, end))
+        if len(sources) == 1:
+            return sources[0] + SUMMARY_REDUCE
+        definitions = "".join(f"\n        s{i} = {source.strip()}\n" for i, source in enumerate(sources))
+        tables = ", ".join(f"s{i}" for i in range(len(sources)))
+        return f"{definitions}\n        union(tables: [{tables}])" + SUMMARY_REDUCE
+    
+    def query_summary(self, start_ms: int, end_ms: Optional[int] = None) -> Dict[Tuple[str, str], RollupBucket]:
+        """按币对/方向汇总强平订单：一次查询，中间部分读取汇总测量，两端不足一个桶的部分读取原始数据"""
+        end_ms = end_ms or int(time.time() * 1000)
+        summary: Dict[Tuple[str, str], RollupBucket] = {}
+        if start_ms >= end_ms:
+            return summary
+        # 每个币对/方向只返回一行，流式读取一遍即可
+        for record in self.query_api.query_stream(self.build_summary_query(start_ms, end_ms), org=self.org):
+            values = record.values
+            key = (values.get("symbol"), values.get("side"))
+            bucket = summary.get(key)
+            if bucket is None:
+                bucket = summary[key] = RollupBucket()
+            bucket.merge(values.get("count"), values.get("sum_qty"), values.get("sum_notional"),
+                         values.get("max_notional"), values.get("sum_price_qty"))
+        return summary
+    
+    def query_latest_orders(self, hours: int = 24, limit: int = 10, symbol: Optional[str] = None):
+        """一次查询每个币对最近的强平订单（按币对分组，每组按时间倒序取limit条），逐条返回"""
+        symbol_filter = f'\n                |> filter(fn: (r) => r["symbol"] == "{symbol}")' if symbol else ""
+        query = f'''
+            from(bucket: "{self.bucket}")
+                |> range(start: -{hours}h)
+                |> filter(fn: (r) => r["_measurement"] == "{self.measurement}"){symbol_filter}
+                |> filter(fn: (r) => r["_field"] == "quantity" or r["_field"] == "price" or r["_field"] == "avg_price" or r["_field"] == "notional")
+                |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+                |> group(columns: ["symbol"])
+                |> sort(columns: ["_time"], desc: true)
+                |> limit(n: {limit})
+            '''
+        return self.query_api.query_stream(query, org=self.org)
+    
+    def _on_orders_written(self, orders):
+        """写入确认后计入汇总并提交汇总桶，再交给后台校验器记录
+
+        只累计已确认写入的订单：缓冲区满被丢弃或转存到离线存储的订单不会计入汇总。
+        """
+        if self.rollups:
+            self.rollups.add_many(orders)
+            self._flush_rollups()
+        if self.verifier:
+            self.verifier.record_written(orders)
+    
+    def _on_write_failed(self, orders, error):
+        """批量写入重试后仍失败，交给监控器转存到本地"""
+        if self.on_write_failure:
+            self.on_write_failure(orders, error)
+    
+    def flush(self, timeout: float = 30.0) -> bool:
+        """将写入缓冲区中的数据全部提交到InfluxDB"""
+        if self.batch_writer:
+            return self.batch_writer.flush(timeout)
+        return True
+    
+    def get_write_stats(self) -> Dict[str, Any]:
+        """获取写入统计"""
+        stats = self.batch_writer.get_stats() if self.batch_writer else {"mode": "synchronous"}
+        if self.verifier:
+            stats["verify"] = self.verifier.get_stats()
+        if self.rollups:
+            stats["rollup"] = self.rollups.get_stats()
+        if self.breaker:
+            stats["breaker"] = self.breaker.get_stats()
+        return stats
     
     def query_recent_force_orders(self, symbol: str, limit: int = 100):
-        """查询最近的强平订单"""
+        """查询最近的强平订单（流式逐条返回，不在内存中保存整个结果）"""
         try:
             logger.info(f"查询 {symbol} 最近 {limit} 条强平订单...")
-            
+            return self.query_latest_orders(24, limit, symbol)
+        except Exception as e:
+            logger.error(f"查询强平订单数据失败: {e}")
+            return iter(())
+    
+    def stream_force_orders(self,
+                            start_ms: int,
+                            end_ms: int,
+                            symbols: Optional[List[str]] = None,
+                            side: Optional[str] = None,
+                            min_notional: Optional[float] = None,
+                            chunk_hours: float = 24) -> Iterator[Any]:
+        """按时间顺序流式读取 [start_ms, end_ms) 内的强平订单（每条记录已按字段展开）
+
+        按 chunk_hours 分段查询，每段在服务端按时间排序，客户端内存占用与结果大小无关。
+        """
+        filters = ""
+        if symbols:
+            condition = " or ".join(f'r["symbol"] == "{symbol}"' for symbol in symbols)
+            filters += f"\n                |> filter(fn: (r) => {condition})"
+        if side:
+            filters += f'\n                |> filter(fn: (r) => r["side"] == "{side}")'
+        notional_filter = f"\n                |> filter(fn: (r) => r.notional >= {float(min_notional)})" if min_notional else ""
+        
+        chunk_ms = max(1, int(chunk_hours * 3600 * 1000))
+        chunk_start = start_ms
+        while chunk_start < end_ms:
+            chunk_end = min(chunk_start + chunk_ms, end_ms)
             query = f'''
             from(bucket: "{self.bucket}")
-                |> range(start: -24h)
-                |> filter(fn: (r) => r["_measurement"] == "{self.measurement}")
-                |> filter(fn: (r) => r["symbol"] == "{symbol}")
-                |> sort(columns: ["_time"], desc: true)
-                |> limit(n: {limit})
+                |> range(start: {to_rfc3339(chunk_start)}, stop: {to_rfc3339(chunk_end)})
+                |> filter(fn: (r) => r["_measurement"] == "{self.measurement}"){filters}
+                |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+                |> map(fn: (r) => ({{r with notional: if exists r.notional then r.notional else r.price * r.quantity}})){notional_filter}
+                |> group()
+                |> sort(columns: ["_time"])
             '''
-            
-            logger.info(f"执行查询: {query}")
-            result = self.query_api.query(query)
-            records = list(result)
-            
-            logger.info(f"查询结果: 找到 {len(records)} 条记录")
-            return result
-            
+            yield from self.query_api.query_stream(query, org=self.org)
+            chunk_start = chunk_end
+    
+    def list_symbols(self, hours: int = 24):
+        """查询最近N小时内有数据的全部币对"""
+        try:
+            query = f'''
+            import "influxdata/influxdb/schema"
+            schema.tagValues(
+                bucket: "{self.bucket}",
+                tag: "symbol",
+                predicate: (r) => r["_measurement"] == "{self.measurement}",
+                start: -{hours}h
+            )
+            '''
+            return [record.get_value() for record in self.query_api.query_stream(query, org=self.org)]
         except Exception as e:
-            logger.error(f"查询强平订单数据失败: {e}")
+            logger.error(f"查询币对列表失败: {e}")
             return []
     
     def get_database_info(self):
@@ -262,7 +587,16 @@ class InfluxDBHandler:
     
     def close(self):
         """关闭连接"""
+        if self.batch_writer:
+            logger.info("正在刷新InfluxDB写入缓冲区...")
+            self.batch_writer.close()
+            self.batch_writer = None
+        self._flush_rollups()
+        if self.verifier:
+            self.verifier.close()
+            self.verifier = None
         if self.client:
             logger.info("正在关闭InfluxDB连接...")
             self.client.close()
+            self.client = None
             logger.info("✅ InfluxDB连接已关闭") 
\ No newline at end of file
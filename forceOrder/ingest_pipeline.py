@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+class IngestPipeline:
+    """有界接入队列：接收循环只负责入队，由多个消费协程并发交给存储处理器"""
+
+    def __init__(self,
+                 handler: Callable[[Any], Awaitable[None]],
+                 max_size: int = 10000,
+                 workers: int = 2,
+                 overflow_policy: str = "block",
+                 spill_file: str = "ingest_spill.jsonl",
+                 metrics_interval: float = 60.0,
+                 encode: Callable[[Any], Any] = None,
+                 decode: Callable[[Any], Any] = None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"不支持的溢出策略: {overflow_policy}，可选: {OVERFLOW_POLICIES}")
+        self.handler = handler
+        self.max_size = max_size
+        self.worker_count = max(1, workers)
+        self.overflow_policy = overflow_policy
+        self.spill_file = spill_file
+        self.metrics_interval = metrics_interval
+        # 溢出到磁盘时的序列化/反序列化函数
+        self.encode = encode or (lambda item: item)
+        self.decode = decode or (lambda item: item)
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._spill_writer = None
+        self._spill_read_offset = 0
+        self._spill_pending = 0
+        self.running = False
+
+        self.metrics = {
+            "enqueued": 0,
+            "processed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "restored": 0,
+            "blocked_puts": 0,
+            "max_depth": 0,
+        }
+
+    async def start(self):
+        """启动消费协程（重复调用无副作用）"""
+        if self.running:
+            return
+        self.running = True
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.worker_count)]
+        if self.overflow_policy == "spill":
+            self._open_spill()
+            self._tasks.append(asyncio.create_task(self._restore_loop()))
+        if self.metrics_interval:
+            self._tasks.append(asyncio.create_task(self._report_loop()))
+        logger.info(f"接入队列已启动: 容量 {self.max_size}, 消费者 {self.worker_count}, 溢出策略 {self.overflow_policy}")
+
+    async def put(self, item: Any) -> bool:
+        """接收循环调用：按溢出策略放入队列"""
+        queue = self.queue
+        if self.overflow_policy == "spill" and (self._spill_pending or queue.full()):
+            # 已有溢出数据时继续落盘，保证恢复顺序
+            self._spill(item)
+            return True
+
+        if queue.full():
+            if self.overflow_policy == "drop_oldest":
+                queue.get_nowait()
+                queue.task_done()
+                self.metrics["dropped"] += 1
+                if self.metrics["dropped"] % 1000 == 1:
+                    logger.warning(f"⚠️ 接入队列已满，丢弃最旧数据，累计丢弃 {self.metrics['dropped']} 条")
+            else:
+                self.metrics["blocked_puts"] += 1
+
+        await queue.put(item)
+        self.metrics["enqueued"] += 1
+        depth = queue.qsize()
+        if depth > self.metrics["max_depth"]:
+            self.metrics["max_depth"] = depth
+        return True
+
+    async def _worker(self, index: int):
+        """消费协程：从队列取出数据交给处理器"""
+        while True:
+            item = await self.queue.get()
+            try:
+                await self.handler(item)
+                self.metrics["processed"] += 1
+            except Exception as e:
+                self.metrics["failed"] += 1
+                logger.error(f"❌ 消费者 {index} 处理数据失败: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _open_spill(self):
+        """打开溢出文件，上次遗留的数据会在启动后恢复"""
+        self._spill_writer = open(self.spill_file, "a+", encoding="utf-8")
+        self._spill_writer.seek(0)
+        self._spill_pending = sum(1 for line in self._spill_writer if line.strip())
+        self._spill_read_offset = 0
+        self._spill_writer.seek(0, os.SEEK_END)
+        if self._spill_pending:
+            logger.info(f"发现 {self._spill_pending} 条未处理的溢出数据，将自动恢复")
+
+    def _spill(self, item: Any):
+        """写入溢出文件"""
+        self._spill_writer.write(json.dumps(self.encode(item), ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._spill_pending += 1
+        self.metrics["spilled"] += 1
+        if self.metrics["spilled"] % 1000 == 1:
+            logger.warning(f"⚠️ 接入队列已满，数据溢出到磁盘，累计 {self.metrics['spilled']} 条")
+
+    async def _restore_loop(self):
+        """队列有空余时把溢出文件中的数据按顺序放回队列"""
+        while True:
+            await asyncio.sleep(0.05 if self._spill_pending else 0.2)
+            if not self._spill_pending or self.queue.qsize() > self.max_size // 2:
+                continue
+
+            self._spill_writer.flush()
+            with open(self.spill_file, "r", encoding="utf-8") as reader:
+                reader.seek(self._spill_read_offset)
+                while self._spill_pending and not self.queue.full():
+                    line = reader.readline()
+                    if not line:
+                        break
+                    self._spill_read_offset = reader.tell()
+                    if not line.strip():
+                        continue
+                    try:
+                        self.queue.put_nowait(self.decode(json.loads(line)))
+                        self.metrics["restored"] += 1
+                    except (ValueError, KeyError) as e:
+                        logger.error(f"❌ 溢出数据解析失败，跳过: {e}")
+                    self._spill_pending -= 1
+
+            if not self._spill_pending:
+                # 溢出数据已全部恢复，清空文件
+                self._spill_writer.truncate(0)
+                self._spill_writer.seek(0)
+                self._spill_read_offset = 0
+
+    def _compact_spill(self):
+        """删除溢出文件中已恢复的部分，避免重启后重复处理"""
+        if not self._spill_read_offset:
+            return
+        self._spill_writer.flush()
+        self._spill_writer.seek(self._spill_read_offset)
+        remaining = self._spill_writer.read()
+        self._spill_writer.seek(0)
+        self._spill_writer.truncate(0)
+        self._spill_writer.write(remaining)
+        self._spill_read_offset = 0
+
+    async def _report_loop(self):
+        """定期输出队列深度等指标"""
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            logger.info(f"📊 接入队列指标: {self.get_metrics()}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取队列指标"""
+        metrics = dict(self.metrics)
+        metrics["depth"] = self.queue.qsize() if self.queue else 0
+        metrics["spill_pending"] = self._spill_pending
+        return metrics
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """等待队列排空后停止消费协程，未恢复的溢出数据保留在磁盘上"""
+        if not self.running:
+            return
+        self.running = False
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ 接入队列排空超时，剩余 {self.queue.qsize()} 条未处理")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._spill_writer:
+            self._compact_spill()
+            self._spill_writer.close()
+            self._spill_writer = None
+        logger.info(f"接入队列已停止: {self.get_metrics()}")
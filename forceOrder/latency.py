@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import LATENCY_CONFIG
+from force_order import ForceOrder
+
+logger = logging.getLogger(__name__)
+
+# ForceOrder.trace 中各时间戳的位置（本地时钟，秒）
+RECV, DECODE, ENQUEUE, PERSIST_START, PERSIST_ACK = range(5)
+
+# 阶段名称及说明，按在链路中的先后排列
+STAGES = (
+    ("match", "成交时间T → 事件时间E（交易所内部）"),
+    ("feed", "事件时间E → 本地接收（网络传输，含本地时钟偏差）"),
+    ("decode", "接收 → 解析完成"),
+    ("dedup", "解析完成 → 放入接入队列（去重）"),
+    ("queue", "放入接入队列 → 开始写入存储（排队、写入缓冲、凑批）"),
+    ("write", "开始写入 → 存储确认"),
+    ("total", "事件时间E → 存储确认（端到端）"),
+)
+STAGE_NAMES = tuple(name for name, _ in STAGES)
+
+# 全部币对合计的键
+ALL = "ALL"
+
+class LatencyHistogram:
+    """HDR风格的对数-线性直方图（微秒）
+
+    小于 2^sub_bucket_bits 的值精确计数，更大的值按2的幂分段，每段再等分为 2^(sub_bucket_bits-1) 个桶，
+    相对误差不超过 1/2^(sub_bucket_bits-1)（默认8位约0.8%）。只保存有数据的桶，可以合并。
+    """
+
+    def __init__(self, sub_bucket_bits: int = 8, highest: int = 3600 * 1000000):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.highest = highest
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        # 时钟偏差导致的负值按0记录
+        self.clamped = 0
+
+    def _index(self, value: int) -> int:
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (shift - 1) * self.half_count + (value >> shift) - self.half_count
+
+    def _bucket_range(self, index: int) -> Tuple[int, int]:
+        """桶覆盖的值范围 [low, high]"""
+        if index < self.sub_bucket_count:
+            return index, index
+        shift = (index - self.sub_bucket_count) // self.half_count + 1
+        top = (index - self.sub_bucket_count) % self.half_count + self.half_count
+        return top << shift, ((top + 1) << shift) - 1
+
+    def record(self, value: int):
+        if value < 0:
+            self.clamped += 1
+            value = 0
+        elif value > self.highest:
+            value = self.highest
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.clamped += other.clamped
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def value_at_percentile(self, percentile: float) -> int:
+        """百分位数（返回所在桶的上界，不超过最大值）"""
+        if not self.count:
+            return 0
+        target = max(1, int(round(percentile / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._bucket_range(index)[1], self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min or 0,
+            "max": self.max,
+            "clamped": self.clamped,
+            "counts": {str(index): count for index, count in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], sub_bucket_bits: int = 8) -> "LatencyHistogram":
+        histogram = cls(sub_bucket_bits)
+        histogram.counts = {int(index): int(count) for index, count in data.get("counts", {}).items()}
+        histogram.count = int(data.get("count", 0))
+        histogram.total = int(data.get("sum", 0))
+        histogram.min = int(data.get("min", 0)) if histogram.count else None
+        histogram.max = int(data.get("max", 0))
+        histogram.clamped = int(data.get("clamped", 0))
+        return histogram
+
+class LatencyTracker:
+    """按阶段和币对统计强平事件在链路各阶段的耗时
+
+    接收端在订单上记录接收、解析、入队时间，存储写入前后记录开始写入和确认时间，
+    确认后把整条链路的各阶段耗时计入直方图（每批加一次锁，在写入线程中完成）。
+    """
+
+    def __init__(self, enabled: bool = True, per_symbol: bool = True, sub_bucket_bits: int = 8):
+        self.enabled = enabled
+        self.per_symbol = per_symbol
+        self.sub_bucket_bits = sub_bucket_bits
+        self.started_at = time.time()
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, stage: str, symbol: str) -> LatencyHistogram:
+        key = (stage, symbol)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = LatencyHistogram(self.sub_bucket_bits)
+        return histogram
+
+    def stamp_received(self, orders: List[ForceOrder], received: float, decoded: float, enqueued: float):
+        """接收端：同一条消息中的订单共享接收、解析和入队时间"""
+        if not self.enabled:
+            return
+        for order in orders:
+            order.trace = [received, decoded, enqueued, 0.0, 0.0]
+
+    def record_persisted(self, orders: Iterable[ForceOrder], started: float, acked: float):
+        """存储确认写入后记录各阶段耗时（没有接收端时间戳的订单只记录写入和端到端耗时）"""
+        if not self.enabled:
+            return
+        samples = []
+        write_us = int((acked - started) * 1000000)
+        for order in orders:
+            trace = order.trace
+            if trace is not None:
+                trace[PERSIST_START] = started
+                trace[PERSIST_ACK] = acked
+            samples.append((order.symbol, self._stage_values(order, trace, write_us, acked)))
+        with self._lock:
+            for symbol, values in samples:
+                for stage, value in values:
+                    self._histogram(stage, ALL).record(value)
+                    if self.per_symbol:
+                        self._histogram(stage, symbol).record(value)
+
+    @staticmethod
+    def _stage_values(order: ForceOrder, trace: Optional[List[float]], write_us: int, acked: float):
+        event_us = order.event_time * 1000
+        values = [("match", (order.event_time - order.trade_time) * 1000)]
+        if trace is not None:
+            values.append(("feed", int(trace[RECV] * 1000000) - event_us))
+            values.append(("decode", int((trace[DECODE] - trace[RECV]) * 1000000)))
+            values.append(("dedup", int((trace[ENQUEUE] - trace[DECODE]) * 1000000)))
+            values.append(("queue", int((trace[PERSIST_START] - trace[ENQUEUE]) * 1000000)))
+        values.append(("write", write_us))
+        values.append(("total", int(acked * 1000000) - event_us))
+        return values
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前全部直方图（可直接写成JSON）"""
+        with self._lock:
+            histograms: Dict[str, Dict[str, Any]] = {}
+            for (stage, symbol), histogram in self._histograms.items():
+                histograms.setdefault(stage, {})[symbol] = histogram.to_dict()
+        return {
+            "version": 1,
+            "unit": "us",
+            "sub_bucket_bits": self.sub_bucket_bits,
+            "started_at": self.started_at,
+            "generated_at": time.time(),
+            "stages": dict(STAGES),
+            "histograms": histograms,
+        }
+
+    def get(self, stage: str, symbol: str = ALL) -> Optional[LatencyHistogram]:
+        with self._lock:
+            return self._histograms.get((stage, symbol))
+
+    def export(self, path: str):
+        """写入临时文件后原子替换"""
+        temp = path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp, path)
+
+    def summary_line(self, percentiles=(50, 99)) -> str:
+        """各阶段全部币对的百分位数（毫秒），用于日志"""
+        parts = []
+        for stage in STAGE_NAMES:
+            histogram = self.get(stage)
+            if histogram is None or not histogram.count:
+                continue
+            with self._lock:
+                values = [histogram.value_at_percentile(p) / 1000 for p in percentiles]
+            parts.append(f"{stage} " + "/".join(f"{value:.1f}" for value in values))
+        return ", ".join(parts)
+
+def load_export(path: str) -> Tuple[Dict[str, Any], Dict[str, Dict[str, LatencyHistogram]]]:
+    """读取导出的直方图文件，返回 (文件信息, {阶段: {币对: 直方图}})"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    bits = data.get("sub_bucket_bits", 8)
+    histograms = {
+        stage: {symbol: LatencyHistogram.from_dict(item, bits) for symbol, item in symbols.items()}
+        for stage, symbols in data.pop("histograms", {}).items()
+    }
+    return data, histograms
+
+tracker = LatencyTracker(
+    enabled=LATENCY_CONFIG.get("enabled", True),
+    per_symbol=LATENCY_CONFIG.get("per_symbol", True),
+    sub_bucket_bits=LATENCY_CONFIG.get("sub_bucket_bits", 8)
+)
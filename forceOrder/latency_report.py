@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+强平事件端到端延迟报告：读取监控程序导出的延迟直方图，按阶段输出百分位数
+
+用法:
+    python latency_report.py
+    python latency_report.py --symbol BTCUSDT
+    python latency_report.py --stage total --by-symbol --top 20
+    python latency_report.py --baseline latency_baseline.json --max-regression 0.2
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+from config import LATENCY_CONFIG
+from latency import ALL, STAGES, STAGE_NAMES, LatencyHistogram, load_export
+
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+
+def _ms(value_us: float) -> str:
+    return f"{value_us / 1000:.2f}"
+
+def _row(name: str, histogram: LatencyHistogram, percentiles: Sequence[float]) -> List[str]:
+    return ([name, str(histogram.count)]
+            + [_ms(histogram.value_at_percentile(p)) for p in percentiles]
+            + [_ms(histogram.mean), _ms(histogram.max)])
+
+def _print_table(header: List[str], rows: List[List[str]]):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    print("  ".join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                    for i, (cell, width) in enumerate(zip(header, widths))))
+    print("  ".join("-" * width for width in widths))
+    for row in rows:
+        print("  ".join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                        for i, (cell, width) in enumerate(zip(row, widths))))
+
+def _header(first: str, percentiles: Sequence[float]) -> List[str]:
+    return [first, "count"] + [f"p{p:g}(ms)" for p in percentiles] + ["mean(ms)", "max(ms)"]
+
+def print_stages(histograms: Dict[str, Dict[str, LatencyHistogram]], symbol: str, percentiles: Sequence[float]):
+    """按链路顺序输出各阶段的百分位数"""
+    rows = []
+    for stage in STAGE_NAMES:
+        histogram = histograms.get(stage, {}).get(symbol)
+        if histogram is not None and histogram.count:
+            rows.append(_row(stage, histogram, percentiles))
+    if not rows:
+        print(f"没有 {symbol} 的延迟数据")
+        return
+    print(f"\n📊 各阶段延迟（{'全部币对' if symbol == ALL else symbol}）")
+    _print_table(_header("stage", percentiles), rows)
+    print()
+    for name, description in STAGES:
+        print(f"  {name:<7} {description}")
+    clamped = histograms.get("feed", {}).get(symbol)
+    if clamped is not None and clamped.clamped:
+        print(f"\n⚠️ feed 阶段有 {clamped.clamped} 笔为负值（本地时钟慢于交易所），已按0计入")
+
+def print_by_symbol(histograms: Dict[str, Dict[str, LatencyHistogram]], stage: str, top: int,
+                    percentiles: Sequence[float]):
+    """某个阶段按币对输出，按p99从高到低排序"""
+    by_symbol = {symbol: histogram for symbol, histogram in histograms.get(stage, {}).items()
+                 if symbol != ALL and histogram.count}
+    if not by_symbol:
+        print(f"没有按币对统计的 {stage} 阶段数据")
+        return
+    ranked = sorted(by_symbol.items(), key=lambda item: item[1].value_at_percentile(99), reverse=True)[:top]
+    print(f"\n📊 {stage} 阶段延迟（按币对，p99最高的 {len(ranked)} 个）")
+    _print_table(_header("symbol", percentiles), [_row(symbol, histogram, percentiles) for symbol, histogram in ranked])
+
+def compare(current: Dict[str, Dict[str, LatencyHistogram]], baseline: Dict[str, Dict[str, LatencyHistogram]],
+            symbol: str, percentile: float, max_regression: float) -> List[str]:
+    """与基准文件对比各阶段的百分位数，返回超过允许退化比例的阶段"""
+    rows = []
+    regressions = []
+    for stage in STAGE_NAMES:
+        now = current.get(stage, {}).get(symbol)
+        base = baseline.get(stage, {}).get(symbol)
+        if now is None or base is None or not now.count or not base.count:
+            continue
+        now_value = now.value_at_percentile(percentile)
+        base_value = base.value_at_percentile(percentile)
+        change = (now_value - base_value) / base_value if base_value else 0.0
+        regressed = change > max_regression
+        if regressed:
+            regressions.append(stage)
+        rows.append([stage, _ms(base_value), _ms(now_value), f"{change:+.1%}", "❌" if regressed else "✅"])
+    if rows:
+        print(f"\n📈 与基准对比（p{percentile:g}，允许退化 {max_regression:.0%}）")
+        _print_table(["stage", "baseline(ms)", "current(ms)", "change", ""], rows)
+    return regressions
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="强平事件端到端延迟报告")
+    parser.add_argument("--file", default=LATENCY_CONFIG.get("file", "latency_histograms.json"),
+                        help="监控程序导出的延迟直方图文件")
+    parser.add_argument("--symbol", default=ALL, help="只看某个币对，默认全部币对合计")
+    parser.add_argument("--stage", choices=STAGE_NAMES, default="total", help="按币对输出时使用的阶段")
+    parser.add_argument("--by-symbol", action="store_true", help="按币对输出 --stage 阶段的延迟")
+    parser.add_argument("--top", type=int, default=20, help="按币对输出的数量")
+    parser.add_argument("--percentiles", default=",".join(f"{p:g}" for p in DEFAULT_PERCENTILES),
+                        help="输出的百分位数，逗号分隔")
+    parser.add_argument("--baseline", help="基准直方图文件，用于检查延迟退化")
+    parser.add_argument("--compare-percentile", type=float, default=99, help="对比使用的百分位数")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="允许的退化比例，超过时返回非0退出码")
+    args = parser.parse_args(argv)
+
+    try:
+        percentiles = [float(p) for p in args.percentiles.split(",") if p.strip()]
+        info, histograms = load_export(args.file)
+    except FileNotFoundError:
+        print(f"❌ 延迟直方图文件不存在: {args.file}（监控程序运行时按 LATENCY_CONFIG['interval'] 导出）")
+        return 1
+    except ValueError as e:
+        print(f"❌ 参数或文件格式错误: {e}")
+        return 1
+
+    total = histograms.get("total", {}).get(ALL)
+    if total is not None:
+        generated_at = datetime.fromtimestamp(info.get("generated_at", 0)).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"文件: {args.file}，端到端样本 {total.count} 笔（生成时间 {generated_at}）")
+    print_stages(histograms, args.symbol, percentiles)
+    if args.by_symbol:
+        print_by_symbol(histograms, args.stage, args.top, percentiles)
+
+    if args.baseline:
+        try:
+            _, baseline = load_export(args.baseline)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"❌ 读取基准文件失败: {e}")
+            return 1
+        regressions = compare(histograms, baseline, args.symbol, args.compare_percentile, args.max_regression)
+        if regressions:
+            print(f"\n❌ 延迟退化: {', '.join(regressions)}")
+            return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
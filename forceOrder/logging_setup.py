@@ -0,0 +1,120 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional
+from config import LOG_LEVEL, LOG_FORMAT, LOGGING_CONFIG
+from force_order import ForceOrder
+
+event_logger = logging.getLogger("force_order.events")
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """把日志记录原样放入进程内队列，格式化（含参数合并）在后台线程中进行；队列满时丢弃并计数"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 同一进程内的队列不需要序列化，保留 msg/args 延迟到输出线程格式化
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        # 警告及以上级别不丢弃，队列满时等待输出线程腾出位置
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _QueueListener(logging.handlers.QueueListener):
+    """停止时阻塞等待队列腾出位置放入结束标记（队列满时默认实现会抛出异常）"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+class _EventSampler:
+    """每笔强平一行紧凑日志，按 sample_rate 抽样（每N笔输出1行）"""
+
+    def __init__(self, sample_rate: int = 1):
+        self.sample_rate = max(1, sample_rate)
+        self.seen = 0
+
+    def log(self, order: ForceOrder):
+        self.seen += 1
+        if self.seen % self.sample_rate:
+            return
+        if event_logger.isEnabledFor(logging.INFO):
+            event_logger.info("⚡ %s %s %s@%s notional=%.2f status=%s E=%d",
+                              order.symbol, order.side, order.quantity, order.price,
+                              order.notional, order.status, order.event_time)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[_LazyQueueHandler] = None
+_sampler = _EventSampler(LOGGING_CONFIG.get("event_sample_rate", 1))
+
+def is_verbose() -> bool:
+    """verbose模式逐笔输出详细信息，production模式每笔一行"""
+    return LOGGING_CONFIG.get("mode", "production") == "verbose"
+
+def log_order(order: ForceOrder):
+    """输出一笔强平订单（production模式下为抽样的单行日志）"""
+    _sampler.log(order)
+
+def setup_logging():
+    """配置日志：控制台 + 按大小滚动的日志文件
+
+    production模式下所有输出由后台线程完成（QueueHandler/QueueListener），事件循环只把记录放入队列；
+    verbose模式与原来一样同步输出。
+    """
+    global _listener, _queue_handler
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if LOGGING_CONFIG.get("console", True):
+        handlers.append(logging.StreamHandler(sys.stdout))
+    handlers.append(logging.handlers.RotatingFileHandler(
+        LOGGING_CONFIG.get("file", "force_order_monitor.log"),
+        maxBytes=LOGGING_CONFIG.get("max_bytes", 50 * 1024 * 1024),
+        backupCount=LOGGING_CONFIG.get("backup_count", 5),
+        encoding="utf-8"
+    ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, LOG_LEVEL))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if is_verbose():
+        for handler in handlers:
+            root.addHandler(handler)
+        return
+
+    _queue_handler = _LazyQueueHandler(queue.Queue(LOGGING_CONFIG.get("queue_size", 10000)))
+    root.addHandler(_queue_handler)
+    _listener = _QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """输出队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    if _queue_handler and _queue_handler.dropped:
+        print(f"日志队列已满，共丢弃 {_queue_handler.dropped} 条日志", file=sys.stderr)
+
+def get_stats():
+    """日志统计"""
+    return {
+        "mode": LOGGING_CONFIG.get("mode", "production"),
+        "events": _sampler.seen,
+        "queue_depth": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+    }
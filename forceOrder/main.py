@@ -2,21 +2,22 @@ import asyncio
 import logging
 import signal
 import sys
-from typing import Dict, Any
-from config import LOG_LEVEL, LOG_FORMAT, MONITOR_MODE
+from config import MONITOR_MODE, SYMBOLS, AGGREGATOR_CONFIG, SYMBOL_REGISTRY_CONFIG, STORAGE_MODE, SPOOL_CONFIG, BREAKER_CONFIG, METRICS_CONFIG, LATENCY_CONFIG
 from websocket_client import BinanceWebSocketClient
 from influxdb_handler import InfluxDBHandler
 from data_processor import OfflineDataProcessor
+from sqlite_handler import SQLiteHandler
+from spool import WriteAheadSpool
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from typing import List
+from force_order import ForceOrder
+from aggregator import LiquidationAggregator
+from logging_setup import setup_logging, shutdown_logging, is_verbose, get_stats as get_logging_stats
+import metrics
+from latency import tracker as latency_tracker
 
 # 配置日志
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format=LOG_FORMAT,
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('force_order_monitor.log', encoding='utf-8')
-    ]
-)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -25,13 +26,32 @@ class ForceOrderMonitor:
     
     def __init__(self):
         self.influxdb_handler = None
+        self.sqlite_handler = None
         self.offline_processor = None
+        self.spool = None
+        self.breaker = None
+        self.diverted = 0
+        self.loop = None
         self.websocket_client = None
         self.running = False
         self.use_offline_mode = False
+        self.aggregator = LiquidationAggregator(
+            windows=AGGREGATOR_CONFIG.get("windows", (10, 60, 300, 3600)),
+            buckets=AGGREGATOR_CONFIG.get("buckets", 60),
+            pinned=SYMBOLS,
+            max_symbols=SYMBOL_REGISTRY_CONFIG.get("max_symbols", 500),
+            idle_ttl=SYMBOL_REGISTRY_CONFIG.get("idle_ttl", 86400)
+        )
+        self.report_task = None
+        self.metrics_exporter = None
+        self.latency_task = None
+        # 信号处理和 run() 的 finally 都会调用 cleanup()，只执行一次，后来的调用等待第一次完成
+        self._cleanup_lock = asyncio.Lock()
+        self._cleaned_up = False
         
     async def start(self):
         """启动监控器"""
+        self.loop = asyncio.get_running_loop()
         try:
             logger.info("=" * 60)
             logger.info("🚀 正在启动币安强平订单监控系统...")
@@ -46,32 +66,18 @@ class ForceOrderMonitor:
                 logger.info("🎯 监控模式: 特定币对强平订单")
                 logger.info("📋 监控币对: SOL, ADA, DOGE, XRP, XLM")
             
-            # 尝试初始化InfluxDB处理器
-            try:
-                logger.info("📊 正在初始化InfluxDB处理器...")
-                self.influxdb_handler = InfluxDBHandler()
-                self.use_offline_mode = False
-                logger.info("✅ InfluxDB处理器初始化完成")
-                
-                # 显示数据库信息
-                logger.info("📋 获取数据库信息...")
-                db_info = self.influxdb_handler.get_database_info()
-                if db_info:
-                    logger.info("📊 数据库信息:")
-                    logger.info(f"  组织: {db_info.get('organizations', [])}")
-                    logger.info(f"  存储桶: {db_info.get('buckets', [])}")
-                    logger.info(f"  测量: {db_info.get('measurements', [])}")
-                
-            except Exception as e:
-                logger.warning(f"⚠️ InfluxDB连接失败，切换到离线模式: {e}")
-                logger.info("📁 正在初始化离线数据处理器...")
-                self.offline_processor = OfflineDataProcessor()
-                self.use_offline_mode = True
-                logger.info("✅ 离线数据处理器初始化完成")
+            if STORAGE_MODE == "sqlite":
+                logger.info("🗃️ 正在初始化SQLite处理器...")
+                self.sqlite_handler = SQLiteHandler()
+                logger.info("✅ SQLite处理器初始化完成")
+            elif STORAGE_MODE == "offline":
+                self._start_offline_mode()
+            else:
+                self._start_influxdb_mode()
             
             # 初始化WebSocket客户端
             logger.info("🌐 正在初始化WebSocket客户端...")
-            self.websocket_client = BinanceWebSocketClient(self.handle_force_order)
+            self.websocket_client = BinanceWebSocketClient(self.handle_force_orders)
             logger.info("✅ WebSocket客户端初始化完成")
             
             # 设置信号处理
@@ -79,6 +85,21 @@ class ForceOrderMonitor:
             
             # 启动监控
             self.running = True
+            report_interval = AGGREGATOR_CONFIG.get("report_interval", 60)
+            if report_interval:
+                self.report_task = asyncio.create_task(self._report_loop(report_interval))
+            if METRICS_CONFIG.get("enabled", True):
+                metrics.registry.register_collector(self.collect_metrics)
+                self.metrics_exporter = metrics.MetricsExporter(
+                    host=METRICS_CONFIG.get("host", "127.0.0.1"),
+                    port=METRICS_CONFIG.get("port", 9108),
+                    file=METRICS_CONFIG.get("file"),
+                    interval=METRICS_CONFIG.get("interval", 15),
+                    log_rates=METRICS_CONFIG.get("log_rates", True)
+                )
+                await self.metrics_exporter.start()
+            if latency_tracker.enabled and LATENCY_CONFIG.get("interval", 60):
+                self.latency_task = asyncio.create_task(self._latency_loop(LATENCY_CONFIG["interval"]))
             logger.info("🔄 正在启动监控...")
             await self.websocket_client.connect()
             
@@ -87,39 +108,244 @@ class ForceOrderMonitor:
             await self.cleanup()
             sys.exit(1)
     
-    async def handle_force_order(self, data: Dict[str, Any]):
-        """处理强平订单数据"""
+    def _start_influxdb_mode(self):
+        """初始化InfluxDB处理器，连接失败时切换到离线模式；启用预写日志时由后台线程连接和写入"""
+        if BREAKER_CONFIG.get("enabled", True):
+            self.breaker = CircuitBreaker(
+                name="influxdb",
+                window=BREAKER_CONFIG.get("window", 20),
+                min_calls=BREAKER_CONFIG.get("min_calls", 5),
+                failure_rate=BREAKER_CONFIG.get("failure_rate", 0.5),
+                slow_call_latency=BREAKER_CONFIG.get("slow_call_latency", 5.0),
+                slow_call_rate=BREAKER_CONFIG.get("slow_call_rate", 0.8),
+                open_duration=BREAKER_CONFIG.get("open_duration", 30.0),
+                half_open_calls=BREAKER_CONFIG.get("half_open_calls", 1),
+                on_state_change=self._on_breaker_state_change
+            )
+        
+        if SPOOL_CONFIG.get("enabled", True):
+            logger.info("📝 正在初始化预写日志...")
+            self.spool = WriteAheadSpool(
+                SPOOL_CONFIG.get("directory", "force_orders_spool"),
+                connect=lambda: self._connect_influxdb("synchronous"),
+                batch_size=SPOOL_CONFIG.get("batch_size", 5000),
+                replay_interval=SPOOL_CONFIG.get("replay_interval", 1.0),
+                retry_delay=SPOOL_CONFIG.get("retry_delay", 1.0),
+                max_retry_delay=SPOOL_CONFIG.get("max_retry_delay", 60.0),
+                max_segment_bytes=SPOOL_CONFIG.get("max_segment_bytes", 16 * 1024 * 1024),
+                fsync_batch=SPOOL_CONFIG.get("fsync_batch", 100),
+                fsync_interval=SPOOL_CONFIG.get("fsync_interval", 1.0),
+                breaker=self.breaker
+            )
+            logger.info("✅ 预写日志初始化完成，数据将在InfluxDB可用时写入")
+            return
+        
+        # 尝试初始化InfluxDB处理器
         try:
-            logger.info("🎯 收到新的强平订单数据")
+            self._connect_influxdb()
+        except Exception as e:
+            logger.warning(f"⚠️ InfluxDB连接失败，切换到离线模式: {e}")
+            self._start_offline_mode()
+    
+    def _connect_influxdb(self, write_mode=None) -> InfluxDBHandler:
+        """连接InfluxDB并显示数据库信息"""
+        logger.info("📊 正在初始化InfluxDB处理器...")
+        self.influxdb_handler = InfluxDBHandler(write_mode)
+        self.influxdb_handler.breaker = self.breaker
+        self.influxdb_handler.on_write_failure = self._on_influxdb_write_failure
+        self.use_offline_mode = False
+        logger.info("✅ InfluxDB处理器初始化完成")
+        
+        # 显示数据库信息
+        logger.info("📋 获取数据库信息...")
+        db_info = self.influxdb_handler.get_database_info()
+        if db_info:
+            logger.info("📊 数据库信息:")
+            logger.info(f"  组织: {db_info.get('organizations', [])}")
+            logger.info(f"  存储桶: {db_info.get('buckets', [])}")
+            logger.info(f"  测量: {db_info.get('measurements', [])}")
+        return self.influxdb_handler
+    
+    def _start_offline_mode(self):
+        """初始化离线数据处理器"""
+        logger.info("📁 正在初始化离线数据处理器...")
+        self.offline_processor = OfflineDataProcessor()
+        self.use_offline_mode = True
+        logger.info("✅ 离线数据处理器初始化完成")
+    
+    async def handle_force_orders(self, orders: List[ForceOrder]):
+        """处理一批强平订单数据（同一条WebSocket消息中的订单作为一批保存）"""
+        try:
+            logger.debug("🎯 收到 %d 条新的强平订单数据", len(orders))
+            
+            # 更新实时聚合
+            self.aggregator.update_many(orders)
             
             # 根据模式保存数据
-            if self.use_offline_mode and self.offline_processor:
-                logger.info("💾 使用离线模式保存数据...")
-                self.offline_processor.save_force_order(data)
+            if self.spool:
+                logger.debug("💾 写入预写日志...")
+                self.spool.append(orders)
+            elif self.sqlite_handler:
+                logger.debug("💾 使用SQLite模式保存数据...")
+                self.sqlite_handler.save_force_orders(orders)
+            elif self.use_offline_mode and self.offline_processor:
+                logger.debug("💾 使用离线模式保存数据...")
+                self.offline_processor.save_force_orders(orders)
             elif self.influxdb_handler:
-                logger.info("💾 使用InfluxDB模式保存数据...")
-                self.influxdb_handler.save_force_order(data)
+                if self.breaker and not self.breaker.allow_request():
+                    logger.debug("💾 InfluxDB熔断中，转存到离线存储...")
+                    self._divert_to_offline(orders)
+                else:
+                    logger.debug("💾 使用InfluxDB模式保存数据...")
+                    try:
+                        self.influxdb_handler.save_force_orders(orders)
+                    except Exception:
+                        # 同步写入模式下失败的订单同样转存到本地
+                        self._divert_to_offline(orders)
             
-            # 打印详细信息
-            order = data.get("o", {})
-            logger.info(f"""
+            # 打印详细信息（仅verbose模式，production模式由接收端每笔输出一行）
+            if not is_verbose():
+                return
+            for order in orders:
+                logger.info(f"""
 📋 强平订单详情:
-  🏷️  交易对: {order.get('s', 'N/A')}
-  📈 方向: {order.get('S', 'N/A')}
-  📝 订单类型: {order.get('o', 'N/A')}
-  📊 数量: {order.get('q', 'N/A')}
-  💰 价格: {order.get('p', 'N/A')}
-  📊 平均价格: {order.get('ap', 'N/A')}
-  ✅ 状态: {order.get('X', 'N/A')}
-  🕐 时间: {data.get('E', 'N/A')}
-  💾 存储模式: {'离线模式' if self.use_offline_mode else 'InfluxDB模式'}
-            """)
+  🏷️  交易对: {order.symbol}
+  📈 方向: {order.side}
+  📝 订单类型: {order.order_type}
+  📊 数量: {order.quantity}
+  💰 价格: {order.price}
+  📊 平均价格: {order.avg_price}
+  💵 名义价值: {order.notional:.2f}
+  ✅ 状态: {order.status}
+  🕐 时间: {order.event_time}
+  💾 存储模式: {self.storage_name}
+                """)
             
         except Exception as e:
             logger.error(f"❌ 处理强平订单失败: {e}")
             logger.error(f"错误类型: {type(e).__name__}")
             logger.error(f"错误详情: {str(e)}")
     
+    def _on_influxdb_write_failure(self, orders: List[ForceOrder], error: Exception):
+        """批量写入线程中最终写入失败的订单，交回事件循环转存到离线存储"""
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._divert_to_offline, orders)
+    
+    def _divert_to_offline(self, orders: List[ForceOrder]):
+        """InfluxDB不可用期间把订单保存到离线存储（首次使用时初始化）"""
+        if self.offline_processor is None:
+            logger.info("📁 正在初始化离线数据处理器（InfluxDB写入转存）...")
+            self.offline_processor = OfflineDataProcessor()
+            # 只统计实际写入离线存储的订单（写入线程中回调）
+            self.offline_processor.on_written = self._on_diverted_written
+            self.offline_processor.on_write_failure = self._on_diverted_failed
+        try:
+            self.offline_processor.save_force_orders(orders)
+        except Exception as e:
+            logger.error(f"❌ 转存到离线存储失败，{len(orders)} 条强平订单未保存: {e}")
+    
+    def _on_diverted_written(self, orders: List[ForceOrder]):
+        self.diverted += len(orders)
+    
+    def _on_diverted_failed(self, orders: List[ForceOrder], error: Exception):
+        logger.error(f"❌ 转存到离线存储失败，{len(orders)} 条强平订单未保存: {error}")
+    
+    def _on_breaker_state_change(self, previous: str, state: str):
+        """熔断状态变化（可能在写入线程中回调，只记录日志）"""
+        if state == OPEN:
+            logger.warning(f"🔌 InfluxDB写入熔断，新数据{'暂存在预写日志中' if self.spool else '转存到离线存储'}")
+        elif state == CLOSED:
+            logger.info(f"✅ InfluxDB写入恢复，已切换回InfluxDB（熔断期间转存到离线存储 {self.diverted} 条）")
+    
+    @property
+    def storage_name(self) -> str:
+        """当前存储模式名称"""
+        if self.sqlite_handler:
+            return "SQLite模式"
+        if self.breaker and self.breaker.is_open:
+            return "InfluxDB熔断（预写日志暂存）" if self.spool else "InfluxDB熔断（离线存储）"
+        if self.spool:
+            return "预写日志+InfluxDB模式"
+        return "离线模式" if self.use_offline_mode else "InfluxDB模式"
+    
+    async def _report_loop(self, interval: float):
+        """定期输出实时聚合的市场强平压力"""
+        while self.running:
+            await asyncio.sleep(interval)
+            try:
+                self.report_market_stress()
+            except Exception as e:
+                logger.error(f"❌ 输出强平统计失败: {e}")
+    
+    async def _latency_loop(self, interval: float):
+        """定期导出延迟直方图并输出各阶段耗时"""
+        while self.running:
+            await asyncio.sleep(interval)
+            self.export_latency()
+    
+    def export_latency(self):
+        """导出延迟直方图（查看: python latency_report.py）"""
+        try:
+            summary = latency_tracker.summary_line()
+            if not summary:
+                return
+            logger.info(f"⏱️ 各阶段延迟 p50/p99(毫秒): {summary}")
+            if LATENCY_CONFIG.get("file"):
+                latency_tracker.export(LATENCY_CONFIG["file"])
+        except Exception as e:
+            logger.error(f"❌ 导出延迟统计失败: {e}")
+    
+    def report_market_stress(self):
+        """输出实时聚合的市场强平压力"""
+        window = AGGREGATOR_CONFIG.get("report_window", 60)
+        market = self.aggregator.market(window)
+        if not market["count"]:
+            return
+        logger.info(f"📊 近 {window} 秒强平: {market['count']} 笔，名义价值 {market['notional']:.2f}，"
+                    f"多头 {market['long_notional']:.2f} / 空头 {market['short_notional']:.2f}，"
+                    f"失衡 {market['imbalance']:+.2f}，最大单笔 {market['max_notional']:.2f}")
+        for item in self.aggregator.top(window, AGGREGATOR_CONFIG.get("report_top", 5)):
+            logger.info(f"  {item['symbol']}: {item['count']} 笔，名义价值 {item['notional']:.2f}，失衡 {item['imbalance']:+.2f}")
+    
+    def collect_metrics(self):
+        """输出指标前从各组件的统计中更新积压、连接、熔断等指标"""
+        client = self.websocket_client
+        if client:
+            pipeline = client.get_pipeline_metrics()
+            metrics.BACKLOG.labels("ingest").set(pipeline["depth"])
+            metrics.BACKLOG.labels("ingest_spill").set(pipeline["spill_pending"])
+            for kind in ("enqueued", "processed", "failed", "dropped", "spilled", "restored", "blocked_puts"):
+                metrics.INGEST_TOTAL.labels(kind).set(pipeline[kind])
+            metrics.DUPLICATES.set(client.dedup.duplicates)
+            for status in client.get_shard_status():
+                name = status["connection"]
+                metrics.CONNECTION_UP.labels(name).set(1 if status["connected"] else 0)
+                metrics.RECONNECTS.labels(name, "disconnect").set(status["reconnects"])
+                metrics.RECONNECTS.labels(name, "unhealthy").set(status["proactive_reconnects"])
+                metrics.RECONNECTS.labels(name, "rotate").set(status["rotations"])
+                if status["rtt_ms"] is not None:
+                    metrics.CONNECTION_RTT.labels(name).set(status["rtt_ms"] / 1000)
+                if status["feed_lag_ewma_ms"] is not None:
+                    metrics.FEED_LAG.labels(name).set(status["feed_lag_ewma_ms"] / 1000)
+        
+        for storage, handler in (("influxdb", self.influxdb_handler), ("sqlite", self.sqlite_handler),
+                                 ("offline", self.offline_processor)):
+            writer = handler.batch_writer if handler else None
+            if writer:
+                stats = writer.get_stats()
+                metrics.BACKLOG.labels(f"{storage}_writer").set(stats["pending"])
+                metrics.WRITER_DROPPED.labels(storage).set(stats["dropped"])
+                metrics.WRITER_RETRIES.labels(storage).set(stats["retries"])
+        if self.spool:
+            metrics.BACKLOG.labels("spool").set(self.spool.pending)
+        if self.breaker:
+            breaker = self.breaker.get_stats()
+            for state in (CLOSED, OPEN, HALF_OPEN):
+                metrics.BREAKER_STATE.labels(state).set(1 if breaker["state"] == state else 0)
+            metrics.BREAKER_OPENED.set(breaker["opened"])
+        metrics.DIVERTED.set(self.diverted)
+        metrics.LOG_DROPPED.set(get_logging_stats()["dropped"])
+    
     def setup_signal_handlers(self):
         """设置信号处理器"""
         def signal_handler(signum, frame):
@@ -131,20 +357,57 @@ class ForceOrderMonitor:
         signal.signal(signal.SIGTERM, signal_handler)
     
     async def cleanup(self):
-        """清理资源"""
+        """清理资源（可重复调用，只清理一次）"""
+        async with self._cleanup_lock:
+            if self._cleaned_up:
+                return
+            self._cleaned_up = True
+            await self._cleanup()
+    
+    async def _cleanup(self):
         logger.info("🧹 正在清理资源...")
         
+        if self.report_task:
+            self.report_task.cancel()
+            self.report_task = None
+        
+        if self.latency_task:
+            self.latency_task.cancel()
+            self.latency_task = None
+        
+        if self.metrics_exporter:
+            await self.metrics_exporter.stop()
+            metrics.registry.unregister_collector(self.collect_metrics)
+            self.metrics_exporter = None
+        
         if self.websocket_client:
             logger.info("🔌 正在断开WebSocket连接...")
             await self.websocket_client.disconnect()
         
+        if self.spool:
+            logger.info("📝 正在回放剩余的预写日志...")
+            # 回放和等待线程退出可能需要数十秒，在线程池中进行，不阻塞事件循环
+            await self.loop.run_in_executor(None, self.spool.close)
+            self.spool = None
+        
         if self.influxdb_handler:
+            # close() 会先提交写入缓冲区中的剩余数据，在线程池中进行，不阻塞事件循环
             logger.info("🗄️ 正在关闭InfluxDB连接...")
-            self.influxdb_handler.close()
+            await self.loop.run_in_executor(None, self.influxdb_handler.close)
+            self.influxdb_handler = None
+        
+        if self.sqlite_handler:
+            logger.info("🗃️ 正在关闭SQLite数据库...")
+            self.sqlite_handler.close()
+            self.sqlite_handler = None
         
         if self.offline_processor:
             logger.info("💾 正在保存离线数据...")
-            self.offline_processor._save_data()
+            await self.loop.run_in_executor(None, self.offline_processor.close)
+            self.offline_processor = None
+        
+        if latency_tracker.enabled:
+            self.export_latency()
         
         logger.info("✅ 资源清理完成")
     
@@ -174,7 +437,10 @@ class ForceOrderMonitor:
 async def main():
     """主函数"""
     monitor = ForceOrderMonitor()
-    await monitor.run()
+    try:
+        await monitor.run()
+    finally:
+        shutdown_logging()
 
 if __name__ == "__main__":
     try:
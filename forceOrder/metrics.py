@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 耗时分桶(秒)：解析为微秒级，存储写入为毫秒到秒级
+DECODE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+WRITE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock: Optional[threading.Lock] = None):
+        self.value = 0.0
+        self._lock = lock
+
+    def inc(self, amount: float = 1):
+        if self._lock is None:
+            self.value += amount
+            return
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        """直接设置累计值（用于镜像组件已有的累计统计）"""
+        self.value = value
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...], lock: Optional[threading.Lock] = None):
+        self.bounds = bounds
+        # 最后一个为 +Inf 桶
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        if self._lock is None:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            return
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+class _Metric:
+    """带标签的指标，每组标签值对应一个子项（首次使用时创建并缓存）
+
+    threadsafe=False 的指标只能在一个线程（事件循环）中更新，更新时不加锁。
+    """
+
+    kind = ""
+    child_class = _CounterChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), threadsafe: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.threadsafe = threadsafe
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        # 无标签的指标直接使用默认子项
+        self._default = None if self.labelnames else self.labels()
+
+    def _new_child(self):
+        return self.child_class(threading.Lock() if self.threadsafe else None)
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def total(self) -> float:
+        """全部子项的值之和（计数器和仪表）"""
+        return sum(child.value for child in list(self._children.values()))
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items(), key=lambda item: item[0])
+        for values, child in children:
+            lines.extend(self._sample_lines(values, child))
+        return lines
+
+    def _sample_lines(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+class Counter(_Metric):
+    """只增不减的累计值"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    kind = "gauge"
+    child_class = _GaugeChild
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default.dec(amount)
+
+class Histogram(_Metric):
+    """固定分桶的分布统计，输出为Prometheus累计桶格式"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = WRITE_BUCKETS, threadsafe: bool = True):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, threadsafe)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, threading.Lock() if self.threadsafe else None)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    @staticmethod
+    def _snapshot(child: _HistogramChild):
+        return list(child.counts), child.sum, child.count
+
+    def _sample_lines(self, values, child) -> List[str]:
+        if child._lock is None:
+            counts, total, count = self._snapshot(child)
+        else:
+            with child._lock:
+                counts, total, count = self._snapshot(child)
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, values, (("le", _format_value(bound)),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """指标注册表：事件路径上只做计数，组件已有的统计在输出前由采集函数读取"""
+
+    def __init__(self, prefix: str = "force_order"):
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                threadsafe: bool = True) -> Counter:
+        return self._register(Counter(f"{self.prefix}_{name}", documentation, labelnames, threadsafe))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              threadsafe: bool = True) -> Gauge:
+        return self._register(Gauge(f"{self.prefix}_{name}", documentation, labelnames, threadsafe))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = WRITE_BUCKETS, threadsafe: bool = True) -> Histogram:
+        return self._register(Histogram(f"{self.prefix}_{name}", documentation, labelnames, buckets, threadsafe))
+
+    def register_collector(self, collector: Callable[[], None]):
+        """注册采集函数，每次输出前调用（用于从各组件的get_stats()更新仪表值）"""
+        self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], None]):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        """Prometheus文本格式（0.0.4）"""
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"❌ 采集指标失败: {e}")
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# 接收与解析（只在事件循环中更新，不加锁）
+MESSAGES_RECEIVED = registry.counter("messages_received_total", "收到的WebSocket消息数（含冗余连接的重复消息）",
+                                     threadsafe=False)
+EVENTS_DECODED = registry.counter("events_decoded_total", "解析出的强平订单数（去重前）", threadsafe=False)
+SYMBOL_EVENTS = registry.counter("symbol_events_total", "各币对去重后的强平订单数", ("symbol",), threadsafe=False)
+DECODE_ERRORS = registry.counter("decode_errors_total", "解析失败的消息数", threadsafe=False)
+DECODE_SECONDS = registry.histogram("decode_seconds", "单条消息解析耗时(秒)", buckets=DECODE_BUCKETS,
+                                    threadsafe=False)
+
+# 存储写入（在写入线程中更新）
+EVENTS_PERSISTED = registry.counter("events_persisted_total", "已写入存储的强平订单数", ("storage",))
+WRITE_FAILURES = registry.counter("write_failures_total", "存储写入失败的批次数", ("storage",))
+WRITE_SECONDS = registry.histogram("write_seconds", "存储单批写入耗时(秒)", ("storage",))
+WRITE_BATCH_SIZE = registry.histogram("write_batch_size", "存储单批写入的订单数", ("storage",), BATCH_SIZE_BUCKETS)
+
+# 以下由监控器的采集函数在输出前从各组件的统计中更新
+BACKLOG = registry.gauge("backlog", "各级缓冲中等待处理的数据量（接入队列按消息计，其余按订单计）", ("queue",))
+INGEST_TOTAL = registry.counter("ingest_total", "接入队列累计统计（入队、处理、丢弃、溢出等）", ("kind",))
+WRITER_DROPPED = registry.counter("writer_dropped_total", "写入缓冲区已满时丢弃的订单数", ("storage",))
+WRITER_RETRIES = registry.counter("writer_retries_total", "批量写入的重试次数", ("storage",))
+DIVERTED = registry.counter("diverted_total", "InfluxDB不可用期间转存到离线存储的订单数")
+DUPLICATES = registry.counter("duplicates_total", "冗余连接去重丢弃的重复订单数")
+CONNECTION_UP = registry.gauge("connection_up", "连接状态（1为已连接）", ("connection",))
+RECONNECTS = registry.counter("reconnects_total", "重连次数", ("connection", "reason"))
+CONNECTION_RTT = registry.gauge("connection_rtt_seconds", "最近一次ping往返时间(秒)", ("connection",))
+FEED_LAG = registry.gauge("feed_lag_seconds", "推送延迟的指数移动平均(秒，本地接收时间 - 事件时间E)", ("connection",))
+BREAKER_STATE = registry.gauge("breaker_state", "写入熔断状态（当前状态为1）", ("state",))
+BREAKER_OPENED = registry.counter("breaker_opened_total", "熔断打开次数")
+LOG_DROPPED = registry.counter("log_dropped_total", "日志队列已满时丢弃的日志条数")
+
+class MetricsExporter:
+    """指标输出：本地HTTP端口（Prometheus抓取 /metrics）和/或定期写入文本文件，并按间隔在日志中输出吞吐"""
+
+    def __init__(self,
+                 metrics_registry: MetricsRegistry = registry,
+                 host: str = "127.0.0.1",
+                 port: Optional[int] = 9108,
+                 file: Optional[str] = None,
+                 interval: float = 15.0,
+                 log_rates: bool = True):
+        self.registry = metrics_registry
+        self.host = host
+        self.port = port
+        self.file = file
+        self.interval = interval
+        self.log_rates = log_rates
+        self.server = None
+        self._task = None
+        self._last = None
+
+    async def start(self):
+        if self.port:
+            try:
+                self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+                logger.info(f"📈 指标服务已启动: http://{self.host}:{self.port}/metrics")
+            except OSError as e:
+                logger.error(f"❌ 指标服务启动失败（{self.host}:{self.port}）: {e}")
+        if self.interval and (self.file or self.log_rates):
+            self._task = asyncio.create_task(self._export_loop())
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """极简HTTP处理：只支持 GET /metrics"""
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            parts = request.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+            if len(parts) < 2 or parts[0] != "GET" or path not in ("/metrics", "/"):
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"not found\n"
+            else:
+                status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+                body = self.registry.render().encode("utf-8")
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.debug("指标请求处理失败: %s", e)
+        finally:
+            writer.close()
+
+    async def _export_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.export_once()
+            except Exception as e:
+                logger.error(f"❌ 输出指标失败: {e}")
+
+    def export_once(self):
+        """写入指标文件（写临时文件后原子替换）并输出吞吐"""
+        text = self.registry.render()
+        if self.file:
+            temp = self.file + ".tmp"
+            with open(temp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp, self.file)
+        if self.log_rates:
+            self._log_rates()
+
+    def _log_rates(self):
+        """按上次输出以来的增量计算每秒速率"""
+        now = time.monotonic()
+        current = (
+            MESSAGES_RECEIVED.total(),
+            EVENTS_DECODED.total(),
+            EVENTS_PERSISTED.total(),
+        )
+        last, self._last = self._last, (now, current)
+        if last is None or now <= last[0]:
+            return
+        elapsed = now - last[0]
+        received, decoded, persisted = ((value - previous) / elapsed for value, previous in zip(current, last[1]))
+        if received or decoded or persisted:
+            logger.info(f"📈 吞吐: 接收 {received:.1f} 条消息/秒，解析 {decoded:.1f} 笔/秒，写入 {persisted:.1f} 笔/秒")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.file:
+            try:
+                self.export_once()
+            except Exception as e:
+                logger.error(f"❌ 输出指标失败: {e}")
@@ -3,7 +3,8 @@ import logging
 from datetime import datetime, timedelta
 from influxdb_handler import InfluxDBHandler
 from data_processor import OfflineDataProcessor
-from config import SYMBOLS, INFLUXDB_CONFIG
+from config import SYMBOLS, SYMBOL_REGISTRY_CONFIG, STORAGE_MODE
+from symbol_registry import SymbolRegistry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,67 +14,67 @@ class ForceOrderQueryTool:
     
     def __init__(self):
         self.influxdb_handler = None
+        self.sqlite_handler = None
         self.offline_processor = None
         self.use_offline_mode = False
+        self.symbol_registry = SymbolRegistry(
+            pinned=SYMBOLS,
+            max_symbols=SYMBOL_REGISTRY_CONFIG.get("max_symbols", 500),
+            idle_ttl=0
+        )
         self._initialize_handlers()
     
     def _initialize_handlers(self):
         """初始化数据处理器"""
+        if STORAGE_MODE == "sqlite":
+            from sqlite_handler import SQLiteHandler
+            self.sqlite_handler = SQLiteHandler(read_only=True)
+            logger.info("使用SQLite模式")
+            return
         try:
             # 尝试连接InfluxDB
-            self.influxdb_handler = InfluxDBHandler()
+            self.influxdb_handler = InfluxDBHandler(read_only=True)
             self.use_offline_mode = False
             logger.info("使用InfluxDB模式")
         except Exception as e:
             logger.warning(f"InfluxDB连接失败，切换到离线模式: {e}")
-            self.offline_processor = OfflineDataProcessor()
+            self.offline_processor = OfflineDataProcessor(read_only=True)
             self.use_offline_mode = True
             logger.info("使用离线模式")
     
+    def get_symbols(self, hours: int = 24):
+        """获取可查询的币对：配置中的币对加上数据中实际出现过的币对"""
+        if self.use_offline_mode:
+            return self.offline_processor.get_symbols()
+        handler = self.sqlite_handler or self.influxdb_handler
+        self.symbol_registry.register(handler.list_symbols(hours))
+        return self.symbol_registry.symbols()
+    
     def query_force_orders_by_symbol(self, symbol: str, hours: int = 24, limit: int = 100):
         """查询指定币对的强平订单"""
         try:
             logger.info(f"查询 {symbol} 最近 {hours} 小时的强平订单...")
             
-            if self.use_offline_mode:
-                # 离线模式查询
-                orders = self.offline_processor.query_force_orders_by_symbol(symbol, hours, limit)
+            if self.sqlite_handler or self.use_offline_mode:
+                # SQLite模式按 (symbol, event_time) 索引查询；离线模式查询列式存储或内存索引
+                if self.sqlite_handler:
+                    orders = self.sqlite_handler.query_latest_orders(hours, limit, symbol)
+                else:
+                    orders = self.offline_processor.query_force_orders_by_symbol(symbol, hours, limit)
                 if orders:
                     for order in orders:
-                        data = order['data']['o']
-                        print(f"""
-时间: {order['timestamp']}
-交易对: {data.get('s', 'N/A')}
-方向: {data.get('S', 'N/A')}
-数量: {data.get('q', 'N/A')}
-价格: {data.get('p', 'N/A')}
-状态: {data.get('X', 'N/A')}
-                        """)
+                        self.print_order(order)
                 else:
                     print(f"未找到 {symbol} 的强平订单记录")
             else:
                 # InfluxDB模式查询
-                query = f'''
-                from(bucket: "{INFLUXDB_CONFIG["bucket"]}")
-                    |> range(start: -{hours}h)
-                    |> filter(fn: (r) => r["_measurement"] == "{INFLUXDB_CONFIG["measurement"]}")
-                    |> filter(fn: (r) => r["symbol"] == "{symbol}")
-                    |> sort(columns: ["_time"], desc: true)
-                    |> limit(n: {limit})
-                '''
-                
-                result = self.influxdb_handler.query_api.query(query)
+                found = 0
+                for record in self.influxdb_handler.query_latest_orders(hours, limit, symbol):
+                    found += 1
+                    self.print_record(record)
                 
-                if result:
-                    logger.info(f"找到 {len(result)} 条记录")
-                    for record in result:
-                        print(f"""
-时间: {record.get_time()}
-交易对: {record.values.get('symbol', 'N/A')}
-方向: {record.values.get('side', 'N/A')}
-数量: {record.values.get('_value', 'N/A')}
-价格: {record.values.get('price', 'N/A')}
-                        """)
+                if found:
+                    logger.info(f"找到 {found} 条记录")
                 else:
                     logger.info(f"未找到 {symbol} 的强平订单记录")
                 
@@ -85,12 +86,29 @@ class ForceOrderQueryTool:
         try:
             logger.info(f"查询最近 {hours} 小时所有币对的强平订单统计...")
             
-            if self.use_offline_mode:
+            if self.sqlite_handler:
+                current = None
+                for order in self.sqlite_handler.query_latest_orders(hours, 10):
+                    if order.symbol != current:
+                        current = order.symbol
+                        print(f"\n=== {current} 强平订单统计 ===")
+                    self.print_order(order)
+                if current is None:
+                    print(f"最近 {hours} 小时没有强平订单记录")
+            elif self.use_offline_mode:
                 self.offline_processor.query_all_force_orders(hours)
             else:
-                for symbol in SYMBOLS:
-                    print(f"\n=== {symbol} 强平订单统计 ===")
-                    self.query_force_orders_by_symbol(symbol, hours, 10)
+                # 一次查询全部币对，结果按币对分组返回
+                current = None
+                for record in self.influxdb_handler.query_latest_orders(hours, 10):
+                    symbol = record.values.get("symbol")
+                    if symbol != current:
+                        current = symbol
+                        self.symbol_registry.get_or_create(symbol)
+                        print(f"\n=== {symbol} 强平订单统计 ===")
+                    self.print_record(record)
+                if current is None:
+                    print(f"最近 {hours} 小时没有强平订单记录")
                 
         except Exception as e:
             logger.error(f"查询失败: {e}")
@@ -103,39 +121,83 @@ class ForceOrderQueryTool:
             if self.use_offline_mode:
                 self.offline_processor.query_force_orders_summary(hours)
             else:
-                # InfluxDB模式查询
-                total_query = f'''
-                from(bucket: "{INFLUXDB_CONFIG["bucket"]}")
-                    |> range(start: -{hours}h)
-                    |> filter(fn: (r) => r["_measurement"] == "{INFLUXDB_CONFIG["measurement"]}")
-                    |> count()
-                '''
-                
-                total_result = self.influxdb_handler.query_api.query(total_query)
-                total_count = len(list(total_result)) if total_result else 0
-                
-                print(f"总强平订单数: {total_count}")
-                
-                # 按币对统计
-                for symbol in SYMBOLS:
-                    symbol_query = f'''
-                    from(bucket: "{INFLUXDB_CONFIG["bucket"]}")
-                        |> range(start: -{hours}h)
-                        |> filter(fn: (r) => r["_measurement"] == "{INFLUXDB_CONFIG["measurement"]}")
-                        |> filter(fn: (r) => r["symbol"] == "{symbol}")
-                        |> count()
-                    '''
-                    
-                    symbol_result = self.influxdb_handler.query_api.query(symbol_query)
-                    symbol_count = len(list(symbol_result)) if symbol_result else 0
-                    
-                    print(f"{symbol}: {symbol_count} 条")
+                # InfluxDB模式：中间部分读取汇总测量，两端读取原始数据；SQLite模式：GROUP BY聚合
+                end_ms = int(datetime.now().timestamp() * 1000)
+                handler = self.sqlite_handler or self.influxdb_handler
+                summary = handler.query_summary(end_ms - hours * 3600 * 1000, end_ms)
+                self.print_summary(summary)
                 
         except Exception as e:
             logger.error(f"查询汇总失败: {e}")
     
+    def load_analytics_frame(self, hours: int = 24, symbols=None):
+        """加载最近一段时间的强平订单为列式数组（需要安装numpy）"""
+        from analytics import LiquidationFrame
+        end_ms = int(datetime.now().timestamp() * 1000)
+        start_ms = end_ms - hours * 3600 * 1000
+        if self.sqlite_handler:
+            return LiquidationFrame.from_orders(
+                order for order in self.sqlite_handler.stream_force_orders(start_ms, end_ms)
+                if not symbols or order.symbol in symbols
+            )
+        if self.use_offline_mode:
+            if self.offline_processor.columns is not None:
+                return LiquidationFrame.from_store(self.offline_processor.columns, start_ms, end_ms, symbols)
+            from data_processor import iter_stored_orders
+            orders = iter_stored_orders(start_ms, end_ms)
+            if symbols:
+                orders = (order for order in orders if order.symbol in symbols)
+            return LiquidationFrame.from_orders(orders)
+        return LiquidationFrame.from_records(self.influxdb_handler.stream_force_orders(start_ms, end_ms, symbols))
+    
+    def analyze_force_orders(self, hours: int = 24, freq_minutes: int = 1):
+        """强平数据分析：规模分位数、名义价值序列、多空失衡和爆发相关性"""
+        try:
+            from analytics import print_report
+            logger.info(f"分析最近 {hours} 小时强平订单...")
+            frame = self.load_analytics_frame(hours)
+            print_report(frame, freq_minutes * 60000)
+        except Exception as e:
+            logger.error(f"数据分析失败: {e}")
+    
+    def print_record(self, record):
+        """输出一条InfluxDB强平订单记录"""
+        values = record.values
+        print(f"""
+时间: {record.get_time()}
+交易对: {values.get('symbol', 'N/A')}
+方向: {values.get('side', 'N/A')}
+数量: {values.get('quantity', 'N/A')}
+价格: {values.get('price', 'N/A')}
+名义价值: {values.get('notional', 'N/A')}
+                        """)
+    
+    def print_order(self, order):
+        """输出一条强平订单（离线模式/SQLite模式）"""
+        print(f"""
+时间: {datetime.fromtimestamp(order.event_time / 1000).isoformat()}
+交易对: {order.symbol}
+方向: {order.side}
+数量: {order.quantity}
+价格: {order.price}
+状态: {order.status}
+                        """)
+    
+    def print_summary(self, summary):
+        """输出按币对/方向的汇总结果"""
+        total_count = sum(bucket.count for bucket in summary.values())
+        total_notional = sum(bucket.sum_notional for bucket in summary.values())
+        print(f"总强平订单数: {total_count}")
+        print(f"总名义价值: {total_notional:.2f}")
+        
+        for (symbol, side), bucket in sorted(summary.items(), key=lambda item: item[1].sum_notional, reverse=True):
+            print(f"{symbol} {side}: {bucket.count} 条，数量 {bucket.sum_qty:.4f}，名义价值 {bucket.sum_notional:.2f}，"
+                  f"最大单笔 {bucket.max_notional:.2f}，VWAP {bucket.vwap:.6g}")
+    
     def get_data_summary(self):
         """获取数据摘要"""
+        if self.sqlite_handler:
+            return self.sqlite_handler.get_data_summary()
         if self.use_offline_mode:
             return self.offline_processor.get_data_summary()
         else:
@@ -145,8 +207,10 @@ class ForceOrderQueryTool:
         """关闭连接"""
         if self.influxdb_handler:
             self.influxdb_handler.close()
+        if self.sqlite_handler:
+            self.sqlite_handler.close()
         if self.offline_processor:
-            self.offline_processor._save_data()
+            self.offline_processor.close()
 
 def main():
     """主函数"""
@@ -155,23 +219,27 @@ def main():
     try:
         while True:
             print("\n=== 强平订单查询工具 ===")
-            print(f"当前模式: {'离线模式' if tool.use_offline_mode else 'InfluxDB模式'}")
+            print(f"当前模式: {'SQLite模式' if tool.sqlite_handler else '离线模式' if tool.use_offline_mode else 'InfluxDB模式'}")
             print("1. 查询指定币对强平订单")
             print("2. 查询所有币对强平订单")
             print("3. 查询强平订单汇总")
             print("4. 查看数据摘要")
-            print("5. 退出")
+            print("5. 强平数据分析")
+            print("6. 退出")
             
-            choice = input("请选择操作 (1-5): ").strip()
+            choice = input("请选择操作 (1-6): ").strip()
             
             if choice == "1":
                 symbol = input("请输入币对 (如: SOLUSDT): ").strip().upper()
-                if symbol in SYMBOLS:
+                if symbol:
                     hours = int(input("请输入查询小时数 (默认24): ") or "24")
                     tool.query_force_orders_by_symbol(symbol, hours)
+                    symbols = tool.get_symbols(hours)
+                    if symbol not in symbols:
+                        print(f"提示: 最近 {hours} 小时内未发现 {symbol} 的数据")
+                        print(f"可查询的币对: {', '.join(symbols)}")
                 else:
-                    print(f"不支持的币对: {symbol}")
-                    print(f"支持的币对: {', '.join(SYMBOLS)}")
+                    print("币对不能为空")
             
             elif choice == "2":
                 hours = int(input("请输入查询小时数 (默认24): ") or "24")
@@ -188,6 +256,11 @@ def main():
                     print(f"{key}: {value}")
             
             elif choice == "5":
+                hours = int(input("请输入分析小时数 (默认24): ") or "24")
+                freq = int(input("请输入时间粒度分钟数 (默认1): ") or "1")
+                tool.analyze_force_orders(hours, freq)
+            
+            elif choice == "6":
                 print("退出程序...")
                 break
             
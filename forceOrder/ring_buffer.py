@@ -0,0 +1,93 @@
+from typing import Any, Iterator, List, Optional
+
+class TimeIndexedRingBuffer:
+    """固定容量的环形缓冲区，记录按事件时间(毫秒)有序存放，范围查询为二分查找加切片"""
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity必须大于0")
+        self.capacity = capacity
+        self._times = [0] * capacity
+        self._items: List[Any] = [None] * capacity
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(self._size):
+            yield self._items[(self._head + i) % self.capacity]
+
+    def _time_at(self, index: int) -> int:
+        return self._times[(self._head + index) % self.capacity]
+
+    def _bisect(self, event_time: int, right: bool = False) -> int:
+        """在逻辑下标上二分查找事件时间的位置"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            t = self._time_at(mid)
+            if t < event_time or (right and t == event_time):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def append(self, event_time: int, item: Any) -> bool:
+        """按事件时间插入记录，容量满时淘汰最旧的记录；比全部记录都旧时丢弃并返回False"""
+        capacity = self.capacity
+        if self._size == 0 or event_time >= self._time_at(self._size - 1):
+            # 常见情况：事件按时间顺序到达，O(1)追加
+            if self._size == capacity:
+                self._head = (self._head + 1) % capacity
+                self._size -= 1
+            slot = (self._head + self._size) % capacity
+            self._times[slot] = event_time
+            self._items[slot] = item
+            self._size += 1
+            return True
+
+        # 乱序到达：找到插入位置后把之后的记录后移一位
+        position = self._bisect(event_time, right=True)
+        if self._size == capacity:
+            if position == 0:
+                return False
+            self._head = (self._head + 1) % capacity
+            self._size -= 1
+            position -= 1
+        for i in range(self._size, position, -1):
+            dst = (self._head + i) % capacity
+            src = (self._head + i - 1) % capacity
+            self._times[dst] = self._times[src]
+            self._items[dst] = self._items[src]
+        slot = (self._head + position) % capacity
+        self._times[slot] = event_time
+        self._items[slot] = item
+        self._size += 1
+        return True
+
+    def range(self, start_time: int, end_time: Optional[int] = None, limit: Optional[int] = None) -> List[Any]:
+        """返回事件时间在 [start_time, end_time) 内的记录，指定limit时只返回最新的limit条"""
+        lo = self._bisect(start_time)
+        hi = self._size if end_time is None else self._bisect(end_time)
+        if limit is not None:
+            lo = max(lo, hi - limit)
+        return [self._items[(self._head + i) % self.capacity] for i in range(lo, hi)]
+
+    def count_since(self, start_time: int) -> int:
+        """统计事件时间不早于start_time的记录数"""
+        return self._size - self._bisect(start_time)
+
+    def latest(self, n: int) -> List[Any]:
+        """返回最新的n条记录"""
+        n = min(n, self._size)
+        return [self._items[(self._head + i) % self.capacity] for i in range(self._size - n, self._size)]
+
+    def oldest_time(self) -> Optional[int]:
+        """最旧记录的事件时间"""
+        return self._time_at(0) if self._size else None
+
+    def newest_time(self) -> Optional[int]:
+        """最新记录的事件时间"""
+        return self._time_at(self._size - 1) if self._size else None
@@ -0,0 +1,202 @@
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from force_order import ForceOrder
+
+# 汇总字段：条数、数量合计、名义价值合计、最大单笔名义价值、价格×数量合计（用于计算VWAP）
+ROLLUP_FIELDS = ("count", "sum_qty", "sum_notional", "max_notional", "sum_price_qty")
+
+class RollupBucket:
+    """单个时间桶内某币对某方向的汇总"""
+
+    __slots__ = ROLLUP_FIELDS
+
+    def __init__(self, count: int = 0, sum_qty: float = 0.0, sum_notional: float = 0.0,
+                 max_notional: float = 0.0, sum_price_qty: float = 0.0):
+        self.count = count
+        self.sum_qty = sum_qty
+        self.sum_notional = sum_notional
+        self.max_notional = max_notional
+        self.sum_price_qty = sum_price_qty
+
+    def add(self, order: ForceOrder):
+        self.count += 1
+        self.sum_qty += order.quantity
+        self.sum_notional += order.notional
+        self.sum_price_qty += order.price * order.quantity
+        if order.notional > self.max_notional:
+            self.max_notional = order.notional
+
+    def merge(self, count: int, sum_qty: float, sum_notional: float, max_notional: float, sum_price_qty: float):
+        """合并另一份汇总（如查询得到的汇总结果）"""
+        self.count += int(count or 0)
+        self.sum_qty += sum_qty or 0.0
+        self.sum_notional += sum_notional or 0.0
+        self.sum_price_qty += sum_price_qty or 0.0
+        if max_notional and max_notional > self.max_notional:
+            self.max_notional = max_notional
+
+    @property
+    def vwap(self) -> float:
+        """按数量加权的强平价格"""
+        return self.sum_price_qty / self.sum_qty if self.sum_qty else 0.0
+
+    def copy(self) -> "RollupBucket":
+        return RollupBucket(self.count, self.sum_qty, self.sum_notional, self.max_notional, self.sum_price_qty)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_qty": self.sum_qty,
+            "sum_notional": self.sum_notional,
+            "max_notional": self.max_notional,
+            "vwap": self.vwap,
+        }
+
+class RollupAccumulator:
+    """写入端汇总：按分辨率（如1分钟、1小时）、币对和方向在内存中累计，写入时输出有变化的桶
+
+    每个桶写入的是累计值，同一桶重复写入会覆盖之前的数据点。内存中没有、且可能已有写入数据的桶
+    （已清出内存的旧桶，或启动时尚未读取的桶）先暂存增量，读取已写入的累计值合并后才标记为待写入，
+    避免用部分数据覆盖已写入的桶。
+    """
+
+    def __init__(self, resolutions: Dict[str, int], retain_buckets: int = 2):
+        # 名称 -> 桶宽度(毫秒)，按宽度从小到大排列
+        self.resolutions = {name: seconds * 1000 for name, seconds in sorted(resolutions.items(), key=lambda item: item[1])}
+        self.retain_buckets = retain_buckets
+        self._lock = threading.Lock()
+        # (分辨率, 桶起始毫秒, 币对, 方向) -> RollupBucket
+        self._buckets: Dict[Tuple[str, int, str, str], RollupBucket] = {}
+        self._dirty = set()
+        # 每个分辨率已清出内存的边界，早于该边界的桶需要先读取已写入的累计值
+        now = int(time.time() * 1000)
+        self._floor = {name: self._bucket_start(now, width) - retain_buckets * width
+                       for name, width in self.resolutions.items()}
+        # 每个分辨率从该时间起的桶完整保存在内存中（不在内存中即为空）；启动时只有未来的桶满足
+        self._known_from = {name: self._bucket_start(now, width) + width
+                            for name, width in self.resolutions.items()}
+        # 等待读取已写入累计值的桶 -> 尚未合并的增量
+        self._pending: Dict[Tuple[str, int, str, str], RollupBucket] = {}
+        self.late_seeded = 0
+
+    @staticmethod
+    def _bucket_start(timestamp_ms: int, width: int) -> int:
+        return timestamp_ms - timestamp_ms % width
+
+    def floor(self, name: str) -> int:
+        """当前内存中最早的桶起始时间"""
+        return self._floor[name]
+
+    def seed(self, name: str, start: int, symbol: str, side: str, **fields):
+        """用已写入的汇总初始化内存中的桶（重启后继续累计未结束的桶，或合并迟到数据的增量）
+
+        内存中已有的桶以内存为准；暂存了增量的桶合并后标记为待写入。
+        """
+        with self._lock:
+            key = (name, start, symbol, side)
+            if key in self._buckets:
+                return
+            pending = self._pending.pop(key, None)
+            if pending is None and start < self._floor[name]:
+                return
+            bucket = self._buckets[key] = RollupBucket()
+            bucket.merge(**{field: fields.get(field) for field in ROLLUP_FIELDS})
+            if pending is not None:
+                bucket.merge(*(getattr(pending, field) for field in ROLLUP_FIELDS))
+                self._dirty.add(key)
+
+    def finish_seed(self, name: str, start: int, end: Optional[int] = None):
+        """[start, end) 区间已读取完成：没有已写入数据的暂存增量直接作为完整的桶；end 为空表示一直到现在"""
+        with self._lock:
+            for key in [key for key in self._pending
+                        if key[0] == name and key[1] >= start and (end is None or key[1] < end)]:
+                self._buckets[key] = self._pending.pop(key)
+                self._dirty.add(key)
+            if end is None and start < self._known_from[name]:
+                self._known_from[name] = start
+
+    def pending_ranges(self) -> Dict[str, Tuple[int, int]]:
+        """各分辨率等待读取的桶范围 {名称: (起始毫秒, 结束毫秒)}"""
+        with self._lock:
+            ranges: Dict[str, Tuple[int, int]] = {}
+            for name, start, _, _ in self._pending:
+                end = start + self.resolutions[name]
+                low, high = ranges.get(name, (start, end))
+                ranges[name] = (min(low, start), max(high, end))
+        return ranges
+
+    def add_many(self, orders: Iterable[ForceOrder]):
+        """累计一批强平订单"""
+        with self._lock:
+            for order in orders:
+                for name, width in self.resolutions.items():
+                    start = self._bucket_start(order.event_time, width)
+                    key = (name, start, order.symbol, order.side)
+                    bucket = self._buckets.get(key)
+                    if bucket is None:
+                        if start < self._known_from[name] or start < self._floor[name]:
+                            # 可能已有写入的数据：暂存增量，读取已写入的累计值后再合并
+                            pending = self._pending.get(key)
+                            if pending is None:
+                                pending = self._pending[key] = RollupBucket()
+                            pending.add(order)
+                            self.late_seeded += 1
+                            continue
+                        bucket = self._buckets[key] = RollupBucket()
+                    bucket.add(order)
+                    self._dirty.add(key)
+
+    def collect_dirty(self) -> List[Tuple[Tuple[str, int, str, str], RollupBucket]]:
+        """取出有变化的桶（累计值的副本），并清理已结束且已写入的旧桶"""
+        with self._lock:
+            dirty = [(key, self._buckets[key].copy()) for key in self._dirty]
+            self._dirty.clear()
+            self._prune()
+        return dirty
+
+    def mark_dirty(self, keys: Iterable[Tuple[str, int, str, str]]):
+        """写入失败时重新标记，下次写入时再提交"""
+        with self._lock:
+            self._dirty.update(key for key in keys if key in self._buckets)
+
+    def _prune(self):
+        now = int(time.time() * 1000)
+        for name, width in self.resolutions.items():
+            floor = self._bucket_start(now, width) - self.retain_buckets * width
+            if floor > self._floor[name]:
+                self._floor[name] = floor
+        expired = [key for key in self._buckets
+                   if key[1] < self._floor[key[0]] and key not in self._dirty]
+        for key in expired:
+            del self._buckets[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "buckets": len(self._buckets),
+            "dirty": len(self._dirty),
+            "pending_seed": len(self._pending),
+            "late_seeded": self.late_seeded,
+        }
+
+def plan_segments(start_ms: int, end_ms: int, resolutions: List[Tuple[str, int]],
+                  coverage: Optional[Dict[str, int]] = None) -> List[Tuple[str, int, int]]:
+    """把查询区间拆分为尽量粗的汇总分辨率加上两端的原始数据
+
+    resolutions 为按宽度从小到大排列的 (名称, 桶宽度毫秒)；coverage 为各分辨率汇总数据完整的起始时间，
+    早于该时间的部分使用更细的分辨率或原始数据。返回 [(名称或"raw", 起始毫秒, 结束毫秒), ...]。
+    """
+    if start_ms >= end_ms:
+        return []
+    if not resolutions:
+        return [("raw", start_ms, end_ms)]
+    name, width = resolutions[-1]
+    finer = resolutions[:-1]
+    usable_start = max(start_ms, (coverage or {}).get(name, start_ms))
+    first = -(-usable_start // width) * width
+    last = end_ms // width * width
+    if first >= last:
+        return plan_segments(start_ms, end_ms, finer, coverage)
+    return (plan_segments(start_ms, first, finer, coverage)
+            + [(name, first, last)]
+            + plan_segments(last, end_ms, finer, coverage))
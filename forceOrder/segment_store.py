@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 日志位置: (分段编号, 分段内字节偏移)
+Position = Tuple[int, int]
+
+class SegmentLog:
+    """追加写入的分段日志（每行一条JSON），支持分段滚动、批量fsync和崩溃恢复
+
+    累计 fsync_batch 条或距上次同步超过 fsync_interval 秒时fsync；写入停止后由后台线程
+    按 fsync_interval 补做同步，保证最后写入的数据最多在 fsync_interval 秒后落盘。
+    """
+
+    def __init__(self,
+                 directory: str,
+                 prefix: str = "segment",
+                 max_segment_bytes: int = 16 * 1024 * 1024,
+                 max_segments: int = 20,
+                 fsync_batch: int = 100,
+                 fsync_interval: float = 1.0,
+                 read_only: bool = False):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.read_only = read_only
+
+        self._file = None
+        self._segment_id = 0
+        self._segment_size = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        # 写入方与后台同步线程共用
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._sync_thread = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        if read_only:
+            # 只读模式用于查询工具，不修改正在被监控程序写入的文件
+            return
+        self._recover()
+        self._open_segment(self._segment_id or 1)
+        if fsync_interval > 0:
+            self._sync_thread = threading.Thread(target=self._sync_loop, name=f"{prefix}-sync", daemon=True)
+            self._sync_thread.start()
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"{self.prefix}-{segment_id:08d}.jsonl")
+
+    def list_segments(self) -> List[int]:
+        """按顺序列出现有分段编号"""
+        segment_ids = []
+        for name in os.listdir(self.directory):
+            if name.startswith(self.prefix + "-") and name.endswith(".jsonl"):
+                try:
+                    segment_ids.append(int(name[len(self.prefix) + 1:-len(".jsonl")]))
+                except ValueError:
+                    continue
+        return sorted(segment_ids)
+
+    def _recover(self):
+        """检查最后一个分段，截断崩溃时写了一半的记录"""
+        segment_ids = self.list_segments()
+        if not segment_ids:
+            return
+        self._segment_id = segment_ids[-1]
+        path = self._segment_path(self._segment_id)
+        good_offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+                good_offset += len(line)
+        size = os.path.getsize(path)
+        if good_offset < size:
+            logger.warning(f"⚠️ 分段 {path} 尾部有 {size - good_offset} 字节不完整数据，已截断")
+            with open(path, "r+b") as f:
+                f.truncate(good_offset)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _open_segment(self, segment_id: int):
+        """打开（或创建）指定分段用于追加"""
+        self._segment_id = segment_id
+        self._file = open(self._segment_path(segment_id), "ab")
+        self._segment_size = self._file.tell()
+
+    def _rotate(self):
+        """当前分段写满后切换到新分段，并清理超出保留数量的旧分段"""
+        self.sync()
+        self._file.close()
+        self._open_segment(self._segment_id + 1)
+        if self.max_segments:
+            segment_ids = self.list_segments()
+            for segment_id in segment_ids[:-self.max_segments]:
+                self.delete_segment(segment_id)
+
+    def append(self, record: Dict[str, Any]) -> Position:
+        """追加一条记录，返回其写入位置"""
+        if self.read_only:
+            raise RuntimeError("分段日志以只读模式打开，不能写入")
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            if self._segment_size >= self.max_segment_bytes:
+                self._rotate()
+            position = (self._segment_id, self._segment_size)
+            self._file.write(line)
+            self._segment_size += len(line)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self.sync()
+        return position
+
+    def append_many(self, records: List[Dict[str, Any]]) -> Optional[Position]:
+        """批量追加记录，返回最后一条的写入位置"""
+        position = None
+        with self._lock:
+            for record in records:
+                position = self.append(record)
+        return position
+
+    def flush(self):
+        """把缓冲数据写入文件（不fsync），使其他读取者可以看到"""
+        with self._lock:
+            if self._file and not self._file.closed:
+                self._file.flush()
+
+    def sync(self):
+        """把缓冲数据写入磁盘并fsync（fsync在锁外进行，不阻塞同时进行的写入）"""
+        with self._lock:
+            unsynced, self._unsynced = self._unsynced, 0
+            self._last_sync = time.monotonic()
+            if not self._file or self._file.closed:
+                return
+            self._file.flush()
+            if not unsynced:
+                return
+            # 复制文件描述符：fsync期间分段滚动关闭原文件也不影响
+            fd = os.dup(self._file.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _sync_loop(self):
+        """后台定时同步：写入停止后尾部数据不会一直停留在缓冲区中"""
+        while not self._stop_event.wait(self.fsync_interval):
+            if self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval:
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.error(f"❌ 分段日志同步失败: {e}")
+
+    def replay(self, start: Optional[Position] = None) -> Iterator[Tuple[Dict[str, Any], Position]]:
+        """从指定位置开始流式读取所有记录，返回 (记录, 下一条记录的位置)
+
+        只读取已写入文件的数据；与写入方不在同一线程时，由调用方在写入锁内先调用 flush()。
+        """
+        start_segment, start_offset = start or (0, 0)
+        for segment_id in self.list_segments():
+            if segment_id < start_segment:
+                continue
+            offset = start_offset if segment_id == start_segment else 0
+            with open(self._segment_path(segment_id), "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        logger.warning(f"跳过损坏的记录 (分段 {segment_id}, 偏移 {offset}): {e}")
+                        continue
+                    yield record, (segment_id, offset)
+
+    def delete_segment(self, segment_id: int):
+        """删除指定分段（不能删除正在写入的分段）"""
+        if segment_id == self._segment_id:
+            return
+        try:
+            os.remove(self._segment_path(segment_id))
+            logger.info(f"已删除分段 {segment_id}")
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """停止后台同步，同步并关闭当前分段"""
+        self._stop_event.set()
+        if self._sync_thread:
+            self._sync_thread.join()
+            self._sync_thread = None
+        with self._lock:
+            if self._file and not self._file.closed:
+                self.sync()
+                self._file.close()
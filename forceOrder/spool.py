@@ -0,0 +1,237 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List
+from segment_store import SegmentLog, Position
+from force_order import ForceOrder
+
+logger = logging.getLogger(__name__)
+
+class WriteAheadSpool:
+    """本地预写日志：强平订单先追加到分段日志，再由后台回放线程批量写入存储
+
+    回放进度（已提交位置）保存在单独的文件中，每批写入成功后原子替换，
+    重启后从已提交位置继续，最多重复写入一批（InfluxDB按时间和标签覆盖相同的数据点）。
+    存储不可用时按指数退避重新连接，恢复后按大批次补写积压的数据。
+    """
+
+    def __init__(self,
+                 directory: str,
+                 connect: Callable[[], Any],
+                 batch_size: int = 5000,
+                 replay_interval: float = 1.0,
+                 retry_delay: float = 1.0,
+                 max_retry_delay: float = 60.0,
+                 max_segment_bytes: int = 16 * 1024 * 1024,
+                 fsync_batch: int = 100,
+                 fsync_interval: float = 1.0,
+                 breaker=None):
+        # connect() 返回带有 write_batch(orders) 方法的存储处理器，连接失败时抛出异常
+        self.connect = connect
+        self.batch_size = max(1, batch_size)
+        self.replay_interval = replay_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.sink = None
+        # 熔断打开期间暂停回放，到期后由熔断器放行试探写入
+        self.breaker = breaker
+        # 已消费的分段由回放线程删除，不按数量滚动清理
+        self.log = SegmentLog(
+            directory,
+            prefix="spool",
+            max_segment_bytes=max_segment_bytes,
+            max_segments=0,
+            fsync_batch=fsync_batch,
+            fsync_interval=fsync_interval
+        )
+        self.offset_file = os.path.join(directory, "committed.json")
+        self.committed: Position = self._load_committed()
+        # 尚未回放的条数（含上次运行遗留的数据）
+        self.pending = sum(1 for _ in self.log.replay(self.committed))
+        if self.pending:
+            logger.info(f"发现 {self.pending} 条未回放的预写日志数据，将在存储可用后写入")
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._attempt = 0
+        self.stats = {
+            "appended": 0,
+            "replayed": 0,
+            "batches": 0,
+            "failures": 0,
+            "connects": 0,
+            "skipped": 0,
+        }
+        self._thread = threading.Thread(target=self._replay_loop, name="spool-replayer", daemon=True)
+        self._thread.start()
+
+    def _load_committed(self) -> Position:
+        """读取已提交位置，文件不存在时从最早的分段开始"""
+        try:
+            with open(self.offset_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except FileNotFoundError:
+            return 0, 0
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ 回放进度文件损坏，从最早的分段重新回放: {e}")
+            return 0, 0
+
+    def _save_committed(self, position: Position):
+        """写入临时文件并fsync后原子替换，崩溃时不会留下半个进度文件"""
+        temp = self.offset_file + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({"segment": position[0], "offset": position[1], "updated_at": time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.offset_file)
+        self.committed = position
+
+    @staticmethod
+    def _encode(order: ForceOrder) -> Dict[str, Any]:
+        record = {"received_at": order.received_at, "data": order.to_event()}
+        if order.trace is not None:
+            # 保留接收端时间戳，回放写入后仍能统计端到端延迟
+            record["trace"] = order.trace[:3]
+        return record
+
+    @staticmethod
+    def _decode(record: Dict[str, Any]) -> ForceOrder:
+        order = ForceOrder.from_event(record["data"], received_at=record.get("received_at"))
+        trace = record.get("trace")
+        if trace:
+            order.trace = list(trace) + [0.0, 0.0]
+        return order
+
+    def append(self, orders: List[ForceOrder]):
+        """追加一批订单并唤醒回放线程"""
+        records = [self._encode(order) for order in orders]
+        with self._lock:
+            self.log.append_many(records)
+            self.log.flush()
+            self.pending += len(orders)
+        self.stats["appended"] += len(orders)
+        self._wakeup.set()
+
+    def _read_batch(self):
+        """从已提交位置读取一批订单，返回 (订单列表, 无法解析的条数, 批次结束位置)"""
+        orders = []
+        skipped = 0
+        end = self.committed
+        with self._lock:
+            self.log.flush()
+        for record, position in self.log.replay(self.committed):
+            try:
+                orders.append(self._decode(record))
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+            end = position
+            if len(orders) >= self.batch_size:
+                break
+        return orders, skipped, end
+
+    def _backoff(self) -> float:
+        """全抖动指数退避"""
+        self._attempt += 1
+        return random.uniform(0, min(self.max_retry_delay, self.retry_delay * 2 ** self._attempt))
+
+    def _replay_loop(self):
+        while not self._stop_event.is_set():
+            if self.sink is None:
+                try:
+                    self.sink = self.connect()
+                    self.stats["connects"] += 1
+                    self._attempt = 0
+                    logger.info("✅ 预写日志回放已连接到存储")
+                except Exception as e:
+                    delay = self._backoff()
+                    logger.warning(f"⚠️ 存储不可用，{delay:.1f} 秒后重新连接: {e}")
+                    self._stop_event.wait(delay)
+                    continue
+
+            try:
+                written = self.replay_once()
+            except Exception as e:
+                # 写入以外的错误（如保存回放进度失败）不能让回放线程退出，退避后重试
+                self.stats["failures"] += 1
+                delay = self._backoff()
+                logger.error(f"❌ 预写日志回放出错，{delay:.1f} 秒后重试: {e}", exc_info=True)
+                self._stop_event.wait(delay)
+                continue
+            if written == 0:
+                self._wakeup.wait(self.replay_interval)
+                self._wakeup.clear()
+
+    def replay_once(self) -> int:
+        """回放一批数据并提交进度，返回写入的条数（写入失败时返回-1）"""
+        orders, skipped, end = self._read_batch()
+        if end == self.committed:
+            return 0
+        if orders and self.breaker and not self.breaker.allow_request():
+            self._stop_event.wait(self.replay_interval)
+            return -1
+        self.stats["skipped"] += skipped
+        try:
+            if orders:
+                self.sink.write_batch(orders)
+        except Exception as e:
+            self.stats["failures"] += 1
+            delay = self._backoff()
+            logger.warning(f"⚠️ 回放写入失败（积压 {self.pending} 条），{delay:.1f} 秒后重试: {e}")
+            self._stop_event.wait(delay)
+            return -1
+        self._attempt = 0
+        self._save_committed(end)
+        with self._lock:
+            self.pending -= len(orders) + skipped
+        self.stats["replayed"] += len(orders)
+        self.stats["batches"] += 1
+        self._delete_consumed()
+        return len(orders)
+
+    def _delete_consumed(self):
+        """删除已全部提交的分段"""
+        for segment_id in self.log.list_segments():
+            if segment_id >= self.committed[0]:
+                break
+            self.log.delete_segment(segment_id)
+
+    @property
+    def replaying(self) -> bool:
+        """存储已连接、最近一次回放没有失败且熔断未打开"""
+        return self.sink is not None and self._attempt == 0 and not (self.breaker and self.breaker.is_open)
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """等待积压数据全部回放（用于关闭前），回放失败或熔断打开时立即返回"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.pending:
+                return True
+            if not self.replaying:
+                return False
+            self._wakeup.set()
+            time.sleep(0.1)
+        return False
+
+    def close(self, timeout: float = 30.0):
+        """尽量回放剩余数据后停止回放线程，未回放的数据保留在磁盘上，下次启动时继续
+
+        存储不可用（回放失败或熔断打开）时不等待，直接停止。
+        """
+        if self.pending and not self.drain(timeout):
+            logger.warning("⚠️ 预写日志仍有未回放的数据，将在下次启动时继续写入")
+        self._stop_event.set()
+        self._wakeup.set()
+        self._thread.join(timeout=timeout)
+        with self._lock:
+            self.log.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["pending"] = self.pending
+        stats["committed"] = list(self.committed)
+        stats["connected"] = self.sink is not None
+        return stats
@@ -0,0 +1,244 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config import SQLITE_CONFIG
+from batch_writer import BatchWriter
+from force_order import ForceOrder
+from rollup import RollupBucket
+from metrics import EVENTS_PERSISTED, WRITE_FAILURES, WRITE_SECONDS, WRITE_BATCH_SIZE
+from latency import tracker as latency_tracker
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("event_time", "trade_time", "symbol", "side", "order_type", "time_in_force", "status",
+           "quantity", "price", "avg_price", "last_qty", "cum_qty", "notional", "received_at")
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS force_orders (
+    event_time INTEGER NOT NULL,
+    trade_time INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    order_type TEXT,
+    time_in_force TEXT,
+    status TEXT,
+    quantity REAL,
+    price REAL,
+    avg_price REAL,
+    last_qty REAL,
+    cum_qty REAL,
+    notional REAL,
+    received_at REAL
+);
+-- 覆盖索引：按币对的时间范围查询和汇总只读索引，不回表
+CREATE INDEX IF NOT EXISTS idx_force_orders_symbol_time
+    ON force_orders (symbol, event_time, side, quantity, notional, price);
+-- 全市场时间范围查询
+CREATE INDEX IF NOT EXISTS idx_force_orders_time ON force_orders (event_time);
+'''
+
+# 语句文本固定，sqlite3按连接缓存编译后的语句，重复执行不再解析
+INSERT_SQL = f"INSERT INTO force_orders ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})"
+
+SUMMARY_SQL = '''
+SELECT symbol, side, COUNT(*), SUM(quantity), SUM(notional), MAX(notional), SUM(price * quantity)
+FROM force_orders
+WHERE event_time >= ? AND event_time < ?
+GROUP BY symbol, side
+'''
+
+SYMBOL_SUMMARY_SQL = '''
+SELECT symbol, side, COUNT(*), SUM(quantity), SUM(notional), MAX(notional), SUM(price * quantity)
+FROM force_orders
+WHERE symbol = ? AND event_time >= ? AND event_time < ?
+GROUP BY symbol, side
+'''
+
+LATEST_BY_SYMBOL_SQL = f'''
+SELECT {', '.join(COLUMNS)} FROM force_orders
+WHERE symbol = ? AND event_time >= ?
+ORDER BY event_time DESC
+LIMIT ?
+'''
+
+# 每个币对最近的N条（窗口函数，需要SQLite 3.25+）
+LATEST_ALL_SQL = f'''
+SELECT {', '.join(COLUMNS)} FROM (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY event_time DESC) AS rank
+    FROM force_orders
+    WHERE event_time >= ?
+)
+WHERE rank <= ?
+ORDER BY symbol, event_time DESC
+'''
+
+RANGE_SQL = f'''
+SELECT {', '.join(COLUMNS)} FROM force_orders
+WHERE event_time >= ? AND event_time < ?
+ORDER BY event_time
+'''
+
+SYMBOLS_SQL = "SELECT DISTINCT symbol FROM force_orders WHERE event_time >= ? ORDER BY symbol"
+
+def _order_from_row(row) -> ForceOrder:
+    """数据库行还原为ForceOrder"""
+    (event_time, trade_time, symbol, side, order_type, time_in_force, status,
+     quantity, price, avg_price, last_qty, cum_qty, _, received_at) = row
+    return ForceOrder(event_time, trade_time, symbol, side, order_type, time_in_force, status,
+                      quantity, price, avg_price, last_qty, cum_qty, received_at=received_at)
+
+class SQLiteHandler:
+    """SQLite数据处理器：单文件、无额外依赖的持久化存储，支持按币对和时间的索引查询"""
+
+    def __init__(self, read_only: bool = False):
+        self.path = SQLITE_CONFIG.get("path", "force_orders.db")
+        self.read_only = read_only
+        self.batch_writer = None
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._writer = None
+        self._reader = None
+        self._connect()
+
+    def _connect(self):
+        """打开数据库：写连接开启WAL，查询使用单独的只读连接，不阻塞写入"""
+        logger.info(f"正在打开SQLite数据库: {self.path}")
+        if not self.read_only:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._writer = sqlite3.connect(self.path, check_same_thread=False,
+                                           cached_statements=SQLITE_CONFIG.get("cached_statements", 128))
+            self._writer.execute("PRAGMA journal_mode=WAL")
+            self._writer.execute(f"PRAGMA synchronous={SQLITE_CONFIG.get('synchronous', 'NORMAL')}")
+            self._writer.execute(f"PRAGMA busy_timeout={int(SQLITE_CONFIG.get('busy_timeout', 5.0) * 1000)}")
+            self._writer.executescript(SCHEMA)
+        elif not os.path.exists(self.path):
+            raise FileNotFoundError(f"SQLite数据库不存在: {self.path}")
+
+        self._reader = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False,
+                                       cached_statements=SQLITE_CONFIG.get("cached_statements", 128))
+        self._reader.execute(f"PRAGMA busy_timeout={int(SQLITE_CONFIG.get('busy_timeout', 5.0) * 1000)}")
+
+        if not self.read_only:
+            # 批量写入：后台线程聚合后在一个事务中插入，单线程写入避免锁竞争
+            self.batch_writer = BatchWriter(
+                self._write_orders,
+                batch_size=SQLITE_CONFIG.get("batch_size", 1000),
+                flush_interval=SQLITE_CONFIG.get("flush_interval", 1.0),
+                max_in_flight=1,
+                buffer_size=SQLITE_CONFIG.get("buffer_size", 50000),
+                max_retries=SQLITE_CONFIG.get("max_retries", 3),
+                name="sqlite-writer"
+            )
+        logger.info("✅ SQLite数据库已打开")
+
+    def save_force_order(self, order: ForceOrder):
+        """保存单条强平订单数据"""
+        self.save_force_orders([order])
+
+    def save_force_orders(self, orders: List[ForceOrder]):
+        """批量保存强平订单数据：放入写入缓冲区后立即返回"""
+        if self.batch_writer is None:
+            raise RuntimeError("SQLite数据库以只读模式打开，不能写入")
+        accepted = self.batch_writer.enqueue_many(orders)
+        logger.debug("已加入SQLite写入缓冲区: %d/%d 条", accepted, len(orders))
+
+    def _write_orders(self, orders: List[ForceOrder]):
+        """在一个事务中批量插入"""
+        rows = [tuple(getattr(order, column) for column in COLUMNS) for order in orders]
+        started = time.monotonic()
+        persist_start = time.time()
+        try:
+            with self._write_lock:
+                with self._writer:
+                    self._writer.executemany(INSERT_SQL, rows)
+        except Exception:
+            WRITE_FAILURES.labels("sqlite").inc()
+            raise
+        WRITE_SECONDS.labels("sqlite").observe(time.monotonic() - started)
+        WRITE_BATCH_SIZE.labels("sqlite").observe(len(orders))
+        EVENTS_PERSISTED.labels("sqlite").inc(len(orders))
+        latency_tracker.record_persisted(orders, persist_start, time.time())
+
+    def _query(self, sql: str, params: Tuple[Any, ...]) -> List[Tuple]:
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def query_summary(self, start_ms: int, end_ms: Optional[int] = None,
+                      symbol: Optional[str] = None) -> Dict[Tuple[str, str], RollupBucket]:
+        """按币对/方向汇总 [start_ms, end_ms) 内的强平订单（聚合在索引上完成）"""
+        end_ms = end_ms or int(time.time() * 1000)
+        if symbol:
+            rows = self._query(SYMBOL_SUMMARY_SQL, (symbol, start_ms, end_ms))
+        else:
+            rows = self._query(SUMMARY_SQL, (start_ms, end_ms))
+        return {(row[0], row[1]): RollupBucket(*row[2:]) for row in rows}
+
+    def query_latest_orders(self, hours: int = 24, limit: int = 10, symbol: Optional[str] = None) -> List[ForceOrder]:
+        """每个币对最近的limit条强平订单（按币对分组，组内按时间倒序）"""
+        since = int(time.time() * 1000) - hours * 3600 * 1000
+        if symbol:
+            rows = self._query(LATEST_BY_SYMBOL_SQL, (symbol, since, limit))
+        else:
+            rows = self._query(LATEST_ALL_SQL, (since, limit))
+        return [_order_from_row(row) for row in rows]
+
+    def stream_force_orders(self, start_ms: int, end_ms: int, fetch_size: int = 10000) -> Iterator[ForceOrder]:
+        """按时间顺序流式读取 [start_ms, end_ms) 内的强平订单"""
+        cursor = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True).execute(RANGE_SQL, (start_ms, end_ms))
+        try:
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _order_from_row(row)
+        finally:
+            cursor.connection.close()
+
+    def list_symbols(self, hours: int = 24) -> List[str]:
+        """最近N小时内有数据的全部币对"""
+        since = int(time.time() * 1000) - hours * 3600 * 1000
+        return [row[0] for row in self._query(SYMBOLS_SQL, (since,))]
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """将写入缓冲区中的数据全部提交"""
+        if self.batch_writer:
+            return self.batch_writer.flush(timeout)
+        return True
+
+    def get_write_stats(self) -> Dict[str, Any]:
+        """获取写入统计"""
+        return self.batch_writer.get_stats() if self.batch_writer else {"mode": "read_only"}
+
+    def get_data_summary(self) -> Dict[str, Any]:
+        """获取数据摘要"""
+        count, oldest, newest = self._query("SELECT COUNT(*), MIN(event_time), MAX(event_time) FROM force_orders", ())[0]
+        return {
+            "mode": "SQLite",
+            "path": self.path,
+            "total_orders": count,
+            "oldest_event_time": oldest,
+            "newest_event_time": newest,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+    def close(self):
+        """刷新写入缓冲区并关闭连接"""
+        if self.batch_writer:
+            logger.info("正在刷新SQLite写入缓冲区...")
+            self.batch_writer.close()
+            self.batch_writer = None
+        if self._writer:
+            with self._write_lock:
+                # 关闭前把WAL合并回主文件
+                self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._writer.close()
+            self._writer = None
+        if self._reader:
+            self._reader.close()
+            self._reader = None
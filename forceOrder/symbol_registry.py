@@ -0,0 +1,112 @@
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SymbolRegistry:
+    """动态币对注册表：新币对出现时自动登记，超出容量或长期空闲的币对按LRU淘汰"""
+
+    def __init__(self,
+                 factory: Optional[Callable[[], Any]] = None,
+                 pinned: Iterable[str] = (),
+                 max_symbols: int = 500,
+                 idle_ttl: float = 86400):
+        self.factory = factory or (lambda: None)
+        self.max_symbols = max_symbols
+        self.idle_ttl = idle_ttl
+        # 配置中的币对常驻，不参与淘汰
+        self._pinned: Dict[str, Any] = {sys.intern(symbol): self.factory() for symbol in pinned}
+        # 动态登记的币对，按最近活跃顺序排列（最久未活跃的在最前）
+        self._dynamic: "OrderedDict[str, Any]" = OrderedDict()
+        self._last_seen: Dict[str, float] = {}
+        self.evicted = 0
+
+    def get_or_create(self, symbol: str, seen_at: Optional[float] = None) -> Any:
+        """获取币对对应的数据，不存在时自动登记；seen_at为活跃时间(秒)"""
+        if symbol in self._pinned:
+            return self._pinned[symbol]
+
+        seen_at = time.time() if seen_at is None else seen_at
+        if symbol in self._dynamic:
+            self._dynamic.move_to_end(symbol)
+            if seen_at > self._last_seen[symbol]:
+                self._last_seen[symbol] = seen_at
+            self._evict(seen_at)
+            return self._dynamic[symbol]
+
+        symbol = sys.intern(symbol)
+        value = self.factory()
+        self._dynamic[symbol] = value
+        self._last_seen[symbol] = seen_at
+        logger.debug(f"登记新币对: {symbol}")
+        self._evict(seen_at)
+        return value
+
+    def register(self, symbols: Iterable[str]):
+        """批量登记币对（如从InfluxDB查询到的币对列表）"""
+        for symbol in symbols:
+            self.get_or_create(symbol)
+
+    def intern(self, symbol: str) -> str:
+        """返回注册表中共享的币对字符串"""
+        return sys.intern(symbol)
+
+    def evict_idle(self, now: Optional[float] = None):
+        """主动淘汰空闲过久的币对"""
+        self._evict(time.time() if now is None else now)
+
+    def _evict(self, now: float):
+        """淘汰超出容量和空闲过久的币对（只检查最久未活跃的一端）"""
+        while self._dynamic:
+            symbol = next(iter(self._dynamic))
+            over_capacity = len(self._pinned) + len(self._dynamic) > self.max_symbols
+            idle = self.idle_ttl and now - self._last_seen[symbol] > self.idle_ttl
+            if not (over_capacity or idle):
+                break
+            del self._dynamic[symbol]
+            del self._last_seen[symbol]
+            self.evicted += 1
+            logger.debug(f"淘汰{'空闲' if idle else '最久未活跃的'}币对: {symbol}")
+
+    def get(self, symbol: str) -> Any:
+        """获取币对对应的数据，不改变活跃顺序"""
+        if symbol in self._pinned:
+            return self._pinned[symbol]
+        return self._dynamic.get(symbol)
+
+    def __getitem__(self, symbol: str) -> Any:
+        if symbol in self._pinned:
+            return self._pinned[symbol]
+        return self._dynamic[symbol]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._pinned or symbol in self._dynamic
+
+    def __len__(self) -> int:
+        return len(self._pinned) + len(self._dynamic)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._pinned
+        yield from self._dynamic
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        yield from self._pinned.items()
+        yield from self._dynamic.items()
+
+    def symbols(self) -> List[str]:
+        """全部已登记的币对：配置中的币对在前，其余按字母排序"""
+        return list(self._pinned) + sorted(self._dynamic)
+
+    def is_pinned(self, symbol: str) -> bool:
+        return symbol in self._pinned
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取注册表统计"""
+        return {
+            "pinned": len(self._pinned),
+            "dynamic": len(self._dynamic),
+            "evicted": self.evicted,
+        }
@@ -1,148 +1,179 @@
-import json
 import logging
 import asyncio
-import websockets
-from typing import Dict, Any, Callable
-from config import BINANCE_WS_BASE_URL, SYMBOLS, MONITOR_MODE, ALL_MARKET_STREAM
+import time
+from typing import Dict, Any, Callable, List
+from config import SYMBOLS, MONITOR_MODE, ALL_MARKET_STREAM, INGEST_CONFIG, JSON_DECODER, CONNECTION_CONFIG
+from connection_manager import ShardedConnectionManager
+from dedup import DedupIndex
+from ingest_pipeline import IngestPipeline
+from force_order import ForceOrder
+from decoder import FrameDecodeError, get_decoder
+from logging_setup import is_verbose, log_order
+from metrics import MESSAGES_RECEIVED, EVENTS_DECODED, SYMBOL_EVENTS, DECODE_ERRORS, DECODE_SECONDS
+from latency import tracker as latency_tracker
 
 logger = logging.getLogger(__name__)
 
 class BinanceWebSocketClient:
     """币安WebSocket客户端"""
     
-    def __init__(self, message_handler: Callable[[Dict[str, Any]], None]):
+    def __init__(self, message_handler: Callable[[List[ForceOrder]], None]):
         self.message_handler = message_handler
-        self.websocket = None
-        self.is_connected = False
-        self.reconnect_delay = 5
-        self.max_reconnect_delay = 300
+        self.manager = None
+        # 冗余连接和轮换重叠期间的重复事件在这里去重
+        self.dedup = DedupIndex(
+            window=CONNECTION_CONFIG.get("dedup_window", 10),
+            max_entries=CONNECTION_CONFIG.get("dedup_max_entries", 100000)
+        )
+        self.decoder = get_decoder(JSON_DECODER, combined=True)
+        logger.info(f"JSON解析后端: {self.decoder.name}")
+        self.pipeline = IngestPipeline(
+            self._handle_message_async,
+            max_size=INGEST_CONFIG.get("queue_size", 10000),
+            workers=INGEST_CONFIG.get("workers", 2),
+            overflow_policy=INGEST_CONFIG.get("overflow_policy", "block"),
+            spill_file=INGEST_CONFIG.get("spill_file", "ingest_spill.jsonl"),
+            metrics_interval=INGEST_CONFIG.get("metrics_interval", 60),
+            encode=lambda orders: [order.to_event() for order in orders],
+            decode=lambda events: [ForceOrder.from_event(event) for event in events]
+        )
         
+    def _build_streams(self) -> List[str]:
+        """按监控模式生成要订阅的数据流"""
+        if MONITOR_MODE == "all_market":
+            return [ALL_MARKET_STREAM]
+        return [f"{symbol.lower()}@forceOrder" for symbol in SYMBOLS]
+
     async def connect(self):
-        """连接到币安WebSocket"""
-        try:
-            # 根据监控模式选择连接方式
-            if MONITOR_MODE == "all_market":
-                # 全市场强平订单流
-                ws_url = f"{BINANCE_WS_BASE_URL}/{ALL_MARKET_STREAM}"
-                logger.info(f"全市场模式: 正在连接到全市场强平订单流")
-            else:
-                # 特定币对强平订单流
-                streams = [f"{symbol.lower()}@forceorder" for symbol in SYMBOLS]
-                ws_url = f"{BINANCE_WS_BASE_URL}/{'/'.join(streams)}"
-                logger.info(f"特定币对模式: 监控 {len(SYMBOLS)} 个币对")
-            
-            logger.info(f"正在连接到: {ws_url}")
-            
-            self.websocket = await websockets.connect(ws_url)
-            self.is_connected = True
-            logger.info("✅ 成功连接到币安WebSocket")
-            
-            if MONITOR_MODE == "all_market":
-                logger.info("🌍 开始监控全市场强平订单...")
-                logger.info("💡 将接收所有币对的强平订单数据")
-            else:
-                logger.info(f"🎯 开始监控指定币对: {', '.join(SYMBOLS)}")
-            
-            # 开始接收消息
-            await self._receive_messages()
-            
-        except Exception as e:
-            logger.error(f"❌ 连接失败: {e}")
-            self.is_connected = False
-            await self._handle_reconnect()
-    
-    async def _receive_messages(self):
-        """接收WebSocket消息"""
+        """连接到币安WebSocket（组合流地址，按分片建立多个连接），直到断开"""
+        # 启动接入队列消费者
+        await self.pipeline.start()
+
+        streams = self._build_streams()
+        if MONITOR_MODE == "all_market":
+            logger.info("🌍 全市场模式: 开始监控全市场强平订单...")
+            logger.info("💡 将接收所有币对的强平订单数据")
+        else:
+            logger.info(f"🎯 特定币对模式: 监控 {len(SYMBOLS)} 个币对: {', '.join(SYMBOLS)}")
+
+        self.manager = ShardedConnectionManager(
+            streams,
+            self._on_frame,
+            streams_per_connection=CONNECTION_CONFIG.get("streams_per_connection", 50),
+            reconnect_delay=CONNECTION_CONFIG.get("reconnect_delay", 1),
+            max_reconnect_delay=CONNECTION_CONFIG.get("max_reconnect_delay", 60),
+            rotate_interval=CONNECTION_CONFIG.get("rotate_interval", 0),
+            max_gap_history=CONNECTION_CONFIG.get("max_gap_history", 100),
+            redundancy=CONNECTION_CONFIG.get("redundancy", 1),
+            ping_interval=CONNECTION_CONFIG.get("ping_interval", 20),
+            ping_timeout=CONNECTION_CONFIG.get("ping_timeout", 10),
+            stale_timeout=CONNECTION_CONFIG.get("stale_timeout", 900),
+            max_feed_lag=CONNECTION_CONFIG.get("max_feed_lag", 5000)
+        )
+        await self.manager.run()
+
+    async def _on_frame(self, message, source: str = "0", received_at: float = None):
+        """分片连接收到的原始消息"""
+        if not message:
+            return
         try:
-            async for message in self.websocket:
-                if message:
-                    try:
-                        data = json.loads(message)
-                        await self._process_message(data)
-                    except json.JSONDecodeError as e:
-                        logger.error(f"❌ JSON解析失败: {e}")
-                    except Exception as e:
-                        logger.error(f"❌ 处理消息失败: {e}")
-                        
-        except websockets.exceptions.ConnectionClosed:
-            logger.warning("⚠️ WebSocket连接已关闭")
-            self.is_connected = False
-            await self._handle_reconnect()
-        except Exception as e:
-            logger.error(f"❌ 接收消息时发生错误: {e}")
-            self.is_connected = False
-            await self._handle_reconnect()
+            await self._process_message(message, source, received_at)
+        except FrameDecodeError as e:
+            DECODE_ERRORS.inc()
+            logger.error(f"❌ JSON解析失败: {e}")
+
+    async def _process_message(self, message, source: str = "0", received_at: float = None):
+        """处理接收到的消息：解析为ForceOrder批次，去掉其他连接已转发过的订单后放入接入队列（数组消息整体作为一个批次）"""
+        MESSAGES_RECEIVED.inc()
+        received = time.time()
+        started = time.perf_counter()
+        orders = self.decoder.decode_force_orders(message)
+        DECODE_SECONDS.observe(time.perf_counter() - started)
+        decoded = time.time()
+        if not orders:
+            logger.debug("收到其他类型消息: %.200s", message)
+            return
+        EVENTS_DECODED.inc(len(orders))
+        if self.manager:
+            self.manager.record_feed_lag(source, time.time() * 1000 - max(order.event_time for order in orders))
+        check = self.dedup.check
+        orders = [
+            order for order in orders
+            if check((order.symbol, order.trade_time, order.side, order.price, order.quantity), source, received_at)
+        ]
+        if orders:
+            for order in orders:
+                SYMBOL_EVENTS.labels(order.symbol).inc()
+            latency_tracker.stamp_received(orders, received, decoded, time.time())
+            await self.pipeline.put(orders)
     
-    async def _process_message(self, data: Dict[str, Any]):
-        """处理接收到的消息"""
+    async def _handle_message_async(self, orders: List[ForceOrder]):
+        """接入队列消费者：输出订单信息并把整批订单交给消息处理器"""
         try:
-            # 检查是否为强平订单消息
-            if data.get("e") == "forceOrder":
-                # 获取订单详情
-                order = data.get("o", {})
-                symbol = order.get("s", "UNKNOWN")
-                side = order.get("S", "UNKNOWN")
-                quantity = order.get("q", "0")
-                price = order.get("p", "0")
-                
-                # 在控制台打印强平订单信息
-                print("\n" + "="*60)
-                print("🚨 收到强平订单!")
-                print("="*60)
-                print(f"🏷️  交易对: {symbol}")
-                print(f"📈 方向: {side}")
-                print(f"📊 数量: {quantity}")
-                print(f"💰 价格: {price}")
-                print(f"📝 订单类型: {order.get('o', 'N/A')}")
-                print(f"⏰ 时间: {data.get('E', 'N/A')}")
-                print(f"📊 平均价格: {order.get('ap', 'N/A')}")
-                print(f"✅ 状态: {order.get('X', 'N/A')}")
-                print("="*60)
-                
-                logger.info(f"🎯 收到强平订单: {symbol} - {side} - {quantity} @ {price}")
-                
-                # 调用消息处理器
-                if self.message_handler:
-                    await asyncio.create_task(self._handle_message_async(data))
-                else:
-                    self.message_handler(data)
+            if is_verbose():
+                for order in orders:
+                    # 在控制台打印强平订单信息
+                    print("\n" + "="*60)
+                    print("🚨 收到强平订单!")
+                    print("="*60)
+                    print(f"🏷️  交易对: {order.symbol}")
+                    print(f"📈 方向: {order.side}")
+                    print(f"📊 数量: {order.quantity}")
+                    print(f"💰 价格: {order.price}")
+                    print(f"📝 订单类型: {order.order_type}")
+                    print(f"⏰ 时间: {order.event_time}")
+                    print(f"📊 平均价格: {order.avg_price}")
+                    print(f"✅ 状态: {order.status}")
+                    print("="*60)
+                    
+                    logger.info(f"🎯 收到强平订单: {order.symbol} - {order.side} - {order.quantity} @ {order.price}")
             else:
-                logger.debug(f"收到其他类型消息: {data.get('e', 'unknown')}")
-                
-        except Exception as e:
-            logger.error(f"❌ 处理强平订单消息失败: {e}")
-    
-    async def _handle_message_async(self, data: Dict[str, Any]):
-        """异步处理消息"""
-        try:
+                # 每笔一行，格式化在日志线程中进行
+                for order in orders:
+                    log_order(order)
+            
+            # 调用消息处理器
             if asyncio.iscoroutinefunction(self.message_handler):
-                await self.message_handler(data)
+                await self.message_handler(orders)
             else:
-                self.message_handler(data)
+                self.message_handler(orders)
         except Exception as e:
             logger.error(f"❌ 异步处理消息失败: {e}")
     
-    async def _handle_reconnect(self):
-        """处理重连"""
-        if not self.is_connected:
-            logger.info(f"⏳ 等待 {self.reconnect_delay} 秒后重连...")
-            await asyncio.sleep(self.reconnect_delay)
-            
-            # 指数退避重连延迟
-            self.reconnect_delay = min(self.reconnect_delay * 2, self.max_reconnect_delay)
-            
-            await self.connect()
-    
     async def disconnect(self):
         """断开连接"""
-        if self.websocket:
-            await self.websocket.close()
-            self.is_connected = False
+        if self.manager:
+            await self.manager.stop()
             logger.info("🔌 WebSocket连接已断开")
+            gaps = self.manager.get_gaps()
+            if gaps:
+                total = sum(gap["duration"] for gap in gaps)
+                logger.info(f"本次运行数据中断 {len(gaps)} 次，共 {total:.1f} 秒")
+            if self.manager.redundancy > 1:
+                logger.info(f"冗余连接统计: {self.dedup.get_stats()}")
+        
+        # 处理完队列中剩余的数据
+        await self.pipeline.stop()
+    
+    def get_pipeline_metrics(self) -> Dict[str, Any]:
+        """获取接入队列指标"""
+        return self.pipeline.get_metrics()
     
     def get_connection_status(self) -> bool:
-        """获取连接状态"""
-        return self.is_connected
+        """获取连接状态（任一分片连接即为已连接）"""
+        return self.manager is not None and self.manager.is_connected()
+
+    def get_shard_status(self) -> List[Dict[str, Any]]:
+        """获取各分片连接状态"""
+        return self.manager.get_status() if self.manager else []
+
+    def get_dedup_stats(self) -> Dict[str, Any]:
+        """获取去重及各连接竞速统计"""
+        return self.dedup.get_stats()
+
+    def get_gaps(self) -> List[Dict[str, Any]]:
+        """获取数据中断记录"""
+        return self.manager.get_gaps() if self.manager else []
     
     def get_monitor_mode(self) -> str:
         """获取监控模式"""
@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Tuple
+from force_order import ForceOrder
+from common import to_rfc3339
+
+logger = logging.getLogger(__name__)
+
+class WriteVerifier:
+    """后台写入校验器：抽样回查单条数据，并按币对/分钟对账写入条数"""
+
+    def __init__(self,
+                 query_api,
+                 bucket: str,
+                 org: str,
+                 measurement: str,
+                 sample_rate: int = 100,
+                 verify_delay: float = 10.0,
+                 reconcile_interval: float = 60.0,
+                 max_pending_samples: int = 1000):
+        self.query_api = query_api
+        self.bucket = bucket
+        self.org = org
+        self.measurement = measurement
+        self.sample_rate = max(0, sample_rate)
+        self.verify_delay = verify_delay
+        self.reconcile_interval = reconcile_interval
+
+        self._lock = threading.Lock()
+        self._seen = 0
+        self._samples = deque(maxlen=max_pending_samples)
+        # (symbol, 分钟起始毫秒) -> 已确认写入的条数
+        self._minute_counts: Dict[Tuple[str, int], int] = {}
+        self._stop_event = threading.Event()
+
+        self.stats = {
+            "recorded": 0,
+            "sampled_checked": 0,
+            "sampled_missing": 0,
+            "reconciled_minutes": 0,
+            "mismatched_minutes": 0,
+            "missing_points": 0,
+            "query_errors": 0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name="write-verifier", daemon=True)
+        self._thread.start()
+
+    def record_written(self, orders: Iterable[ForceOrder]):
+        """记录已确认写入的订单（只做计数，不发起查询）"""
+        now = time.monotonic()
+        with self._lock:
+            for order in orders:
+                event_time = order.event_time
+                key = (order.symbol, event_time - event_time % 60000)
+                self._minute_counts[key] = self._minute_counts.get(key, 0) + 1
+                self._seen += 1
+                if self.sample_rate and self._seen % self.sample_rate == 0:
+                    self._samples.append((now, order.symbol, order.side, event_time, order.quantity))
+            self.stats["recorded"] = self._seen
+
+    def _run(self):
+        """后台线程主循环"""
+        next_reconcile = time.monotonic() + self.reconcile_interval
+        while not self._stop_event.wait(1.0):
+            try:
+                self._check_samples()
+                if self.reconcile_interval and time.monotonic() >= next_reconcile:
+                    self._reconcile()
+                    next_reconcile = time.monotonic() + self.reconcile_interval
+            except Exception as e:
+                self.stats["query_errors"] += 1
+                logger.warning(f"写入校验失败: {e}")
+
+    def _check_samples(self):
+        """回查到期的抽样数据"""
+        due = []
+        deadline = time.monotonic() - self.verify_delay
+        with self._lock:
+            while self._samples and self._samples[0][0] <= deadline:
+                due.append(self._samples.popleft())
+
+        for _, symbol, side, event_time, quantity in due:
+            start = to_rfc3339(event_time)
+            stop = to_rfc3339(event_time + 1)
+            query = f'''
+            from(bucket: "{self.bucket}")
+                |> range(start: {start}, stop: {stop})
+                |> filter(fn: (r) => r["_measurement"] == "{self.measurement}")
+                |> filter(fn: (r) => r["symbol"] == "{symbol}")
+                |> filter(fn: (r) => r["side"] == "{side}")
+                |> filter(fn: (r) => r["_field"] == "quantity")
+                |> filter(fn: (r) => r["_value"] == float(v: "{quantity}"))
+                |> limit(n: 1)
+            '''
+            found = any(True for _ in self.query_api.query_stream(query, org=self.org))
+            self.stats["sampled_checked"] += 1
+            if not found:
+                self.stats["sampled_missing"] += 1
+                logger.warning(f"⚠️ 抽样校验未找到写入记录: {symbol} - {side} - {quantity} @ {event_time}")
+
+    def _reconcile(self):
+        """对已结束的分钟按币对核对写入条数"""
+        cutoff = int(time.time() * 1000 - self.verify_delay * 1000)
+        with self._lock:
+            closed = {key: count for key, count in self._minute_counts.items() if key[1] + 60000 <= cutoff}
+            for key in closed:
+                del self._minute_counts[key]
+        if not closed:
+            return
+
+        start = min(minute for _, minute in closed)
+        stop = max(minute for _, minute in closed) + 60000
+        query = f'''
+        from(bucket: "{self.bucket}")
+            |> range(start: {to_rfc3339(start)}, stop: {to_rfc3339(stop)})
+            |> filter(fn: (r) => r["_measurement"] == "{self.measurement}")
+            |> filter(fn: (r) => r["_field"] == "quantity")
+            |> group(columns: ["symbol"])
+            |> aggregateWindow(every: 1m, fn: count, timeSrc: "_start", createEmpty: false)
+        '''
+        actual = {}
+        for record in self.query_api.query_stream(query, org=self.org):
+            minute = int(record.get_time().timestamp() * 1000)
+            actual[(record.values.get("symbol"), minute)] = record.get_value()
+
+        for key, expected in closed.items():
+            self.stats["reconciled_minutes"] += 1
+            found = actual.get(key, 0)
+            if found < expected:
+                self.stats["mismatched_minutes"] += 1
+                self.stats["missing_points"] += expected - found
+                logger.warning(f"⚠️ 对账不一致: {key[0]} {to_rfc3339(key[1])} 期望 {expected} 条，实际 {found} 条")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取校验统计"""
+        stats = dict(self.stats)
+        stats["pending_samples"] = len(self._samples)
+        stats["pending_minutes"] = len(self._minute_counts)
+        return stats
+
+    def close(self):
+        """停止后台校验线程"""
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+        logger.info(f"写入校验统计: {self.get_stats()}")
@@ -56,12 +56,12 @@ def test_websocket_url():
     try:
         print("\n测试WebSocket URL构建...")
         
-        from config import BINANCE_WS_BASE_URL, SYMBOLS
+        from config import SYMBOLS, CONNECTION_CONFIG
+        from connection_manager import split_streams, build_stream_url
         
-        streams = [f"{symbol.lower()}@forceorder" for symbol in SYMBOLS]
-        ws_url = f"{BINANCE_WS_BASE_URL}/{'/'.join(streams)}"
-        
-        print(f"WebSocket URL: {ws_url}")
+        streams = [f"{symbol.lower()}@forceOrder" for symbol in SYMBOLS]
+        for shard in split_streams(streams, CONNECTION_CONFIG["streams_per_connection"]):
+            print(f"WebSocket URL: {build_stream_url(shard)}")
         print("✅ WebSocket URL构建成功")
         return True
         
@@ -69,6 +69,589 @@ def test_websocket_url():
         print(f"❌ WebSocket URL构建失败: {e}")
         return False
 
+def _make_order(event_time, symbol="BTCUSDT", side="SELL", quantity=1.0, price=100.0):
+    """构造测试用的强平订单"""
+    from force_order import ForceOrder
+    return ForceOrder(event_time, event_time, symbol, side, "LIMIT", "IOC", "FILLED",
+                      quantity, price, price, quantity, quantity)
+
+def _wait_until(condition, timeout=5.0):
+    """轮询等待后台线程完成"""
+    import time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+def test_ingest_overflow():
+    """测试接入队列 drop_oldest / spill 溢出策略及溢出数据的恢复顺序"""
+    try:
+        print("\n测试接入队列溢出策略...")
+        import asyncio
+        import tempfile
+        from ingest_pipeline import IngestPipeline
+        
+        async def run(policy, spill_file):
+            processed = []
+            gate = asyncio.Event()
+            
+            async def handler(item):
+                # 第一条数据阻塞消费者，直到队列被填满
+                await gate.wait()
+                processed.append(item)
+            
+            pipeline = IngestPipeline(handler, max_size=2, workers=1, overflow_policy=policy,
+                                      spill_file=spill_file, metrics_interval=0)
+            await pipeline.start()
+            await pipeline.put(0)
+            await asyncio.sleep(0.01)
+            for item in range(1, 10):
+                await pipeline.put(item)
+            gate.set()
+            for _ in range(200):
+                if len(processed) + pipeline.metrics["dropped"] >= 10:
+                    break
+                await asyncio.sleep(0.01)
+            metrics = pipeline.get_metrics()
+            await pipeline.stop(drain_timeout=1)
+            return processed, metrics
+        
+        with tempfile.TemporaryDirectory() as directory:
+            spill_file = os.path.join(directory, "spill.jsonl")
+            processed, metrics = asyncio.run(run("drop_oldest", spill_file))
+            assert processed == [0, 8, 9], f"drop_oldest 应只保留最新数据，实际处理 {processed}"
+            assert metrics["dropped"] == 7
+            
+            processed, metrics = asyncio.run(run("spill", spill_file))
+            assert processed == list(range(10)), f"spill 应按顺序恢复全部数据，实际处理 {processed}"
+            assert metrics["spilled"] == 7 and metrics["restored"] == 7 and metrics["spill_pending"] == 0
+        
+        print("✅ 接入队列溢出策略测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 接入队列溢出策略测试失败: {e}")
+        return False
+
+def test_decoder_parity():
+    """测试各解析后端对同一消息的解析结果一致"""
+    try:
+        print("\n测试解析后端一致性...")
+        from decoder import DECODERS, available_decoders, FrameDecodeError
+        from bench_decoder import SAMPLE_FRAMES, wrap_combined
+        
+        fields = ("event_time", "trade_time", "symbol", "side", "order_type", "time_in_force",
+                  "status", "quantity", "price", "avg_price", "last_qty", "cum_qty", "notional")
+        frames = SAMPLE_FRAMES + ['{"e":"markPriceUpdate","E":1568014461400,"s":"BTCUSDT","p":"9911"}']
+        for combined in (False, True):
+            messages = [(wrap_combined(frame) if combined else frame).encode() for frame in frames]
+            results = {}
+            for name in available_decoders():
+                cls, _ = DECODERS[name]
+                decoder = cls(combined=combined)
+                results[name] = [[tuple(getattr(order, field) for field in fields)
+                                  for order in decoder.decode_force_orders(message)]
+                                 for message in messages]
+                try:
+                    decoder.decode_force_orders(b'{"e":"forceOrder",')
+                    assert False, f"{name} 没有拒绝不完整的消息"
+                except FrameDecodeError:
+                    pass
+            expected = results["json"]
+            assert [len(orders) for orders in expected] == [1, 1, 1, 2, 1, 0]
+            assert expected[3][1][2] == "XLMUSDT"
+            for name, result in results.items():
+                assert result == expected, f"{name} 解析结果与标准库json不一致 (combined={combined})"
+        
+        print(f"✅ 解析后端一致性测试通过: {', '.join(available_decoders())}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 解析后端一致性测试失败: {e}")
+        return False
+
+def test_segment_log():
+    """测试分段日志滚动、定期fsync，以及启动时截断崩溃写了一半的记录"""
+    try:
+        print("\n测试分段日志...")
+        import tempfile
+        from segment_store import SegmentLog
+        
+        with tempfile.TemporaryDirectory() as directory:
+            log = SegmentLog(directory, max_segment_bytes=40, max_segments=2, fsync_batch=100, fsync_interval=0.05)
+            for i in range(3):
+                log.append({"i": i})
+            assert log._unsynced == 3
+            assert _wait_until(lambda: log._unsynced == 0, timeout=1), "写入停止后没有定期fsync"
+            log.close()
+            path = log._segment_path(log.list_segments()[-1])
+            good_size = os.path.getsize(path)
+            with open(path, "ab") as f:
+                f.write(b'{"i": 3, "trunc')
+            
+            log = SegmentLog(directory, max_segment_bytes=40, max_segments=2)
+            assert os.path.getsize(path) == good_size, "不完整的尾部没有被截断"
+            for i in range(4, 10):
+                log.append({"i": i})
+            log.close()
+            assert len(log.list_segments()) == 2, f"应只保留2个分段，实际 {log.list_segments()}"
+            records = [record["i"] for record, _ in SegmentLog(directory, read_only=True).replay()]
+            assert records[-1] == 9 and records == sorted(records) and 3 not in records, f"恢复后读取到 {records}"
+        
+        print("✅ 分段日志测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 分段日志测试失败: {e}")
+        return False
+
+def test_dedup_index():
+    """测试多连接去重的时间窗口、容量淘汰和竞速统计"""
+    try:
+        print("\n测试多连接去重...")
+        from dedup import DedupIndex
+        
+        index = DedupIndex(window=10, max_entries=2)
+        assert index.check("a", "conn-1", received_at=0)
+        assert not index.check("a", "conn-2", received_at=0.05), "重复事件没有被过滤"
+        assert index.check("b", "conn-2", received_at=1)
+        # 超出时间窗口的记录被移除，同一事件再次到达视为新事件
+        assert index.check("a", "conn-1", received_at=11)
+        assert index.check("c", "conn-1", received_at=12)
+        assert index.check("d", "conn-1", received_at=13)
+        # 超出容量时淘汰最早的记录
+        assert index.check("b", "conn-2", received_at=13.5)
+        assert len(index) == 3
+        
+        stats = index.get_stats()
+        assert (stats["unique"], stats["duplicates"], stats["evicted"]) == (6, 1, 3), stats
+        assert stats["sources"]["conn-1"]["wins"] == 4
+        assert stats["sources"]["conn-2"]["losses"] == 1
+        assert abs(stats["sources"]["conn-2"]["avg_lag_ms"] - 50) < 1e-6
+        
+        print("✅ 多连接去重测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 多连接去重测试失败: {e}")
+        return False
+
+def test_aggregator_windows():
+    """测试滑动窗口聚合的计数、过期和多空失衡"""
+    try:
+        print("\n测试滑动窗口聚合...")
+        from aggregator import LiquidationAggregator
+        
+        base = 600_000_000_000
+        aggregator = LiquidationAggregator(windows=(10, 60), buckets=10)
+        aggregator.update_many([
+            _make_order(base),
+            _make_order(base + 1000, quantity=2.0),
+            _make_order(base + 5000, side="BUY"),
+            _make_order(base + 8000, symbol="ETHUSDT", side="BUY", price=50.0),
+            # 迟到的记录早于10秒窗口，只计入60秒窗口
+            _make_order(base - 20000),
+        ])
+        
+        btc = aggregator.get("BTCUSDT", 10, now_ms=base + 9000)
+        assert (btc["count"], btc["notional"], btc["imbalance"]) == (3, 400.0, 0.5), btc
+        assert btc["long_liquidations"]["count"] == 2
+        btc = aggregator.get("BTCUSDT", 60, now_ms=base + 9000)
+        assert (btc["count"], btc["notional"]) == (4, 500.0), btc
+        market = aggregator.market(10, now_ms=base + 9000)
+        assert (market["count"], market["notional"]) == (4, 450.0), market
+        assert [item["symbol"] for item in aggregator.top(10, n=1, now_ms=base + 9000)] == ["BTCUSDT"]
+        
+        # 前两条滑出10秒窗口，只剩空头被强平
+        btc = aggregator.get("BTCUSDT", 10, now_ms=base + 12500)
+        assert (btc["count"], btc["notional"], btc["imbalance"]) == (1, 100.0, -1.0), btc
+        assert aggregator.get("BTCUSDT", 60, now_ms=base + 12500)["count"] == 4
+        assert aggregator.market(60, now_ms=base + 70000)["count"] == 0
+        assert aggregator.get("XRPUSDT", 10) is None
+        try:
+            aggregator.get("BTCUSDT", 30)
+            assert False, "未配置的窗口没有报错"
+        except ValueError:
+            pass
+        
+        print("✅ 滑动窗口聚合测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 滑动窗口聚合测试失败: {e}")
+        return False
+
+def test_rollup_accumulator():
+    """测试写入端汇总的累计、续写已写入的桶和失败后重新标记"""
+    try:
+        print("\n测试写入端汇总...")
+        import time
+        from rollup import RollupAccumulator
+        
+        now = int(time.time() * 1000)
+        accumulator = RollupAccumulator({"1m": 60, "1h": 3600})
+        minute = now - now % 60000
+        # 重启后从已写入的累计值继续
+        accumulator.seed("1m", minute, "BTCUSDT", "SELL", count=3, sum_qty=3.0, sum_notional=300.0,
+                         max_notional=100.0, sum_price_qty=300.0)
+        for name in ("1m", "1h"):
+            accumulator.finish_seed(name, accumulator.floor(name))
+        accumulator.add_many([
+            _make_order(now, quantity=1.0, price=100.0),
+            _make_order(now, quantity=3.0, price=200.0),
+            _make_order(now, symbol="ETHUSDT", side="BUY"),
+        ])
+        
+        dirty = dict(accumulator.collect_dirty())
+        assert len(dirty) == 4, f"应有4个待写入的桶，实际 {sorted(dirty)}"
+        bucket = dirty[("1m", minute, "BTCUSDT", "SELL")]
+        assert (bucket.count, bucket.sum_notional, bucket.max_notional) == (5, 1000.0, 600.0)
+        hourly = dirty[("1h", now - now % 3600000, "BTCUSDT", "SELL")]
+        assert hourly.count == 2 and hourly.vwap == 175.0
+        assert accumulator.collect_dirty() == [], "已取出的桶不应重复写入"
+        
+        # 写入失败后重新标记，未知的桶忽略
+        accumulator.mark_dirty(list(dirty) + [("1m", 0, "XRPUSDT", "BUY")])
+        assert sorted(key for key, _ in accumulator.collect_dirty()) == sorted(dirty)
+        assert accumulator.get_stats()["pending_seed"] == 0
+        
+        print("✅ 写入端汇总测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 写入端汇总测试失败: {e}")
+        return False
+
+def test_rollup_late_events():
+    """测试写入端汇总对迟到数据和未读取桶的处理"""
+    try:
+        print("\n测试写入端汇总迟到数据...")
+        import time
+        from rollup import RollupAccumulator
+        
+        minute = 60 * 1000
+        now = int(time.time() * 1000)
+        rollups = RollupAccumulator({"1m": 60}, retain_buckets=2)
+        current = now - now % minute
+        late = current - 10 * minute
+        
+        # 启动时尚未读取已写入的桶：当前桶只暂存增量，不能直接覆盖
+        rollups.add_many([_make_order(now)])
+        assert rollups.collect_dirty() == [], "未读取的桶不应标记为待写入"
+        rollups.finish_seed("1m", rollups.floor("1m"))
+        dirty = dict(rollups.collect_dirty())
+        assert dirty[("1m", current, "BTCUSDT", "SELL")].count == 1
+        
+        # 早于内存边界的迟到数据：合并已写入的累计值后才写入
+        rollups.add_many([_make_order(late), _make_order(late, side="BUY")])
+        assert rollups.collect_dirty() == [], "迟到数据不应在读取已写入的桶之前写入"
+        start, end = rollups.pending_ranges()["1m"]
+        assert start == late and end == late + minute
+        rollups.seed("1m", late, "BTCUSDT", "SELL", count=5, sum_qty=5.0, sum_notional=500.0,
+                     max_notional=100.0, sum_price_qty=500.0)
+        rollups.finish_seed("1m", start, end)
+        dirty = dict(rollups.collect_dirty())
+        assert dirty[("1m", late, "BTCUSDT", "SELL")].count == 6, "应在已写入的累计值上合并"
+        assert dirty[("1m", late, "BTCUSDT", "BUY")].count == 1, "没有已写入数据的桶只包含增量"
+        assert rollups.get_stats()["pending_seed"] == 0
+        
+        print("✅ 写入端汇总迟到数据测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 写入端汇总迟到数据测试失败: {e}")
+        return False
+
+def test_plan_segments():
+    """测试汇总查询区间拆分的边界"""
+    try:
+        print("\n测试汇总查询区间拆分...")
+        from rollup import plan_segments
+        
+        minute, hour = 60 * 1000, 3600 * 1000
+        resolutions = [("1m", minute), ("1h", hour)]
+        start, end = 5 * hour + 17 * minute + 1234, 30 * hour + 41 * minute + 999
+        segments = plan_segments(start, end, resolutions)
+        assert segments[0][1] == start and segments[-1][2] == end, "首尾应与查询区间一致"
+        assert all(a[2] == b[1] for a, b in zip(segments, segments[1:])), "区间应首尾相接"
+        assert [name for name, _, _ in segments] == ["raw", "1m", "1h", "1m", "raw"]
+        for name, segment_start, segment_end in segments:
+            width = dict(resolutions).get(name)
+            if width:
+                assert segment_start % width == 0 and segment_end % width == 0, f"{name} 区间未对齐"
+        
+        # 不足一个桶或整桶对齐的区间
+        assert plan_segments(start, start + 1000, resolutions) == [("raw", start, start + 1000)]
+        assert plan_segments(hour, 3 * hour, resolutions) == [("1h", hour, 3 * hour)]
+        assert plan_segments(end, end, resolutions) == []
+        
+        # 汇总数据完整起始时间之前回退到更细的分辨率
+        covered = plan_segments(start, end, resolutions, {"1h": 20 * hour, "1m": 0})
+        assert covered[0][0] != "1h" and all(s >= 20 * hour for name, s, _ in covered if name == "1h")
+        assert all(a[2] == b[1] for a, b in zip(covered, covered[1:]))
+        
+        print("✅ 汇总查询区间拆分测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 汇总查询区间拆分测试失败: {e}")
+        return False
+
+def test_columnar_store():
+    """测试列式存储跨分区的范围扫描、最新记录读取和列文件尾部不完整时的恢复"""
+    try:
+        print("\n测试列式存储...")
+        import tempfile
+        import time
+        from columnar_store import ColumnarStore, partition_key, partition_start, DAY_MS
+        
+        day = partition_start(partition_key(int(time.time() * 1000)))
+        with tempfile.TemporaryDirectory() as directory:
+            store = ColumnarStore(directory, retention_days=7)
+            store.append_many([
+                _make_order(day - DAY_MS + 3600000),
+                _make_order(day - DAY_MS + 7200000, symbol="ETHUSDT"),
+                _make_order(day + 1000),
+                _make_order(day + 2000, symbol="ETHUSDT"),
+                _make_order(day + 3000, price=101.0),
+            ])
+            # 乱序到达的记录按事件时间读出
+            store.append_many([_make_order(day + 500, side="BUY")])
+            assert len(store.list_partitions()) == 2
+            times = [order.event_time - day for order in store.scan()]
+            assert times == [-DAY_MS + 3600000, -DAY_MS + 7200000, 500, 1000, 2000, 3000], times
+            btc = [(order.event_time - day, order.side) for order in store.scan(day, day + 3000, ["BTCUSDT"])]
+            assert btc == [(500, "BUY"), (1000, "SELL")], btc
+            latest = store.latest(symbols=["ETHUSDT", "BTCUSDT"], limit=5)
+            assert [order.event_time - day for order in latest] == [-DAY_MS + 7200000, 500, 1000, 2000, 3000]
+            assert latest[1].side == "BUY" and latest[-1].price == 101.0
+            assert store.latest(symbols=["XRPUSDT"]) == []
+            assert store.count_by_symbol() == {"BTCUSDT": 4, "ETHUSDT": 2}
+            store.close()
+            
+            # 模拟崩溃：一列多写了一整行，另一列只写了半行
+            path = os.path.join(directory, partition_key(day))
+            with open(os.path.join(path, "event_time.col"), "ab") as f:
+                f.write((day + 4000).to_bytes(8, "little"))
+            with open(os.path.join(path, "price.col"), "ab") as f:
+                f.write(b"\x00\x01\x02")
+            assert len(list(ColumnarStore(directory, read_only=True).scan())) == 6, "读取时应忽略不完整的行"
+            
+            store = ColumnarStore(directory, retention_days=7)
+            store.append_many([_make_order(day + 5000, symbol="ETHUSDT", price=102.0)])
+            store.close()
+            orders = list(ColumnarStore(directory, read_only=True).scan(day))
+            assert [order.event_time - day for order in orders] == [500, 1000, 2000, 3000, 5000]
+            assert (orders[-1].symbol, orders[-1].price) == ("ETHUSDT", 102.0), "截断后追加的数据错位"
+        
+        print("✅ 列式存储测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 列式存储测试失败: {e}")
+        return False
+
+def test_sqlite_queries():
+    """测试SQLite存储的汇总、最新记录、流式读取和只读模式"""
+    try:
+        print("\n测试SQLite存储...")
+        import tempfile
+        import time
+        import config
+        from sqlite_handler import SQLiteHandler
+        
+        original = dict(config.SQLITE_CONFIG)
+        now = int(time.time() * 1000)
+        with tempfile.TemporaryDirectory() as directory:
+            config.SQLITE_CONFIG["path"] = os.path.join(directory, "force_orders.db")
+            try:
+                handler = SQLiteHandler()
+                handler.save_force_orders([
+                    _make_order(now - 48 * 3600 * 1000),
+                    _make_order(now - 3000),
+                    _make_order(now - 2000, quantity=2.0, price=110.0),
+                    _make_order(now - 1000, side="BUY"),
+                    _make_order(now - 500, symbol="ETHUSDT", price=50.0),
+                ])
+                assert handler.flush(), "写入缓冲区没有按时提交"
+                
+                summary = handler.query_summary(now - 10000, now + 1)
+                assert sorted(summary) == [("BTCUSDT", "BUY"), ("BTCUSDT", "SELL"), ("ETHUSDT", "SELL")]
+                longs = summary[("BTCUSDT", "SELL")]
+                assert (longs.count, longs.sum_notional, longs.max_notional) == (2, 320.0, 220.0)
+                assert abs(longs.vwap - 320.0 / 3) < 1e-9
+                assert list(handler.query_summary(now - 10000, now + 1, symbol="ETHUSDT")) == [("ETHUSDT", "SELL")]
+                
+                latest = handler.query_latest_orders(hours=24, limit=1)
+                assert [(order.symbol, order.event_time) for order in latest] == [("BTCUSDT", now - 1000), ("ETHUSDT", now - 500)]
+                btc = handler.query_latest_orders(hours=24, limit=5, symbol="BTCUSDT")
+                assert [order.event_time for order in btc] == [now - 1000, now - 2000, now - 3000]
+                streamed = [order.event_time for order in handler.stream_force_orders(0, now + 1, fetch_size=2)]
+                assert streamed == sorted(streamed) and len(streamed) == 5
+                assert handler.list_symbols(24) == ["BTCUSDT", "ETHUSDT"]
+                handler.close()
+                
+                reader = SQLiteHandler(read_only=True)
+                assert reader.get_data_summary()["total_orders"] == 5
+                try:
+                    reader.save_force_orders([_make_order(now)])
+                    assert False, "只读模式不应允许写入"
+                except RuntimeError:
+                    pass
+                reader.close()
+            finally:
+                config.SQLITE_CONFIG.clear()
+                config.SQLITE_CONFIG.update(original)
+        
+        print("✅ SQLite存储测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ SQLite存储测试失败: {e}")
+        return False
+
+def test_spool_resume():
+    """测试预写日志提交进度并在重启后从已提交位置继续"""
+    try:
+        print("\n测试预写日志断点续写...")
+        import tempfile
+        from spool import WriteAheadSpool
+        
+        written = []
+        
+        class Sink:
+            # 只接受前 limit 条，之后写入失败（模拟存储宕机）
+            def __init__(self, limit):
+                self.limit = limit
+            
+            def write_batch(self, orders):
+                if len(written) + len(orders) > self.limit:
+                    raise IOError("storage down")
+                written.extend(order.event_time for order in orders)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            spool = WriteAheadSpool(directory, lambda: Sink(4), batch_size=4, retry_delay=60)
+            spool.append([_make_order(i) for i in range(10)])
+            assert _wait_until(lambda: spool.stats["failures"] > 0), "回放没有进行"
+            spool.close(timeout=5)
+            assert written == [0, 1, 2, 3], f"第一次运行写入了 {written}"
+            
+            spool = WriteAheadSpool(directory, lambda: Sink(100), batch_size=4, retry_delay=60)
+            assert spool.pending == 6, f"重启后待回放 {spool.pending} 条，应为6条"
+            assert _wait_until(lambda: spool.pending == 0), "重启后没有回放剩余数据"
+            spool.close(timeout=5)
+            assert written == list(range(10)), f"重启后写入了 {written}"
+            
+            spool = WriteAheadSpool(directory, lambda: Sink(100), batch_size=4, retry_delay=60)
+            assert spool.pending == 0, "全部提交后重启不应再有待回放数据"
+            spool.close(timeout=5)
+        
+        print("✅ 预写日志断点续写测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 预写日志断点续写测试失败: {e}")
+        return False
+
+def test_circuit_breaker():
+    """测试熔断器 closed -> open -> half_open -> closed 状态切换，以及慢调用触发熔断"""
+    try:
+        print("\n测试写入熔断器...")
+        import time
+        from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+        
+        transitions = []
+        breaker = CircuitBreaker("test", window=4, min_calls=4, failure_rate=0.5, open_duration=0.05,
+                                 on_state_change=lambda previous, state: transitions.append(state))
+        breaker.record_success(0.01)
+        breaker.record_success(0.01)
+        breaker.record_failure()
+        assert breaker.state == CLOSED, "调用次数不足时不应打开"
+        breaker.record_failure()
+        assert breaker.state == OPEN, "失败率达到阈值时应打开"
+        assert not breaker.allow_request(), "打开期间应拒绝写入"
+        
+        time.sleep(0.06)
+        assert breaker.allow_request(), "到期后应放行试探写入"
+        assert breaker.state == HALF_OPEN
+        assert not breaker.allow_request(), "半开状态只放行 half_open_calls 次"
+        breaker.record_failure()
+        assert breaker.state == OPEN, "试探失败应重新打开"
+        
+        time.sleep(0.06)
+        assert breaker.allow_request()
+        breaker.record_success(0.01)
+        assert breaker.state == CLOSED, "试探成功应关闭"
+        assert transitions == [OPEN, HALF_OPEN, OPEN, HALF_OPEN, CLOSED], f"状态切换: {transitions}"
+        
+        # 写入成功但耗时过长同样计入熔断
+        slow = CircuitBreaker("slow", window=4, min_calls=4, failure_rate=0.5, slow_call_latency=1.0,
+                              slow_call_rate=0.75, open_duration=0.05)
+        for latency in (2.0, 2.0, 0.1):
+            slow.record_success(latency)
+        assert slow.state == CLOSED, "慢调用比例未达到阈值时不应打开"
+        slow.record_success(2.0)
+        assert slow.state == OPEN, "慢调用比例达到阈值时应打开"
+        time.sleep(0.06)
+        assert slow.allow_request()
+        slow.record_success(2.0)
+        assert slow.state == OPEN, "半开状态下的慢调用应重新打开"
+        stats = slow.get_stats()
+        assert (stats["slow_calls"], stats["opened"], stats["failures"]) == (4, 2, 0), stats
+        
+        print("✅ 写入熔断器测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 写入熔断器测试失败: {e}")
+        return False
+
+def test_latency_histogram():
+    """测试延迟直方图的百分位精度、合并和越界值处理"""
+    try:
+        print("\n测试延迟直方图...")
+        from latency import LatencyHistogram
+        
+        values = [i * 10 for i in range(1, 10001)]
+        histogram, odd, even = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for i, value in enumerate(values):
+            histogram.record(value)
+            (odd if i % 2 else even).record(value)
+        for percentile in (1, 50, 90, 99, 99.9, 100):
+            exact = values[max(1, int(round(percentile / 100.0 * len(values)))) - 1]
+            measured = histogram.value_at_percentile(percentile)
+            assert exact <= measured <= exact * (1 + 1 / 128), f"p{percentile}: {measured} (精确值 {exact})"
+        assert histogram.value_at_percentile(100) == histogram.max == 100000
+        assert histogram.mean == sum(values) / len(values)
+        
+        # 小于2^sub_bucket_bits的值精确计数
+        small = LatencyHistogram()
+        for value in (3, 7, 7, 200):
+            small.record(value)
+        assert [small.value_at_percentile(p) for p in (25, 50, 75, 100)] == [3, 7, 7, 200]
+        
+        odd.merge(even)
+        assert odd.count == histogram.count and odd.min == 10
+        assert all(odd.value_at_percentile(p) == histogram.value_at_percentile(p) for p in (50, 99, 99.9))
+        restored = LatencyHistogram.from_dict(histogram.to_dict())
+        assert restored.value_at_percentile(99) == histogram.value_at_percentile(99)
+        
+        # 时钟偏差导致的负值按0记录，超出上限的值按上限记录
+        bounded = LatencyHistogram(highest=1000000)
+        bounded.record(-5)
+        bounded.record(5000000)
+        assert (bounded.clamped, bounded.min, bounded.max) == (1, 0, 1000000)
+        assert LatencyHistogram().value_at_percentile(99) == 0
+        
+        print("✅ 延迟直方图测试通过")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 延迟直方图测试失败: {e}")
+        return False
+
 def main():
     """主测试函数"""
     print("=" * 50)
@@ -78,7 +661,20 @@ def main():
     tests = [
         test_imports,
         test_config,
-        test_websocket_url
+        test_websocket_url,
+        test_ingest_overflow,
+        test_segment_log,
+        test_decoder_parity,
+        test_dedup_index,
+        test_aggregator_windows,
+        test_rollup_accumulator,
+        test_rollup_late_events,
+        test_plan_segments,
+        test_columnar_store,
+        test_sqlite_queries,
+        test_spool_resume,
+        test_circuit_breaker,
+        test_latency_histogram
     ]
     
     passed = 0